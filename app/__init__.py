@@ -5,13 +5,42 @@ FastAPI application factory
 import os
 import asyncio
 import logging
-from fastapi import FastAPI
+import time
+from functools import lru_cache, partial
+from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from contextlib import asynccontextmanager
 
+from .config import (
+    DNS_REFRESH_INTERVAL,
+    HEALTH_CHECK_ENABLED,
+    HEARTBEAT_FLUSH_INTERVAL,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+    MAINTENANCE_CRON,
+    METRICS_COLLECT_INTERVAL,
+    METRICS_RETENTION_DAYS,
+    SCHEDULER_JITTER,
+    TUNNEL_DNS_RECORDS,
+)
 from .database import init_db
-from .routes import auth, users, tunnels, stats, ssh_keys
-from .services.dns import setup_tunnel_dns
+from .responses import CompressionMiddleware, FastJSONResponse, StaticAsset
+from .routes import auth, users, tunnels, stats, ssh_keys, jobs
+from .services.activity import activity_writer, archive_old_activity
+from .services.auth import configure_bcrypt_rounds
+from .services.changes import prune_tunnel_changes
+from .services.counters import reconcile_counters
+from .services.deletion import deletion_worker
+from .services.dns import dns_setup
+from .services.frps_config import get_frps_settings
+from .services.health import health_checker
+from .services.heartbeat import heartbeat_store
+from .services.leader import leader_elector
+from .services.ports import port_allocator
+from .services.scheduler import scheduler
+from .services.subdomains import subdomain_registry
+from .services.tunnel_dns import tunnel_dns
+from .services.user_import import shutdown_hash_pool
 from .services.metrics import collect_tunnel_metrics, cleanup_old_metrics
 
 logger = logging.getLogger(__name__)
@@ -24,49 +53,127 @@ def get_dashboard_html() -> str:
         return f.read()
 
 
-async def collect_metrics_periodically():
-    """Background task to collect frps metrics every 60 seconds"""
+@lru_cache(maxsize=1)
+def dashboard_asset() -> StaticAsset:
+    """Dashboard HTML, compressed once per process"""
+    return StaticAsset(get_dashboard_html().encode(), "text/html; charset=utf-8")
+
+
+def register_scheduled_jobs() -> None:
+    """Register the periodic maintenance jobs (run by the leader worker's scheduler)"""
+    jitter = SCHEDULER_JITTER
+    scheduler.register("collect_metrics", collect_tunnel_metrics, every=METRICS_COLLECT_INTERVAL, jitter=jitter)
+    scheduler.register(
+        "metrics_retention", partial(cleanup_old_metrics, days=METRICS_RETENTION_DAYS), cron=MAINTENANCE_CRON, jitter=jitter
+    )
+    scheduler.register("activity_archive", archive_old_activity, cron=MAINTENANCE_CRON, jitter=jitter)
+    scheduler.register("tunnel_changes_prune", prune_tunnel_changes, every=3600, jitter=jitter)
+    scheduler.register("counters_reconcile", reconcile_counters, every=86400, initial_delay=86400, jitter=jitter)
+    # The leader runs DNS setup when elected, so the first refresh waits a full interval
+    scheduler.register(
+        "dns_refresh", dns_setup.run_once, every=DNS_REFRESH_INTERVAL, initial_delay=DNS_REFRESH_INTERVAL, jitter=jitter
+    )
+
+
+register_scheduled_jobs()
+
+
+async def sweep_heartbeats_periodically():
+    """Leader job: expire tunnels whose shared last_heartbeat went silent"""
+    since = time.time()
     while True:
+        await asyncio.sleep(min(HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT / 4))
         try:
-            collect_tunnel_metrics()
+            await asyncio.to_thread(heartbeat_store.sweep, since)
         except Exception as e:
-            logger.error(f"Metrics collection failed: {e}")
-        await asyncio.sleep(60)
+            logger.error(f"Heartbeat sweep failed: {e}")
 
 
-async def cleanup_metrics_periodically():
-    """Background task to clean up old metrics daily"""
+async def flush_heartbeats_periodically():
+    """Background task to write back the heartbeat times this worker received"""
     while True:
-        await asyncio.sleep(86400)  # 24 hours
+        await asyncio.sleep(min(HEARTBEAT_FLUSH_INTERVAL, HEARTBEAT_TIMEOUT / 4))
         try:
-            cleanup_old_metrics(days=7)
+            await asyncio.to_thread(heartbeat_store.flush_last_seen)
         except Exception as e:
-            logger.error(f"Metrics cleanup failed: {e}")
+            logger.error(f"Heartbeat flush failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan - initialize database, DNS, and background tasks"""
     init_db()
-    setup_tunnel_dns()
-
-    # Start background tasks
-    collect_task = asyncio.create_task(collect_metrics_periodically())
-    cleanup_task = asyncio.create_task(cleanup_metrics_periodically())
+    configure_bcrypt_rounds()  # reads the cost shared through the database
+    reconcile_counters()
+    activity_writer.start()
+    get_frps_settings()  # parse frps config once up front
+    port_allocator.rebuild()
+    subdomain_registry.rebuild()
+    heartbeat_store.load()
+    if not TUNNEL_DNS_RECORDS:
+        tunnel_dns.clear()  # intents written by the tunnel triggers have no one to apply them
+    deletion_worker.recover()
+    dashboard_asset()
+
+    # Work that must happen once per deployment runs only in the worker
+    # holding the leader lease (DNS setup runs once per election, off the
+    # startup path); the other workers read its results from the database
+    leader_jobs = {
+        "scheduler": scheduler.run,
+        "heartbeat_sweep": sweep_heartbeats_periodically,
+        "dns_setup": dns_setup.run,
+        "tunnel_dns": tunnel_dns.run,
+    }
+    if HEALTH_CHECK_ENABLED:
+        leader_jobs["health_checks"] = health_checker.run
+    leader_task = asyncio.create_task(leader_elector.run(leader_jobs))
+
+    # Start per-worker background tasks
+    heartbeat_task = asyncio.create_task(flush_heartbeats_periodically())
+    deletion_task = asyncio.create_task(deletion_worker.run())
+    subdomain_task = asyncio.create_task(subdomain_registry.follow())
+    owners_task = asyncio.create_task(heartbeat_store.follow())
+    health_task = asyncio.create_task(health_checker.follow()) if HEALTH_CHECK_ENABLED else None
 
     yield
 
     # Cancel background tasks on shutdown
-    collect_task.cancel()
-    cleanup_task.cancel()
+    leader_task.cancel()
+    try:
+        await leader_task
+    except asyncio.CancelledError:
+        pass
+    heartbeat_task.cancel()
+    try:
+        await heartbeat_task
+    except asyncio.CancelledError:
+        pass
+    deletion_task.cancel()
     try:
-        await collect_task
+        await deletion_task
     except asyncio.CancelledError:
         pass
+    subdomain_task.cancel()
     try:
-        await cleanup_task
+        await subdomain_task
     except asyncio.CancelledError:
         pass
+    owners_task.cancel()
+    try:
+        await owners_task
+    except asyncio.CancelledError:
+        pass
+    if health_task:
+        health_task.cancel()
+        try:
+            await health_task
+        except asyncio.CancelledError:
+            pass
+
+    # Flush queued activity events and heartbeat times before exiting
+    heartbeat_store.flush_last_seen()
+    activity_writer.stop()
+    shutdown_hash_pool()
 
 
 def create_app() -> FastAPI:
@@ -75,8 +182,10 @@ def create_app() -> FastAPI:
         title="Tunnel Server Admin",
         description="Admin dashboard for managing tunnel server users and tunnels",
         version="1.0.0",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse
     )
+    app.add_middleware(CompressionMiddleware)
 
     # Register routers
     app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -84,11 +193,12 @@ def create_app() -> FastAPI:
     app.include_router(tunnels.router, prefix="/api/tunnels", tags=["tunnels"])
     app.include_router(stats.router, prefix="/api", tags=["stats"])
     app.include_router(ssh_keys.router, prefix="/api/ssh-keys", tags=["ssh-keys"])
+    app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 
     # Serve dashboard at root
     @app.get("/", response_class=HTMLResponse)
-    async def root():
+    async def root(request: Request):
         """Serve admin dashboard"""
-        return get_dashboard_html()
+        return dashboard_asset().response(request)
 
     return app
@@ -9,11 +9,34 @@ SECRET_KEY = os.getenv("JWT_SECRET", secrets.token_hex(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# HTTP server (production launcher, app/server.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))  # worker processes; 0 = one per CPU
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))  # pending connections the socket queues
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "75"))  # idle keep-alive seconds (above Nginx's 60s default)
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "1000"))  # per worker, then 503; 0 = unlimited
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))  # seconds in-flight requests get on stop/reload
+
+# Response compression (gzip, or brotli when installed): smallest body worth
+# compressing, and the levels used for dynamic responses
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
 # Database Configuration
 DB_FILE = os.getenv("DB_PATH", "./tunnel.db")
+# Seconds a connection waits for another connection's lock before failing
+# with "database is locked" (the database runs in WAL mode, so only writers
+# wait for each other)
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "30"))
 
-# frp Configuration
-FRPS_CONFIG = os.getenv("FRPS_CONFIG", "/etc/frp/frps.ini")
+# frp Configuration (frps.toml preferred, legacy frps.ini supported)
+FRPS_CONFIG = os.getenv("FRPS_CONFIG") or (
+    "/etc/frp/frps.toml" if os.path.exists("/etc/frp/frps.toml") else "/etc/frp/frps.ini"
+)
+# How often (seconds) to stat FRPS_CONFIG for changes
+FRPS_CONFIG_CHECK_INTERVAL = float(os.getenv("FRPS_CONFIG_CHECK_INTERVAL", "5"))
 
 # Admin Credentials (optional, for 1Password integration)
 # If set, these will be used instead of auto-generating on first run
@@ -24,9 +47,102 @@ ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 NETLIFY_API_TOKEN = os.getenv("NETLIFY_API_TOKEN")
 NETLIFY_DNS_ZONE_ID = os.getenv("NETLIFY_DNS_ZONE_ID")  # Zone ID for ersantana.com
 TUNNEL_DOMAIN = os.getenv("TUNNEL_DOMAIN", "tunnel.ersantana.com")
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))  # seconds the fetched zone is trusted
+# Most Netlify API calls per second (0 = unlimited)
+NETLIFY_API_RATE = float(os.getenv("NETLIFY_API_RATE", "5"))
+# Per-tunnel A records (<subdomain>.TUNNEL_DOMAIN), managed by a background queue
+TUNNEL_DNS_RECORDS = os.getenv("TUNNEL_DNS_RECORDS", "false").lower() in ("1", "true", "yes")
+TUNNEL_DNS_BATCH_SIZE = int(os.getenv("TUNNEL_DNS_BATCH_SIZE", "20"))  # hostnames reconciled per batch
+TUNNEL_DNS_MAX_BACKOFF = float(os.getenv("TUNNEL_DNS_MAX_BACKOFF", "300"))  # seconds between retries, at most
+# Last detected public IP, reused on the next startup before re-detecting
+PUBLIC_IP_FILE = os.getenv("PUBLIC_IP_FILE", f"{DB_FILE}.public_ip")
 
 # frps Dashboard Configuration (for metrics collection)
 FRPS_DASHBOARD_HOST = os.getenv("FRPS_DASHBOARD_HOST", "localhost")
 FRPS_DASHBOARD_PORT = int(os.getenv("FRPS_DASHBOARD_PORT", "7500"))
 FRPS_DASHBOARD_USER = os.getenv("FRPS_DASHBOARD_USER", "admin")
 FRPS_DASHBOARD_PASS = os.getenv("FRPS_DASHBOARD_PASS", "")
+
+# Background job schedules (run by the scheduler in the leader worker)
+METRICS_COLLECT_INTERVAL = float(os.getenv("METRICS_COLLECT_INTERVAL", "60"))  # seconds between frps polls
+METRICS_RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", "7"))
+MAINTENANCE_CRON = os.getenv("MAINTENANCE_CRON", "30 3 * * *")  # retention and archival, local time
+DNS_REFRESH_INTERVAL = float(os.getenv("DNS_REFRESH_INTERVAL", "900"))  # seconds between public-IP re-checks
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "5"))  # random delay (seconds) added to each run
+
+# Leader election between worker processes (scheduled jobs run in the leader only)
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "10"))  # a dead leader is replaced within this
+
+# Trust X-Forwarded-For from a reverse proxy (e.g. Nginx) when resolving client IPs
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() in ("1", "true", "yes")
+
+# Login throttling (token bucket per email and per client IP)
+LOGIN_RATE_BURST = int(os.getenv("LOGIN_RATE_BURST", "5"))
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "5"))
+LOGIN_IP_RATE_BURST = int(os.getenv("LOGIN_IP_RATE_BURST", "20"))
+LOGIN_IP_RATE_PER_MINUTE = float(os.getenv("LOGIN_IP_RATE_PER_MINUTE", "20"))
+LOGIN_LOCKOUT_THRESHOLD = int(os.getenv("LOGIN_LOCKOUT_THRESHOLD", "5"))
+# Failures before an IP (possibly a shared NAT) is locked out, and how many
+# seconds it takes for one recorded failure to be forgotten
+LOGIN_IP_LOCKOUT_THRESHOLD = int(os.getenv("LOGIN_IP_LOCKOUT_THRESHOLD", "20"))
+LOGIN_FAILURE_DECAY_SECONDS = float(os.getenv("LOGIN_FAILURE_DECAY_SECONDS", "300"))
+LOGIN_LOCKOUT_BASE_SECONDS = int(os.getenv("LOGIN_LOCKOUT_BASE_SECONDS", "30"))
+LOGIN_LOCKOUT_MAX_SECONDS = int(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", "3600"))
+LOGIN_LIMITER_MAX_KEYS = int(os.getenv("LOGIN_LIMITER_MAX_KEYS", "10000"))
+
+# bcrypt cost calibration (BCRYPT_ROUNDS pins the cost and skips calibration)
+BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0")) or None
+
+# Activity log writer (events are queued and written in batches)
+ACTIVITY_QUEUE_SIZE = int(os.getenv("ACTIVITY_QUEUE_SIZE", "10000"))
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "500"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "1.0"))
+
+# Activity log retention (older rows are moved to activity_logs_archive; 0 disables)
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+
+# SSH/TCP reachability probes
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "5"))
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "20"))
+PROBE_CACHE_TTL = float(os.getenv("PROBE_CACHE_TTL", "15"))
+
+# Background tunnel health checks
+HEALTH_CHECK_ENABLED = os.getenv("HEALTH_CHECK_ENABLED", "true").lower() in ("1", "true", "yes")
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+HEALTH_CHECK_CONCURRENCY = int(os.getenv("HEALTH_CHECK_CONCURRENCY", "50"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+HEALTH_CHECK_MAX_BACKOFF = float(os.getenv("HEALTH_CHECK_MAX_BACKOFF", "900"))
+
+# Remote ports handed out to TCP/SSH tunnels ("20000-30000,30100").
+# Empty means frps allowPorts, or 1024-65535 if frps doesn't restrict ports.
+TUNNEL_PORT_RANGE = os.getenv("TUNNEL_PORT_RANGE", "")
+
+# Extra subdomains users may not claim (comma-separated, added to the built-in list)
+SUBDOMAIN_RESERVED = [s.strip().lower() for s in os.getenv("SUBDOMAIN_RESERVED", "").split(",") if s.strip()]
+
+# Largest batch accepted by the bulk tunnel endpoints
+TUNNEL_BULK_MAX_ITEMS = int(os.getenv("TUNNEL_BULK_MAX_ITEMS", "1000"))
+
+# Tunnel heartbeats: suggested client cadence, age after which a tunnel is
+# considered disconnected, and how often each worker writes back the heartbeat
+# times it received (at most a quarter of the timeout)
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "15"))
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "60"))
+HEARTBEAT_FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", "15"))
+
+# Tunnel change journal behind GET /api/tunnels?since=: hours of history kept
+# (older clients get a full resync) and the longest long-poll wait in seconds
+TUNNEL_CHANGES_RETENTION_HOURS = float(os.getenv("TUNNEL_CHANGES_RETENTION_HOURS", "24"))
+TUNNEL_CHANGES_MAX_WAIT = float(os.getenv("TUNNEL_CHANGES_MAX_WAIT", "60"))
+
+# Bulk user import: largest file accepted and bcrypt worker processes (0 = one per CPU)
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", "5000"))
+USER_IMPORT_WORKERS = int(os.getenv("USER_IMPORT_WORKERS", "0"))
+
+# Background deletion jobs: rows removed per batch and the pause between
+# batches (lets other writers take the lock)
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", "500"))
+DELETION_BATCH_PAUSE = float(os.getenv("DELETION_BATCH_PAUSE", "0.05"))
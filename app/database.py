@@ -4,17 +4,412 @@ Database initialization and connection management
 import sqlite3
 import os
 import secrets
-import bcrypt
-from .config import DB_FILE, ADMIN_PASSWORD, ADMIN_TOKEN
+from .config import DB_BUSY_TIMEOUT, DB_FILE, ADMIN_PASSWORD, ADMIN_TOKEN
+from .services.auth import hash_password
 
 
 def get_db():
     """Get database connection"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def _init_activity_fts(cursor):
+    """Full-text index over activity details (skipped if SQLite lacks FTS5)"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'activity_logs_fts'")
+    if cursor.fetchone():
+        return
+
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE activity_logs_fts
+            USING fts5(details, content='activity_logs', content_rowid='id')
+        """)
+    except sqlite3.OperationalError:
+        return  # FTS5 not compiled in; searches fall back to LIKE
+
+    # Keep the external-content index in sync with activity_logs
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS activity_logs_fts_insert AFTER INSERT ON activity_logs BEGIN
+            INSERT INTO activity_logs_fts(rowid, details) VALUES (new.id, new.details);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS activity_logs_fts_delete AFTER DELETE ON activity_logs BEGIN
+            INSERT INTO activity_logs_fts(activity_logs_fts, rowid, details) VALUES ('delete', old.id, old.details);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS activity_logs_fts_update AFTER UPDATE OF details ON activity_logs BEGIN
+            INSERT INTO activity_logs_fts(activity_logs_fts, rowid, details) VALUES ('delete', old.id, old.details);
+            INSERT INTO activity_logs_fts(rowid, details) VALUES (new.id, new.details);
+        END
+    """)
+    cursor.execute("INSERT INTO activity_logs_fts(activity_logs_fts) VALUES ('rebuild')")
+
+
+# Contribution of a users/tunnels row to each stats_counters column.
+# {r} is "new" or "old"; values are 0/1 so triggers can add or subtract them.
+_USER_COUNTER_TERMS = {
+    "users_total": "(IFNULL({r}.is_admin, 0) = 0 AND {r}.deleted_at IS NULL)",
+    "users_active": "(IFNULL({r}.is_admin, 0) = 0 AND IFNULL({r}.is_active, 0) = 1 AND {r}.deleted_at IS NULL)",
+}
+_TUNNEL_COUNTER_TERMS = {
+    "tunnels_total": "1",
+    "tunnels_active": "(IFNULL({r}.is_active, 0) = 1)",
+    "tunnels_http": "({r}.type = 'http')",
+    "tunnels_https": "({r}.type = 'https')",
+    "tunnels_tcp": "({r}.type = 'tcp')",
+    "tunnels_ssh": "({r}.type = 'ssh')",
+}
+
+
+# Recompute every counter from scratch (used for seeding and drift repair)
+COUNTER_RECOMPUTE_SQL = """
+    users_total = (SELECT COUNT(*) FROM users WHERE is_admin = 0 AND deleted_at IS NULL),
+    users_active = (SELECT COUNT(*) FROM users WHERE is_admin = 0 AND is_active = 1 AND deleted_at IS NULL),
+    tunnels_total = (SELECT COUNT(*) FROM tunnels),
+    tunnels_active = (SELECT COUNT(*) FROM tunnels WHERE is_active = 1),
+    tunnels_http = (SELECT COUNT(*) FROM tunnels WHERE type = 'http'),
+    tunnels_https = (SELECT COUNT(*) FROM tunnels WHERE type = 'https'),
+    tunnels_tcp = (SELECT COUNT(*) FROM tunnels WHERE type = 'tcp'),
+    tunnels_ssh = (SELECT COUNT(*) FROM tunnels WHERE type = 'ssh')
+"""
+
+
+def _counter_update_sql(terms: dict, sign_new: str = "", sign_old: str = "") -> str:
+    """Build the UPDATE stats_counters statement run by a trigger"""
+    assignments = []
+    for column, term in terms.items():
+        expr = column
+        if sign_new:
+            expr += f" {sign_new} {term.format(r='new')}"
+        if sign_old:
+            expr += f" {sign_old} {term.format(r='old')}"
+        assignments.append(f"{column} = {expr}")
+    return f"UPDATE stats_counters SET {', '.join(assignments)} WHERE id = 1;"
+
+
+def _init_stats_counters(cursor):
+    """Single-row counters for /api/stats, maintained by triggers on users and tunnels"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            users_total INTEGER NOT NULL DEFAULT 0,
+            users_active INTEGER NOT NULL DEFAULT 0,
+            tunnels_total INTEGER NOT NULL DEFAULT 0,
+            tunnels_active INTEGER NOT NULL DEFAULT 0,
+            tunnels_http INTEGER NOT NULL DEFAULT 0,
+            tunnels_https INTEGER NOT NULL DEFAULT 0,
+            tunnels_tcp INTEGER NOT NULL DEFAULT 0,
+            tunnels_ssh INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    triggers = {
+        "stats_users_insert": ("AFTER INSERT ON users", _counter_update_sql(_USER_COUNTER_TERMS, sign_new="+")),
+        "stats_users_delete": ("AFTER DELETE ON users", _counter_update_sql(_USER_COUNTER_TERMS, sign_old="-")),
+        "stats_users_update": (
+            "AFTER UPDATE OF is_admin, is_active, deleted_at ON users",
+            _counter_update_sql(_USER_COUNTER_TERMS, sign_new="+", sign_old="-")
+        ),
+        "stats_tunnels_insert": ("AFTER INSERT ON tunnels", _counter_update_sql(_TUNNEL_COUNTER_TERMS, sign_new="+")),
+        "stats_tunnels_delete": ("AFTER DELETE ON tunnels", _counter_update_sql(_TUNNEL_COUNTER_TERMS, sign_old="-")),
+        "stats_tunnels_update": (
+            "AFTER UPDATE OF is_active, type ON tunnels",
+            _counter_update_sql(_TUNNEL_COUNTER_TERMS, sign_new="+", sign_old="-")
+        ),
+    }
+    for name, (event, body) in triggers.items():
+        sql = f"CREATE TRIGGER {name} {event} BEGIN {body} END"
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+        row = cursor.fetchone()
+        if row and row[0] == sql:
+            continue
+        # Definition changed: replace it (the lifespan's reconcile_counters repairs the counts)
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(sql)
+
+    # Seed the row from the current tables; reconcile_counters() repairs any later drift
+    cursor.execute("SELECT 1 FROM stats_counters WHERE id = 1")
+    if not cursor.fetchone():
+        cursor.execute("INSERT INTO stats_counters (id) VALUES (1)")
+        cursor.execute(f"UPDATE stats_counters SET {COUNTER_RECOMPUTE_SQL} WHERE id = 1")
+
+
+def _init_tunnel_counts(cursor):
+    """Per-user tunnel_count column, maintained by triggers, for quota checks"""
+    try:
+        cursor.execute("ALTER TABLE users ADD COLUMN tunnel_count INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("""
+            UPDATE users SET tunnel_count = (SELECT COUNT(*) FROM tunnels WHERE tunnels.user_id = users.id)
+        """)
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_tunnel_count_insert AFTER INSERT ON tunnels BEGIN
+            UPDATE users SET tunnel_count = tunnel_count + 1 WHERE id = new.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_tunnel_count_delete AFTER DELETE ON tunnels BEGIN
+            UPDATE users SET tunnel_count = tunnel_count - 1 WHERE id = old.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_tunnel_count_update AFTER UPDATE OF user_id ON tunnels BEGIN
+            UPDATE users SET tunnel_count = tunnel_count - 1 WHERE id = old.user_id;
+            UPDATE users SET tunnel_count = tunnel_count + 1 WHERE id = new.user_id;
+        END
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_tunnel_count ON users(tunnel_count, id)")
+
+
+def _init_config_versions(cursor):
+    """Per-user config_version column, bumped by triggers whenever the user's frpc config changes"""
+    try:
+        cursor.execute("ALTER TABLE users ADD COLUMN config_version INTEGER NOT NULL DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_config_version_tunnel_insert AFTER INSERT ON tunnels BEGIN
+            UPDATE users SET config_version = config_version + 1 WHERE id = new.user_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_config_version_tunnel_delete AFTER DELETE ON tunnels BEGIN
+            UPDATE users SET config_version = config_version + 1 WHERE id = old.user_id;
+        END
+    """)
+    # Only columns that end up in frpc config; status and heartbeat writes don't count
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_config_version_tunnel_update
+        AFTER UPDATE OF user_id, name, type, local_port, local_host, subdomain, remote_port ON tunnels BEGIN
+            UPDATE users SET config_version = config_version + 1 WHERE id IN (old.user_id, new.user_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_config_version_token AFTER UPDATE OF token ON users
+        WHEN new.token IS NOT old.token BEGIN
+            UPDATE users SET config_version = config_version + 1 WHERE id = new.id;
+        END
+    """)
+
+
+def _init_tunnel_changes(cursor):
+    """Versioned journal of tunnel mutations, written by triggers, for delta sync"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunnel_changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            tunnel_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tunnel_changes_user ON tunnel_changes(user_id, version)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tunnel_changes_changed_at ON tunnel_changes(changed_at)")
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tunnel_changes_insert AFTER INSERT ON tunnels BEGIN
+            INSERT INTO tunnel_changes (tunnel_id, user_id, op) VALUES (new.id, new.user_id, 'upsert');
+        END
+    """)
+    # last_connected alone is left out: heartbeat flushes rewrite it every minute
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tunnel_changes_update
+        AFTER UPDATE OF user_id, name, type, local_port, local_host, subdomain, remote_port, ssh_user, is_active
+        ON tunnels BEGIN
+            INSERT INTO tunnel_changes (tunnel_id, user_id, op)
+            SELECT old.id, old.user_id, 'delete' WHERE old.user_id != new.user_id;
+            INSERT INTO tunnel_changes (tunnel_id, user_id, op) VALUES (new.id, new.user_id, 'upsert');
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tunnel_changes_delete AFTER DELETE ON tunnels BEGIN
+            INSERT INTO tunnel_changes (tunnel_id, user_id, op) VALUES (old.id, old.user_id, 'delete');
+        END
+    """)
+    # Admin listings include the owner's email
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tunnel_changes_user_email AFTER UPDATE OF email ON users
+        WHEN new.email IS NOT old.email BEGIN
+            INSERT INTO tunnel_changes (tunnel_id, user_id, op)
+            SELECT id, user_id, 'upsert' FROM tunnels WHERE user_id = new.id;
+        END
+    """)
+
+
+def _init_deletion_jobs(cursor):
+    """Background deletion jobs and the users.deleted_at marker they work from"""
+    try:
+        cursor.execute("ALTER TABLE users ADD COLUMN deleted_at TIMESTAMP")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deletion_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            target_id INTEGER,
+            tunnel_ids TEXT NOT NULL DEFAULT '[]',
+            status TEXT NOT NULL DEFAULT 'pending',
+            step TEXT,
+            rows_deleted INTEGER NOT NULL DEFAULT 0,
+            progress TEXT NOT NULL DEFAULT '{}',
+            error TEXT,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_deletion_jobs_status ON deletion_jobs(status, id)")
+    # Batched deletes of a user's archived activity
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_logs_archive_user ON activity_logs_archive(user_id)")
+
+
+def _init_leader_leases(cursor):
+    """Leases used to elect the one worker process that runs scheduled jobs"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leader_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+
+def _init_server_settings(cursor):
+    """Values chosen at runtime that every worker process must agree on"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS server_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+
+def _init_tunnel_dns_intents(cursor):
+    """
+    Wanted state of per-tunnel DNS records, written by triggers in the same
+    transaction as the tunnel change, so the latest tunnel write wins
+    whichever worker made it. The leader drains the table, recording the
+    records it created in tunnel_dns_managed; only those are ever deleted.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunnel_dns_intents (
+            subdomain TEXT PRIMARY KEY,
+            present INTEGER NOT NULL,
+            generation INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            due_at REAL NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tunnel_dns_intents_due ON tunnel_dns_intents(due_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunnel_dns_managed (
+            subdomain TEXT PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    upsert = """
+        INSERT INTO tunnel_dns_intents (subdomain, present) VALUES ({subdomain}, {present})
+        ON CONFLICT(subdomain) DO UPDATE SET
+            present = excluded.present, attempts = 0, due_at = 0, generation = generation + 1;
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tunnel_dns_intents_insert AFTER INSERT ON tunnels
+        WHEN new.subdomain IS NOT NULL BEGIN
+            {upsert.format(subdomain="new.subdomain", present=1)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tunnel_dns_intents_delete AFTER DELETE ON tunnels
+        WHEN old.subdomain IS NOT NULL BEGIN
+            {upsert.format(subdomain="old.subdomain", present=0)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tunnel_dns_intents_update_old AFTER UPDATE OF subdomain ON tunnels
+        WHEN old.subdomain IS NOT NULL AND old.subdomain IS NOT new.subdomain BEGIN
+            {upsert.format(subdomain="old.subdomain", present=0)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tunnel_dns_intents_update_new AFTER UPDATE OF subdomain ON tunnels
+        WHEN new.subdomain IS NOT NULL AND old.subdomain IS NOT new.subdomain BEGIN
+            {upsert.format(subdomain="new.subdomain", present=1)}
+        END
+    """)
+
+
+def _init_login_throttle(cursor):
+    """Login rate-limit buckets and lockouts, shared by all worker processes"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS login_throttle (
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            failures REAL NOT NULL DEFAULT 0,
+            failures_at REAL NOT NULL,
+            locked_until REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, value)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_login_throttle_updated ON login_throttle(updated)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS login_throttle_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            allowed INTEGER NOT NULL DEFAULT 0,
+            rejected_rate_limited INTEGER NOT NULL DEFAULT 0,
+            rejected_locked_out INTEGER NOT NULL DEFAULT 0,
+            lockouts INTEGER NOT NULL DEFAULT 0,
+            evictions INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO login_throttle_counters (id) VALUES (1)")
+
+
+def _init_job_runs(cursor):
+    """Per-job schedule and run metrics for the background scheduler"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            next_run_at REAL,
+            last_started_at REAL,
+            last_finished_at REAL,
+            last_status TEXT,
+            last_error TEXT,
+            last_duration_ms REAL,
+            max_duration_ms REAL NOT NULL DEFAULT 0,
+            total_duration_ms REAL NOT NULL DEFAULT 0,
+            last_lag_ms REAL,
+            max_lag_ms REAL NOT NULL DEFAULT 0,
+            run_count INTEGER NOT NULL DEFAULT 0,
+            failure_count INTEGER NOT NULL DEFAULT 0,
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            skipped_overlaps INTEGER NOT NULL DEFAULT 0,
+            running_by TEXT,
+            running_until REAL
+        )
+    """)
+
+    # Migration: per-job run claim, so a run never overlaps one started by another worker
+    for column in ("running_by TEXT", "running_until REAL"):
+        try:
+            cursor.execute(f"ALTER TABLE job_runs ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+
 def init_db():
     """Initialize database with tables and default admin"""
     # Ensure directory exists
@@ -22,9 +417,13 @@ def init_db():
     if db_dir:
         os.makedirs(db_dir, exist_ok=True)
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
+    # Write-ahead logging lets readers (e.g. a slow paginated download) run
+    # alongside writers; the mode is stored in the database file
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     # Users table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -131,12 +530,32 @@ def init_db():
         )
     """)
 
+    # Latest end-to-end health check result per tunnel
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunnel_health (
+            tunnel_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            status_code INTEGER,
+            latency_ms REAL,
+            error TEXT,
+            consecutive_failures INTEGER DEFAULT 0,
+            checked_at TIMESTAMP,
+            FOREIGN KEY (tunnel_id) REFERENCES tunnels(id)
+        )
+    """)
+
     # Migration: add ssh_user column to tunnels table
     try:
         cursor.execute("ALTER TABLE tunnels ADD COLUMN ssh_user TEXT")
     except sqlite3.OperationalError:
         pass  # Column already exists
 
+    # Migration: unix time of the last status report, shared by all workers
+    try:
+        cursor.execute("ALTER TABLE tunnels ADD COLUMN last_heartbeat REAL")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
     # Indexes for efficient querying
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_tunnel_metrics_tunnel
@@ -150,6 +569,84 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_request_metrics_slow
         ON request_metrics(response_time_ms DESC)
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_created
+        ON activity_logs(created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_user
+        ON activity_logs(user_id, created_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_action
+        ON activity_logs(action, created_at)
+    """)
+
+    # Keyset pagination and filters for the user and tunnel listings
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_created
+        ON users(created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tunnels_created
+        ON tunnels(created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tunnels_user_created
+        ON tunnels(user_id, created_at, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tunnels_name
+        ON tunnels(name, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tunnels_user_active
+        ON tunnels(user_id, is_active)
+    """)
+
+    # One tunnel per remote port. Existing duplicates must be fixed by hand
+    # first; until then the port allocator still avoids handing them out.
+    try:
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_tunnels_remote_port
+            ON tunnels(remote_port) WHERE remote_port IS NOT NULL
+        """)
+    except sqlite3.IntegrityError:
+        print("WARNING: duplicate tunnels.remote_port values; unique port index not created")
+
+    # Subdomains are claimed across all users
+    try:
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_tunnels_subdomain
+            ON tunnels(subdomain) WHERE subdomain IS NOT NULL
+        """)
+    except sqlite3.IntegrityError:
+        print("WARNING: duplicate tunnels.subdomain values; unique subdomain index not created")
+
+    # Archive for activity logs past the retention window
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_logs_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            action TEXT NOT NULL,
+            details TEXT,
+            ip_address TEXT,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    _init_activity_fts(cursor)
+    _init_deletion_jobs(cursor)  # adds users.deleted_at, which the counters read
+    _init_stats_counters(cursor)
+    _init_tunnel_counts(cursor)
+    _init_config_versions(cursor)
+    _init_tunnel_changes(cursor)
+    _init_leader_leases(cursor)
+    _init_job_runs(cursor)
+    _init_server_settings(cursor)
+    _init_tunnel_dns_intents(cursor)
+    _init_login_throttle(cursor)
 
     # Create default admin if not exists
     cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
@@ -159,7 +656,7 @@ def init_db():
             # Credentials provided via environment (e.g., from 1Password)
             admin_password = ADMIN_PASSWORD
             admin_token = ADMIN_TOKEN
-            password_hash = bcrypt.hashpw(admin_password.encode(), bcrypt.gensalt())
+            password_hash = hash_password(admin_password)
 
             cursor.execute("""
                 INSERT INTO users (email, password_hash, token, is_admin, max_tunnels)
@@ -176,7 +673,7 @@ def init_db():
         else:
             # Auto-generate credentials (legacy behavior)
             admin_password = secrets.token_urlsafe(16)
-            password_hash = bcrypt.hashpw(admin_password.encode(), bcrypt.gensalt())
+            password_hash = hash_password(admin_password)
             admin_token = secrets.token_hex(32)
 
             cursor.execute("""
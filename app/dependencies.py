@@ -3,9 +3,9 @@ FastAPI dependencies for authentication and authorization
 """
 import sqlite3
 import jwt
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from .config import SECRET_KEY, ALGORITHM, DB_FILE
+from .config import SECRET_KEY, ALGORITHM, DB_BUSY_TIMEOUT, DB_FILE, TRUST_PROXY_HEADERS
 
 security = HTTPBearer()
 
@@ -27,7 +27,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
 
 def verify_admin(user_id: int = Depends(verify_token)) -> int:
     """Verify user is admin"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
     cursor.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,))
     result = cursor.fetchone()
@@ -36,3 +36,12 @@ def verify_admin(user_id: int = Depends(verify_token)) -> int:
     if not result or not result[0]:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user_id
+
+
+def get_client_ip(request: Request) -> str:
+    """Resolve the client IP, honoring X-Forwarded-For only behind a trusted proxy"""
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else ""
@@ -2,7 +2,7 @@
 Pydantic models for request/response validation
 """
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 
 class UserCreate(BaseModel):
@@ -11,6 +11,12 @@ class UserCreate(BaseModel):
     max_tunnels: int = 10
 
 
+class UserImportRow(BaseModel):
+    email: EmailStr
+    password: Optional[str] = None  # generated when missing
+    max_tunnels: int = 10
+
+
 class UserLogin(BaseModel):
     email: str
     password: str
@@ -50,6 +56,36 @@ class TunnelUpdate(BaseModel):
     ssh_user: Optional[str] = None
 
 
+class TunnelBulkCreate(BaseModel):
+    tunnels: List[TunnelCreate]
+
+
+class TunnelBulkUpdateItem(TunnelUpdate):
+    id: int
+
+
+class TunnelBulkUpdate(BaseModel):
+    tunnels: List[TunnelBulkUpdateItem]
+
+
+class TunnelBulkIds(BaseModel):
+    ids: List[int]
+
+
+class TunnelBulkStatus(BaseModel):
+    ids: List[int]
+    is_active: bool
+
+
+class TunnelHeartbeatItem(BaseModel):
+    id: int
+    is_active: bool = True
+
+
+class TunnelHeartbeat(BaseModel):
+    tunnels: List[TunnelHeartbeatItem]
+
+
 class SSHKeyCreate(BaseModel):
     name: str
     public_key: str
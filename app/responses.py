@@ -0,0 +1,215 @@
+"""
+Response encoding - fast JSON rendering and compression
+
+JSON is rendered with orjson when it is installed (stdlib json otherwise).
+CompressionMiddleware compresses responses above COMPRESSION_MIN_SIZE with
+brotli (when installed) or gzip, whichever the client accepts. Fixed assets
+such as the dashboard are compressed once at the highest level and served
+as-is through StaticAsset.
+"""
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_MIN_SIZE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli else ("gzip",)
+
+# Content types worth compressing
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+# Progress streams: compressing would hold events back until the encoder's buffer fills
+_UNBUFFERED = ("text/event-stream", "application/x-ndjson")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON; values JSON can't represent are rendered with str()"""
+    if orjson is not None:
+        # datetimes go through default=str too, matching the stdlib output
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by dumps().
+
+    The app's default response class. Endpoints returning large lists
+    return it directly, which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _encoder(encoding: str, level: Optional[int] = None):
+    if encoding == "br":
+        return _BrotliEncoder(COMPRESSION_BROTLI_QUALITY if level is None else level)
+    return _GzipEncoder(COMPRESSION_GZIP_LEVEL if level is None else level)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Compress a whole body with "gzip" or "br" (brotli must be installed)"""
+    encoder = _encoder(encoding, level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def choose_encoding(accept_encoding: str, available: Tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    """First of `available` the Accept-Encoding header allows (q > 0), or None"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in available:
+        if accepted.get(encoding, 0.0) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses the client accepts in compressed form"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding:
+                await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    """Compresses one response; the start message is held until the first body chunk"""
+
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.start: Optional[Message] = None
+        self.encoder = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(_COMPRESSIBLE) and not content_type.startswith(_UNBUFFERED)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if self._compressible(headers) and (more_body or len(body) >= self.minimum_size):
+                self.encoder = _encoder(self.encoding)
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = self.encoder.compress(body) + self.encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await self.send(start)
+                    await self.send({"type": "http.response.body", "body": body})
+                    return
+            await self.send(start)
+
+        if self.encoder is not None:
+            body = self.encoder.compress(body)
+            if not more_body:
+                body += self.encoder.finish()
+            message = {"type": "http.response.body", "body": body, "more_body": more_body}
+        await self.send(message)
+
+
+class StaticAsset:
+    """
+    A fixed body kept uncompressed and compressed at the highest level, so
+    it is compressed once instead of per request. Served with an ETag.
+    """
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants: Dict[Optional[str], Tuple[str, bytes]] = {None: (f'"{digest}"', body)}
+        for encoding in ENCODINGS:
+            encoded = compress(body, encoding, 11 if encoding == "br" else 9)
+            if len(encoded) < len(body):
+                self.variants[encoding] = (f'"{digest}-{encoding}"', encoded)
+
+    def response(self, request: Request) -> Response:
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), tuple(e for e in self.variants if e))
+        etag, body = self.variants[encoding]
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            known = {tag for tag, _ in self.variants.values()}
+            if known & {tag.strip() for tag in if_none_match.split(",")}:
+                return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
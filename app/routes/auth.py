@@ -3,21 +3,34 @@ Authentication routes
 """
 import sqlite3
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
-import bcrypt
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 
-from ..config import DB_FILE
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
 from ..models.schemas import UserLogin
-from ..services.auth import create_access_token
+from ..dependencies import get_client_ip, verify_admin
+from ..services.auth import create_access_token, verify_password, needs_rehash, hash_password
 from ..services.activity import log_activity
+from ..services.rate_limit import login_limiter, retry_after_header
 
 router = APIRouter(tags=["auth"])
 
 
 @router.post("/login")
-async def login(user: UserLogin):
+async def login(user: UserLogin, request: Request):
     """Admin/user login"""
-    conn = sqlite3.connect(DB_FILE)
+    client_ip = get_client_ip(request)
+
+    # Throttle before touching the database or spending CPU on bcrypt
+    retry_after = login_limiter.check(user.email, client_ip)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts. Try again later.",
+            headers={"Retry-After": retry_after_header(retry_after)}
+        )
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -25,24 +38,37 @@ async def login(user: UserLogin):
     db_user = cursor.fetchone()
 
     if not db_user:
+        conn.close()
+        login_limiter.record_failure(user.email, client_ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not bcrypt.checkpw(user.password.encode(), db_user['password_hash']):
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not await run_in_threadpool(verify_password, user.password, db_user['password_hash']):
+        conn.close()
+        login_limiter.record_failure(user.email, client_ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    login_limiter.record_success(user.email, client_ip)
+
     if not db_user['is_active']:
+        conn.close()
         raise HTTPException(status_code=401, detail="Account disabled")
 
     # Update last login
     cursor.execute("UPDATE users SET last_login = ? WHERE id = ?",
                    (datetime.utcnow(), db_user['id']))
+
+    # Transparently upgrade hashes made with a lower bcrypt cost than the current one
+    if needs_rehash(db_user['password_hash']):
+        new_hash = await run_in_threadpool(hash_password, user.password)
+        cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, db_user['id']))
     conn.commit()
     conn.close()
 
     # Create JWT token
     access_token = create_access_token({"sub": str(db_user['id'])})
 
-    log_activity(db_user['id'], "login", f"User {user.email} logged in")
+    log_activity(db_user['id'], "login", f"User {user.email} logged in", ip=client_ip)
 
     return {
         "access_token": access_token,
@@ -54,3 +80,9 @@ async def login(user: UserLogin):
             "tunnel_token": db_user['token']
         }
     }
+
+
+@router.get("/throttle")
+async def get_login_throttle_stats(admin_id: int = Depends(verify_admin)):
+    """Get login throttling counters (admin only)"""
+    return login_limiter.stats()
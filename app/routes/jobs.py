@@ -0,0 +1,41 @@
+"""
+Background job routes
+"""
+import sqlite3
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
+from ..dependencies import verify_admin, verify_token
+from ..services.deletion import get_job, list_jobs
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.get("")
+async def get_jobs(status: Optional[str] = None, limit: int = 50, admin_id: int = Depends(verify_admin)):
+    """
+    List deletion jobs (admin only), newest first.
+
+    Query Parameters:
+    - status: pending, running, done or failed
+    - limit: Max results (1-500, default: 50)
+    """
+    return {"jobs": list_jobs(status=status, limit=limit)}
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: int, user_id: int = Depends(verify_token)):
+    """Progress of a deletion job (its creator or an admin)"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job["created_by"] != user_id:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        row = conn.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,)).fetchone()
+        conn.close()
+        if not row or not row[0]:
+            raise HTTPException(status_code=403, detail="You don't have permission to view this job")
+
+    return job
@@ -4,12 +4,12 @@ SSH key management routes
 import base64
 import hashlib
 import sqlite3
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import PlainTextResponse
 
-from ..config import DB_FILE
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
 from ..models.schemas import SSHKeyCreate
-from ..dependencies import verify_token
+from ..dependencies import verify_token, get_client_ip
 from ..services.activity import log_activity
 
 router = APIRouter(tags=["ssh-keys"])
@@ -31,7 +31,7 @@ def compute_fingerprint(public_key: str) -> str:
 @router.get("")
 async def list_ssh_keys(user_id: int = Depends(verify_token)):
     """List user's SSH keys"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -48,7 +48,7 @@ async def list_ssh_keys(user_id: int = Depends(verify_token)):
 
 
 @router.post("")
-async def add_ssh_key(key_data: SSHKeyCreate, user_id: int = Depends(verify_token)):
+async def add_ssh_key(key_data: SSHKeyCreate, request: Request, user_id: int = Depends(verify_token)):
     """Add an SSH public key"""
     public_key = key_data.public_key.strip()
 
@@ -65,7 +65,7 @@ async def add_ssh_key(key_data: SSHKeyCreate, user_id: int = Depends(verify_toke
     except Exception:
         raise HTTPException(status_code=400, detail="Failed to parse SSH public key")
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
     try:
@@ -77,7 +77,7 @@ async def add_ssh_key(key_data: SSHKeyCreate, user_id: int = Depends(verify_toke
         key_id = cursor.lastrowid
         conn.commit()
 
-        log_activity(user_id, "ssh_key_added", f"Added SSH key '{key_data.name}' ({fingerprint})")
+        log_activity(user_id, "ssh_key_added", f"Added SSH key '{key_data.name}' ({fingerprint})", ip=get_client_ip(request))
 
         return {
             "id": key_id,
@@ -92,9 +92,9 @@ async def add_ssh_key(key_data: SSHKeyCreate, user_id: int = Depends(verify_toke
 
 
 @router.delete("/{key_id}")
-async def delete_ssh_key(key_id: int, user_id: int = Depends(verify_token)):
+async def delete_ssh_key(key_id: int, request: Request, user_id: int = Depends(verify_token)):
     """Delete an SSH key (must own the key)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -117,7 +117,7 @@ async def delete_ssh_key(key_id: int, user_id: int = Depends(verify_token)):
     conn.commit()
     conn.close()
 
-    log_activity(user_id, "ssh_key_deleted", f"Deleted SSH key '{key['name']}'")
+    log_activity(user_id, "ssh_key_deleted", f"Deleted SSH key '{key['name']}'", ip=get_client_ip(request))
 
     return {"message": "SSH key deleted successfully"}
 
@@ -125,7 +125,7 @@ async def delete_ssh_key(key_id: int, user_id: int = Depends(verify_token)):
 @router.get("/authorized_keys")
 async def get_authorized_keys(user_id: int = Depends(verify_token)):
     """Get all user's SSH keys in authorized_keys format"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -3,37 +3,56 @@ Statistics and activity log routes
 """
 import sqlite3
 from typing import Optional
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 
-from ..config import DB_FILE
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
 from ..dependencies import verify_admin, verify_token
 from ..models.schemas import MetricsBatch
+from ..responses import FastJSONResponse
 from ..services import metrics as metrics_service
+from ..services.activity import activity_writer, query_activity
+from ..services.counters import get_counters, reconcile_counters
+from ..services.dns import dns_setup
+from ..services.leader import leader_elector
+from ..services.scheduler import scheduler
+from ..services.tunnel_dns import tunnel_dns
 
 router = APIRouter(tags=["stats"])
 
 
+@router.get("/health")
+async def get_health():
+    """
+    Liveness and readiness (no auth, for load balancers and monitoring).
+
+    The API serves as soon as it starts; ready turns true once background
+    DNS setup has finished (or is disabled). Details that reveal the server
+    (IP, provider errors, worker hosts) are under /health/details.
+    """
+    return {"status": "ok", "ready": dns_setup.ready}
+
+
+@router.get("/health/details")
+async def get_health_details(admin_id: int = Depends(verify_admin)):
+    """Readiness plus DNS setup, tunnel DNS and leader state of this worker (admin only)"""
+    return {
+        "status": "ok",
+        "ready": dns_setup.ready,
+        "dns": dns_setup.state(),
+        "tunnel_dns": tunnel_dns.stats(),
+        "leader": leader_elector.state(),
+    }
+
+
 @router.get("/stats")
 async def get_stats(admin_id: int = Depends(verify_admin)):
     """Get server statistics (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
+    counters = get_counters()
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
-    # User stats
-    cursor.execute("SELECT COUNT(*) as total FROM users WHERE is_admin = 0")
-    total_users = cursor.fetchone()['total']
-
-    cursor.execute("SELECT COUNT(*) as active FROM users WHERE is_admin = 0 AND is_active = 1")
-    active_users = cursor.fetchone()['active']
-
-    # Tunnel stats
-    cursor.execute("SELECT COUNT(*) as total FROM tunnels")
-    total_tunnels = cursor.fetchone()['total']
-
-    cursor.execute("SELECT COUNT(*) as active FROM tunnels WHERE is_active = 1")
-    active_tunnels = cursor.fetchone()['active']
-
     # Recent activity
     cursor.execute("""
         SELECT a.*, u.email
@@ -47,31 +66,78 @@ async def get_stats(admin_id: int = Depends(verify_admin)):
     conn.close()
 
     return {
-        "users": {"total": total_users, "active": active_users},
-        "tunnels": {"total": total_tunnels, "active": active_tunnels},
+        "users": {"total": counters["users_total"], "active": counters["users_active"]},
+        "tunnels": {
+            "total": counters["tunnels_total"],
+            "active": counters["tunnels_active"],
+            "by_type": {
+                "http": counters["tunnels_http"],
+                "https": counters["tunnels_https"],
+                "tcp": counters["tunnels_tcp"],
+                "ssh": counters["tunnels_ssh"],
+            }
+        },
         "recent_activity": recent_activity
     }
 
 
-@router.get("/activity")
-async def get_activity(admin_id: int = Depends(verify_admin), limit: int = 50):
-    """Get activity logs (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+@router.get("/scheduler")
+async def get_scheduler(admin_id: int = Depends(verify_admin)):
+    """
+    Scheduled background jobs with their schedules and run metrics (admin only).
 
-    cursor.execute("""
-        SELECT a.*, u.email
-        FROM activity_logs a
-        LEFT JOIN users u ON a.user_id = u.id
-        ORDER BY a.created_at DESC
-        LIMIT ?
-    """, (limit,))
+    Metrics come from the job_runs table, so any worker can answer;
+    leader says which worker is running the scheduler.
+    """
+    return {"jobs": scheduler.status(), "leader": leader_elector.state()}
 
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
 
-    return {"logs": logs}
+@router.post("/stats/reconcile")
+async def reconcile_stats(admin_id: int = Depends(verify_admin)):
+    """Recompute stats counters from the source tables and repair drift (admin only)"""
+    return reconcile_counters()
+
+
+@router.get("/activity")
+async def get_activity(
+    admin_id: int = Depends(verify_admin),
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    q: Optional[str] = None
+):
+    """
+    Get activity logs (admin only), newest first.
+
+    Query Parameters:
+    - limit: Max results per page (1-500, default: 50)
+    - cursor: next_cursor from the previous page
+    - user_id: Filter by user
+    - action: Filter by action (login, tunnel_created, ...)
+    - since / until: created_at range ('YYYY-MM-DD HH:MM:SS', UTC)
+    - q: Full-text search over details
+    """
+    try:
+        return FastJSONResponse(query_activity(
+            limit=limit,
+            cursor=cursor,
+            user_id=user_id,
+            action=action,
+            since=since,
+            until=until,
+            search=q
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/activity/queue")
+async def get_activity_queue(admin_id: int = Depends(verify_admin)):
+    """Get activity log writer queue depth and drop counters (admin only)"""
+    return activity_writer.stats()
 
 
 @router.get("/metrics/overview")
@@ -83,7 +149,7 @@ async def get_metrics_overview(admin_id: int = Depends(verify_admin)):
 @router.get("/metrics/tunnels")
 async def get_all_tunnels_metrics(user_id: int = Depends(verify_token)):
     """Get all tunnels with their 1-hour request metrics summary"""
-    return {"tunnels": metrics_service.get_tunnels_with_request_metrics()}
+    return FastJSONResponse({"tunnels": metrics_service.get_tunnels_with_request_metrics()})
 
 
 @router.get("/metrics/tunnels/{tunnel_id}")
@@ -137,7 +203,8 @@ async def get_metrics(
     - limit: Max results (1-1000, default: 100)
     - offset: Pagination offset (default: 0)
     """
-    return metrics_service.get_request_metrics(
+    # Up to 1000 plain rows: rendered directly, skipping jsonable_encoder
+    return FastJSONResponse(metrics_service.get_request_metrics(
         tunnel_name=tunnel_name,
         limit=limit,
         offset=offset,
@@ -145,7 +212,7 @@ async def get_metrics(
         max_response_time=max_response_time,
         status_code=status_code,
         method=method
-    )
+    ))
 
 
 @router.get("/metrics/requests")
@@ -172,7 +239,7 @@ async def get_request_metrics_legacy(
         method=method
     )
     # Return in legacy format for dashboard compatibility
-    return {"requests": result["metrics"]}
+    return FastJSONResponse({"requests": result["metrics"]})
 
 
 @router.get("/metrics/slow-requests")
@@ -182,10 +249,10 @@ async def get_slow_requests(
     admin_id: int = Depends(verify_admin)
 ):
     """Get slow requests across all tunnels"""
-    return {
+    return FastJSONResponse({
         "threshold_ms": threshold_ms,
         "requests": metrics_service.get_slow_requests(threshold_ms, limit)
-    }
+    })
 
 
 @router.post("/metrics/report")
@@ -2,109 +2,459 @@
 Tunnel management routes
 """
 import sqlite3
+import time
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends
-
-from ..config import DB_FILE
-from ..models.schemas import TunnelCreate, TunnelStatusUpdate, TunnelUpdate
-from ..dependencies import verify_token
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, TUNNEL_BULK_MAX_ITEMS, TUNNEL_CHANGES_MAX_WAIT
+from ..models.schemas import (
+    TunnelBulkCreate,
+    TunnelBulkIds,
+    TunnelBulkStatus,
+    TunnelBulkUpdate,
+    TunnelCreate,
+    TunnelHeartbeat,
+    TunnelStatusUpdate,
+    TunnelUpdate,
+)
+from ..dependencies import verify_token, get_client_ip
 from ..services.tunnel import (
     get_server_domain,
     get_public_url,
     get_ssh_connection_string,
-    test_ssh_connection,
     check_user_quota,
     generate_frpc_config,
 )
+from ..services.changes import current_version, get_changes, has_changes, wait_for_changes
+from ..services.deletion import deletion_worker, enqueue_deletion
+from ..services.frpc_config import FRPC_FORMATS, MEDIA_TYPES, frpc_config_cache
+from ..services.health import health_checker
+from ..services.heartbeat import heartbeat_store
+from ..services.pagination import clamp_limit, keyset_clause, paginate, parse_sort, prefix_range, stream_json
+from ..services.ports import claim_port, get_server_ports, port_allocator
+from ..services.subdomains import is_subdomain_conflict, normalize_subdomain, subdomain_problem, subdomain_registry
+from ..services.probe import probe_cached, probe_many
 from ..services.activity import log_activity
 
 router = APIRouter(tags=["tunnels"])
 
 
-@router.get("")
-async def list_tunnels(user_id: int = Depends(verify_token)):
-    """List user's tunnels or all tunnels (admin)"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def _validate_subdomain(subdomain: str) -> str:
+    """
+    Normalize a requested subdomain, rejecting invalid or reserved names.
 
-    # Check if admin
-    cursor.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,))
-    is_admin = cursor.fetchone()[0]
+    Whether it is taken is left to the unique index on tunnels.subdomain,
+    which the write itself checks (see _conflict_detail).
+    """
+    name = normalize_subdomain(subdomain)
+    problem = subdomain_problem(name)
+    if problem == "invalid":
+        raise HTTPException(status_code=400, detail=f"Subdomain '{name}' is not a valid DNS label.")
+    if problem == "reserved":
+        raise HTTPException(status_code=400, detail=f"Subdomain '{name}' is reserved.")
+    return name
 
-    if is_admin:
-        # Show all tunnels for admin
+
+def _validate_remote_port(port: int) -> None:
+    """Check a requested remote port is in the allowed range and not one frps listens on"""
+    if not port_allocator.in_range(port):
+        raise HTTPException(status_code=400, detail=f"Remote port {port} is outside the allowed range.")
+    if port in get_server_ports():
+        raise HTTPException(status_code=400, detail=f"Remote port {port} is used by the tunnel server itself.")
+
+
+def _validate_tunnel_create(tunnel: TunnelCreate) -> None:
+    """Check a new tunnel's type-specific fields (normalizes the subdomain in place)"""
+    # Validate tunnel type
+    if tunnel.type not in ("http", "https", "tcp", "ssh"):
+        raise HTTPException(status_code=400, detail="Invalid tunnel type. Must be http, https, tcp, or ssh.")
+
+    # For http/https, subdomain is required
+    if tunnel.type in ("http", "https") and not tunnel.subdomain:
+        raise HTTPException(status_code=400, detail="Subdomain is required for HTTP/HTTPS tunnels.")
+
+    # Subdomains are unique across all users
+    if tunnel.subdomain:
+        tunnel.subdomain = _validate_subdomain(tunnel.subdomain)
+
+    # For ssh, ssh_user is required
+    if tunnel.type == "ssh" and not tunnel.ssh_user:
+        raise HTTPException(status_code=400, detail="SSH user is required for SSH tunnels.")
+
+    if tunnel.remote_port:
+        _validate_remote_port(tunnel.remote_port)
+
+
+def _insert_tunnel(cursor: sqlite3.Cursor, user_id: int, tunnel: TunnelCreate) -> int:
+    """Insert a validated tunnel in the caller's transaction; tcp/ssh get a free remote port when none is requested"""
+    def insert(remote_port):
         cursor.execute("""
+            INSERT INTO tunnels (user_id, name, type, local_port, local_host, subdomain, remote_port, ssh_user)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, tunnel.name, tunnel.type, tunnel.local_port, tunnel.local_host,
+              tunnel.subdomain, remote_port, tunnel.ssh_user))
+
+    if tunnel.type in ("tcp", "ssh") or tunnel.remote_port:
+        tunnel.remote_port = claim_port(cursor, insert, tunnel.remote_port)
+    else:
+        insert(None)
+    return cursor.lastrowid
+
+
+def _plan_tunnel_update(tunnel: sqlite3.Row, tunnel_update: TunnelUpdate) -> Tuple[Dict[str, Any], bool, Optional[int]]:
+    """
+    Validate an update against the existing tunnel row.
+
+    Returns (fields, claim, requested_port): the columns to set other than
+    remote_port, whether a remote port must be claimed, and the explicitly
+    requested port (None to auto-allocate).
+    """
+    # Build update fields
+    update_fields = {}
+    if tunnel_update.name is not None:
+        update_fields['name'] = tunnel_update.name
+    if tunnel_update.type is not None:
+        update_fields['type'] = tunnel_update.type
+    if tunnel_update.local_port is not None:
+        update_fields['local_port'] = tunnel_update.local_port
+    if tunnel_update.local_host is not None:
+        update_fields['local_host'] = tunnel_update.local_host
+    if tunnel_update.subdomain is not None:
+        subdomain = normalize_subdomain(tunnel_update.subdomain)
+        if subdomain != tunnel['subdomain']:
+            subdomain = _validate_subdomain(subdomain)
+        update_fields['subdomain'] = subdomain
+    if tunnel_update.remote_port is not None:
+        update_fields['remote_port'] = tunnel_update.remote_port
+    if tunnel_update.ssh_user is not None:
+        update_fields['ssh_user'] = tunnel_update.ssh_user
+
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    # Determine final type for validation
+    final_type = update_fields.get('type', tunnel['type'])
+    final_subdomain = update_fields.get('subdomain', tunnel['subdomain'])
+    final_remote_port = update_fields.get('remote_port', tunnel['remote_port'])
+    final_ssh_user = update_fields.get('ssh_user', tunnel['ssh_user'])
+
+    # Validate type constraints
+    if final_type in ("http", "https") and not final_subdomain:
+        raise HTTPException(status_code=400, detail="Subdomain is required for HTTP/HTTPS tunnels.")
+    if final_type == "ssh" and not final_ssh_user:
+        raise HTTPException(status_code=400, detail="SSH user is required for SSH tunnels.")
+    if 'remote_port' in update_fields:
+        _validate_remote_port(final_remote_port)
+
+    # tcp/ssh tunnels without a port (e.g. converted from http) get a free one
+    port_changed = 'remote_port' in update_fields and final_remote_port != tunnel['remote_port']
+    needs_port = final_type in ("tcp", "ssh") and not final_remote_port
+    update_fields.pop('remote_port', None)
+    return update_fields, port_changed or needs_port, final_remote_port if port_changed else None
+
+
+def _apply_tunnel_update(
+    cursor: sqlite3.Cursor,
+    tunnel_id: int,
+    fields: Dict[str, Any],
+    claim: bool,
+    requested_port: Optional[int]
+) -> Optional[int]:
+    """Write a planned update in the caller's transaction; returns the newly claimed port, if any"""
+    def update(remote_port=None):
+        values = dict(fields)
+        if remote_port is not None:
+            values['remote_port'] = remote_port
+        if not values:
+            return
+        set_clause = ", ".join(f"{k} = ?" for k in values.keys())
+        cursor.execute(f"UPDATE tunnels SET {set_clause} WHERE id = ?", list(values.values()) + [tunnel_id])
+
+    if claim:
+        return claim_port(cursor, update, requested_port)
+    update()
+    return None
+
+
+def _after_tunnel_update(tunnel: sqlite3.Row, claim: bool) -> None:
+    """Sync the port pool and subdomain index once an update is committed"""
+    if claim:
+        port_allocator.release(tunnel['remote_port'])
+    subdomain_registry.refresh()
+
+
+def _commit_or_release(conn: sqlite3.Connection, ports: List[Optional[int]]) -> None:
+    """Commit, or roll back and return the ports claimed in the transaction to the pool"""
+    try:
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        for port in ports:
+            port_allocator.release(port)
+        raise
+
+
+def _conflict_detail(error: sqlite3.IntegrityError, name: Optional[str], subdomain: Optional[str]) -> Tuple[int, str]:
+    """Status code and message for a unique-constraint failure on a tunnel write"""
+    if is_subdomain_conflict(error):
+        return 409, f"Subdomain '{subdomain}' is already taken."
+    return 400, f"Tunnel with name '{name}' already exists."
+
+
+TUNNEL_SORTS = ("created_at", "name")
+
+
+def _tunnel_filters(
+    is_admin: bool,
+    user_id: int,
+    name: Optional[str] = None,
+    type: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    owner: Optional[int] = None
+) -> Tuple[List[str], List[Any]]:
+    """WHERE clauses for the tunnel listing (regular users only ever see their own)"""
+    where, params = [], []
+    if not is_admin:
+        where.append("t.user_id = ?")
+        params.append(user_id)
+    elif owner is not None:
+        where.append("t.user_id = ?")
+        params.append(owner)
+    if name:
+        clause, values = prefix_range("t.name", name)
+        where.append(clause)
+        params.extend(values)
+    if type:
+        where.append("t.type = ?")
+        params.append(type)
+    if is_active is not None:
+        where.append("t.is_active = ?")
+        params.append(int(is_active))
+    return where, params
+
+
+def _tunnel_select(is_admin: bool, where: List[str], order_sql: str, limit_sql: str = "") -> str:
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    if is_admin:
+        # Admins see all tunnels along with the owner's email
+        return f"""
             SELECT t.*, u.email as user_email
             FROM tunnels t
             JOIN users u ON t.user_id = u.id
-            ORDER BY t.created_at DESC
-        """)
-    else:
-        # Show only user's tunnels
-        cursor.execute("""
-            SELECT * FROM tunnels
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        """, (user_id,))
+            {where_sql}
+            {order_sql}
+            {limit_sql}
+        """
+    return f"""
+        SELECT t.* FROM tunnels t
+        {where_sql}
+        {order_sql}
+        {limit_sql}
+    """
+
+
+def _enrich_tunnel(t: Dict[str, Any], domain: str) -> Dict[str, Any]:
+    """Add public_url, ssh_connection_string and last health check to a tunnel row"""
+    t['public_url'] = get_public_url(t['type'], t.get('subdomain'), t.get('remote_port'), domain)
+    t['health'] = health_checker.get_status(t['id'])
+    if t['type'] == 'ssh' and t.get('ssh_user') and t.get('remote_port'):
+        t['ssh_connection_string'] = get_ssh_connection_string(t['ssh_user'], t['remote_port'], domain)
+    return t
+
+
+def _fetch_tunnels(
+    cursor: sqlite3.Cursor,
+    is_admin: bool,
+    user_id: int,
+    filters: Dict[str, Any],
+    ids: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
+    """Tunnel rows as listed by GET /api/tunnels, optionally limited to `ids`"""
+    where, params = _tunnel_filters(is_admin, user_id, **filters)
+    if ids is not None:
+        where.append(f"t.id IN ({','.join('?' * len(ids))})")
+        params.extend(ids)
+    cursor.execute(_tunnel_select(is_admin, where, "ORDER BY t.created_at DESC, t.id DESC"), params)
+    domain = get_server_domain()
+    return [_enrich_tunnel(dict(row), domain) for row in cursor.fetchall()]
+
+
+@router.get("")
+async def list_tunnels(
+    since: Optional[int] = None,
+    wait: float = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    name: Optional[str] = None,
+    type: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    owner: Optional[int] = None,
+    user_id: int = Depends(verify_token)
+):
+    """
+    List user's tunnels or all tunnels (admin), streamed.
+
+    Query Parameters:
+    - limit: Page size (1-1000); omit for all tunnels
+    - cursor: next_cursor from the previous page
+    - sort: created_at or name; prefix - for descending (default: -created_at)
+    - name: Tunnel name prefix
+    - type / is_active: Filter by type or connection state
+    - owner: Filter by owner user id (admin only)
+    - since: version from a previous response; only tunnels changed since
+      then are returned, plus the ids of deleted ones
+    - wait: with since, long-poll up to this many seconds for a change
+    """
+    filters = {"name": name, "type": type, "is_active": is_active, "owner": owner}
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    db_cursor = conn.cursor()
 
+    # Check if admin
+    db_cursor.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,))
+    is_admin = db_cursor.fetchone()[0]
+    scope = None if is_admin else user_id
+
+    if since is None:
+        try:
+            column, descending = parse_sort(sort, TUNNEL_SORTS, "-created_at")
+            where, params = _tunnel_filters(is_admin, user_id, **filters)
+            if cursor:
+                clause, values = keyset_clause(f"t.{column}", "t.id", descending, cursor)
+                where.append(clause)
+                params.extend(values)
+        except ValueError as e:
+            conn.close()
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Version first: anything changed after it is picked up by the next delta
+        page: Dict[str, Any] = {"version": current_version(db_cursor)}
+        limit = clamp_limit(limit)
+        direction = "DESC" if descending else "ASC"
+        # Load the page before streaming, so the read lock isn't held while a
+        # slow client downloads it
+        rows = db_cursor.execute(
+            _tunnel_select(
+                is_admin, where,
+                f"ORDER BY t.{column} {direction}, t.id {direction}",
+                "LIMIT ?" if limit is not None else ""
+            ),
+            params + ([limit + 1] if limit is not None else [])
+        ).fetchall()
+        conn.close()
+        domain = get_server_domain()
+        tunnels = (
+            _enrich_tunnel(t, domain) for t in paginate((dict(row) for row in rows), limit, column, page)
+        )
+
+        return StreamingResponse(stream_json("tunnels", tunnels, page), media_type="application/json")
+
+    if wait > 0 and not has_changes(db_cursor, since, scope):
+        conn.close()
+        await wait_for_changes(since, scope, min(wait, TUNNEL_CHANGES_MAX_WAIT))
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        db_cursor = conn.cursor()
+
+    changes = get_changes(db_cursor, since, scope)
+    if changes["reset"]:
+        tunnels = _fetch_tunnels(db_cursor, is_admin, user_id, filters)
+        conn.close()
+        return {"tunnels": tunnels, "version": changes["version"], "reset": True, "deleted": []}
+
+    tunnels = _fetch_tunnels(db_cursor, is_admin, user_id, filters, changes["upserted"]) if changes["upserted"] else []
+    conn.close()
+
+    # Tunnels deleted, handed to another user or no longer matching the filters
+    found = {t['id'] for t in tunnels}
+    deleted = changes["deleted"] + [tunnel_id for tunnel_id in changes["upserted"] if tunnel_id not in found]
+
+    return {"tunnels": tunnels, "version": changes["version"], "reset": False, "deleted": deleted}
+
+
+@router.get("/subdomains/available")
+async def check_subdomain(name: str, user_id: int = Depends(verify_token)):
+    """Check whether a subdomain can be claimed (served from memory, for as-you-type validation)"""
+    return subdomain_registry.check(name)
+
+
+@router.get("/probe")
+async def probe_tunnels(refresh: bool = False, user_id: int = Depends(verify_token)):
+    """Probe reachability of all the user's SSH/TCP tunnels concurrently"""
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, name, type, remote_port FROM tunnels
+        WHERE user_id = ? AND type IN ('tcp', 'ssh') AND remote_port IS NOT NULL
+        ORDER BY name
+    """, (user_id,))
     tunnels = [dict(row) for row in cursor.fetchall()]
     conn.close()
 
-    # Add public_url and ssh_connection_string to each tunnel
     domain = get_server_domain()
-    for t in tunnels:
-        t['public_url'] = get_public_url(t['type'], t.get('subdomain'), t.get('remote_port'), domain)
-        if t['type'] == 'ssh' and t.get('ssh_user') and t.get('remote_port'):
-            t['ssh_connection_string'] = get_ssh_connection_string(t['ssh_user'], t['remote_port'], domain)
+    results = await probe_many(
+        [(domain, t['remote_port'], t['type'] == 'ssh') for t in tunnels],
+        refresh=refresh
+    )
 
-    return {"tunnels": tunnels}
+    return {
+        "results": [
+            {"tunnel_id": t['id'], "name": t['name'], "type": t['type'], "remote_port": t['remote_port'], **result}
+            for t, result in zip(tunnels, results)
+        ]
+    }
 
 
-@router.post("")
-async def create_tunnel(tunnel: TunnelCreate, user_id: int = Depends(verify_token)):
-    """Create a new tunnel for the authenticated user"""
-    # Check quota
-    can_create, current_count, max_tunnels = check_user_quota(user_id)
-    if not can_create:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Tunnel quota exceeded. You have {current_count}/{max_tunnels} tunnels."
-        )
+@router.get("/frpc.{fmt}")
+async def get_frpc_bundle(fmt: str, request: Request, user_id: int = Depends(verify_token)):
+    """Complete frpc client config for all the user's tunnels (frpc.toml or legacy frpc.ini)"""
+    if fmt not in FRPC_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown config format")
 
-    # Validate tunnel type
-    if tunnel.type not in ("http", "https", "tcp", "ssh"):
-        raise HTTPException(status_code=400, detail="Invalid tunnel type. Must be http, https, tcp, or ssh.")
+    headers = {"Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = frpc_config_cache.current_etag(user_id, fmt)
+        if etag and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={**headers, "ETag": etag})
 
-    # For http/https, subdomain is required
-    if tunnel.type in ("http", "https") and not tunnel.subdomain:
-        raise HTTPException(status_code=400, detail="Subdomain is required for HTTP/HTTPS tunnels.")
+    rendered = frpc_config_cache.render(user_id, fmt)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    etag, body = rendered
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers={**headers, "ETag": etag})
 
-    # For tcp, remote_port is required
-    if tunnel.type == "tcp" and not tunnel.remote_port:
-        raise HTTPException(status_code=400, detail="Remote port is required for TCP tunnels.")
 
-    # For ssh, remote_port and ssh_user are required
-    if tunnel.type == "ssh":
-        if not tunnel.remote_port:
-            raise HTTPException(status_code=400, detail="Remote port is required for SSH tunnels.")
-        if not tunnel.ssh_user:
-            raise HTTPException(status_code=400, detail="SSH user is required for SSH tunnels.")
+@router.post("")
+async def create_tunnel(tunnel: TunnelCreate, request: Request, user_id: int = Depends(verify_token)):
+    """Create a new tunnel for the authenticated user"""
+    _validate_tunnel_create(tunnel)
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
     try:
-        cursor.execute("""
-            INSERT INTO tunnels (user_id, name, type, local_port, local_host, subdomain, remote_port, ssh_user)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, tunnel.name, tunnel.type, tunnel.local_port, tunnel.local_host,
-              tunnel.subdomain, tunnel.remote_port, tunnel.ssh_user))
+        # Quota check and insert share one write transaction, so concurrent
+        # creates (even from other workers) can't both take the last slot
+        cursor.execute("BEGIN IMMEDIATE")
+        can_create, current_count, max_tunnels = check_user_quota(cursor, user_id)
+        if not can_create:
+            conn.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tunnel quota exceeded. You have {current_count}/{max_tunnels} tunnels."
+            )
 
-        tunnel_id = cursor.lastrowid
-        conn.commit()
+        tunnel_id = _insert_tunnel(cursor, user_id, tunnel)
+        _commit_or_release(conn, [tunnel.remote_port])
+        subdomain_registry.refresh()  # other workers pick the name up from the journal
 
-        log_activity(user_id, "tunnel_created", f"Created tunnel '{tunnel.name}' ({tunnel.type})")
+        log_activity(user_id, "tunnel_created", f"Created tunnel '{tunnel.name}' ({tunnel.type})", ip=get_client_ip(request))
 
         domain = get_server_domain()
         public_url = get_public_url(tunnel.type, tunnel.subdomain, tunnel.remote_port, domain)
@@ -129,16 +479,299 @@ async def create_tunnel(tunnel: TunnelCreate, user_id: int = Depends(verify_toke
             result["ssh_connection_string"] = get_ssh_connection_string(tunnel.ssh_user, tunnel.remote_port, domain)
 
         return result
-    except sqlite3.IntegrityError:
-        raise HTTPException(status_code=400, detail=f"Tunnel with name '{tunnel.name}' already exists.")
+    except ValueError as e:
+        conn.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        status_code, detail = _conflict_detail(e, tunnel.name, tunnel.subdomain)
+        raise HTTPException(status_code=status_code, detail=detail)
+    finally:
+        conn.close()
+
+
+def _check_batch_size(count: int) -> None:
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty.")
+    if count > TUNNEL_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large. At most {TUNNEL_BULK_MAX_ITEMS} items per request.")
+
+
+def _reject_batch(results: List[Dict[str, Any]], status_code: int = 400, message: str = "Batch rejected; no changes were made.") -> None:
+    """Fail the whole request with per-item results if any item failed"""
+    if any(not result["ok"] for result in results):
+        raise HTTPException(status_code=status_code, detail={"message": message, "results": results})
+
+
+def _load_tunnels(cursor: sqlite3.Cursor, ids: List[int]) -> Dict[int, sqlite3.Row]:
+    """Fetch tunnels by id in one query"""
+    placeholders = ",".join("?" * len(ids))
+    cursor.execute(f"SELECT * FROM tunnels WHERE id IN ({placeholders})", ids)
+    return {row['id']: row for row in cursor.fetchall()}
+
+
+def _summarize_names(verb: str, names: List[str], limit: int = 20) -> str:
+    """Activity details for a bulk operation, e.g. "Created 3 tunnels in bulk: a, b, c" """
+    listed = ", ".join(f"'{name}'" for name in names[:limit])
+    more = f" and {len(names) - limit} more" if len(names) > limit else ""
+    return f"{verb} {len(names)} tunnels in bulk: {listed}{more}"
+
+
+@router.post("/bulk")
+async def bulk_create_tunnels(
+    batch: TunnelBulkCreate,
+    request: Request,
+    atomic: bool = False,
+    user_id: int = Depends(verify_token)
+):
+    """
+    Create many tunnels in one transaction.
+
+    The whole batch is validated first; any invalid item rejects it with
+    per-item errors. Items that then hit a conflict are skipped (or, with
+    atomic=true, roll the whole batch back).
+    """
+    _check_batch_size(len(batch.tunnels))
+
+    results = []
+    names, subdomains, ports = set(), set(), set()
+    for index, tunnel in enumerate(batch.tunnels):
+        result = {"index": index, "ok": True, "id": None, "error": None}
+        try:
+            _validate_tunnel_create(tunnel)
+            if tunnel.name in names:
+                raise HTTPException(status_code=400, detail=f"Duplicate tunnel name '{tunnel.name}' in batch.")
+            if tunnel.subdomain and tunnel.subdomain in subdomains:
+                raise HTTPException(status_code=400, detail=f"Duplicate subdomain '{tunnel.subdomain}' in batch.")
+            if tunnel.remote_port and tunnel.remote_port in ports:
+                raise HTTPException(status_code=400, detail=f"Duplicate remote port {tunnel.remote_port} in batch.")
+        except HTTPException as e:
+            result.update(ok=False, error=e.detail)
+        names.add(tunnel.name)
+        subdomains.add(tunnel.subdomain)
+        ports.add(tunnel.remote_port)
+        results.append(result)
+    _reject_batch(results)
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    cursor = conn.cursor()
+    created = []
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        _, current_count, max_tunnels = check_user_quota(cursor, user_id)
+        if current_count + len(batch.tunnels) > max_tunnels:
+            conn.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tunnel quota exceeded. You have {current_count}/{max_tunnels} tunnels; "
+                       f"this batch adds {len(batch.tunnels)}."
+            )
+
+        for tunnel, result in zip(batch.tunnels, results):
+            cursor.execute("SAVEPOINT bulk_item")
+            try:
+                result["id"] = _insert_tunnel(cursor, user_id, tunnel)
+                cursor.execute("RELEASE bulk_item")
+                created.append(tunnel)
+            except (ValueError, sqlite3.IntegrityError) as e:
+                cursor.execute("ROLLBACK TO bulk_item")
+                cursor.execute("RELEASE bulk_item")
+                if isinstance(e, sqlite3.IntegrityError):
+                    result.update(ok=False, error=_conflict_detail(e, tunnel.name, tunnel.subdomain)[1])
+                else:
+                    result.update(ok=False, error=str(e))
+
+        if atomic and len(created) < len(batch.tunnels):
+            conn.rollback()
+            for tunnel in created:
+                port_allocator.release(tunnel.remote_port)
+            _reject_batch(results, status_code=409, message="Batch rolled back; no changes were made.")
+
+        _commit_or_release(conn, [tunnel.remote_port for tunnel in created])
+    finally:
+        conn.close()
+
+    if created:
+        subdomain_registry.refresh()
+        log_activity(user_id, "tunnels_bulk_created", _summarize_names("Created", [t.name for t in created]), ip=get_client_ip(request))
+
+    domain = get_server_domain()
+    for tunnel, result in zip(batch.tunnels, results):
+        if result["ok"]:
+            result["remote_port"] = tunnel.remote_port
+            result["public_url"] = get_public_url(tunnel.type, tunnel.subdomain, tunnel.remote_port, domain)
+
+    return {"results": results, "created": len(created), "failed": len(batch.tunnels) - len(created)}
+
+
+@router.put("/bulk")
+async def bulk_update_tunnels(
+    batch: TunnelBulkUpdate,
+    request: Request,
+    atomic: bool = False,
+    user_id: int = Depends(verify_token)
+):
+    """Update many tunnels in one transaction (same validation and conflict rules as bulk create)"""
+    _check_batch_size(len(batch.tunnels))
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,))
+        is_admin = cursor.fetchone()[0]
+        existing = _load_tunnels(cursor, [item.id for item in batch.tunnels])
+
+        results = []
+        plans = []
+        seen = set()
+        for index, item in enumerate(batch.tunnels):
+            result = {"index": index, "ok": True, "id": item.id, "error": None}
+            tunnel = existing.get(item.id)
+            plan = None
+            try:
+                if item.id in seen:
+                    raise HTTPException(status_code=400, detail=f"Tunnel {item.id} appears more than once in batch.")
+                if not tunnel:
+                    raise HTTPException(status_code=404, detail="Tunnel not found")
+                if not is_admin and tunnel['user_id'] != user_id:
+                    raise HTTPException(status_code=403, detail="You don't have permission to update this tunnel")
+                plan = _plan_tunnel_update(tunnel, item)
+            except HTTPException as e:
+                result.update(ok=False, error=e.detail)
+            seen.add(item.id)
+            plans.append(plan)
+            results.append(result)
+        _reject_batch(results)
+
+        cursor.execute("BEGIN IMMEDIATE")
+        applied = []
+        claimed_ports = []
+        for item, plan, result in zip(batch.tunnels, plans, results):
+            fields, claim, requested_port = plan
+            cursor.execute("SAVEPOINT bulk_item")
+            try:
+                claimed_ports.append(_apply_tunnel_update(cursor, item.id, fields, claim, requested_port))
+                cursor.execute("RELEASE bulk_item")
+                applied.append((existing[item.id], fields, claim))
+            except (ValueError, sqlite3.IntegrityError) as e:
+                cursor.execute("ROLLBACK TO bulk_item")
+                cursor.execute("RELEASE bulk_item")
+                if isinstance(e, sqlite3.IntegrityError):
+                    result.update(ok=False, error=_conflict_detail(e, fields.get('name'), fields.get('subdomain'))[1])
+                else:
+                    result.update(ok=False, error=str(e))
+
+        if atomic and len(applied) < len(batch.tunnels):
+            conn.rollback()
+            for port in claimed_ports:
+                port_allocator.release(port)
+            _reject_batch(results, status_code=409, message="Batch rolled back; no changes were made.")
+
+        _commit_or_release(conn, claimed_ports)
+    finally:
+        conn.close()
+
+    for tunnel, fields, claim in applied:
+        _after_tunnel_update(tunnel, claim)
+    if applied:
+        names = [fields.get('name', tunnel['name']) for tunnel, fields, _ in applied]
+        log_activity(user_id, "tunnels_bulk_updated", _summarize_names("Updated", names), ip=get_client_ip(request))
+
+    return {"results": results, "updated": len(applied), "failed": len(batch.tunnels) - len(applied)}
+
+
+@router.post("/bulk/delete")
+async def bulk_delete_tunnels(batch: TunnelBulkIds, request: Request, user_id: int = Depends(verify_token)):
+    """Delete many tunnels in one statement (all must exist and be yours, or you must be admin)"""
+    ids = list(dict.fromkeys(batch.ids))
+    _check_batch_size(len(ids))
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT is_admin FROM users WHERE id = ?", (user_id,))
+        is_admin = cursor.fetchone()[0]
+        existing = _load_tunnels(cursor, ids)
+
+        results = []
+        for tunnel_id in ids:
+            tunnel = existing.get(tunnel_id)
+            error = None
+            if not tunnel:
+                error = "Tunnel not found"
+            elif not is_admin and tunnel['user_id'] != user_id:
+                error = "You don't have permission to delete this tunnel"
+            results.append({"id": tunnel_id, "ok": error is None, "error": error})
+        _reject_batch(results)
+
+        placeholders = ",".join("?" * len(ids))
+        cursor.execute(f"DELETE FROM tunnels WHERE id IN ({placeholders})", ids)
+        job_id = enqueue_deletion(cursor, "tunnels", tunnel_ids=ids, created_by=user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    deletion_worker.wake()
+
+    subdomain_registry.refresh()
+    for tunnel_id in ids:
+        port_allocator.release(existing[tunnel_id]['remote_port'])
+        heartbeat_store.forget(tunnel_id)
+    log_activity(user_id, "tunnels_bulk_deleted", _summarize_names("Deleted", [existing[i]['name'] for i in ids]), ip=get_client_ip(request))
+
+    return {"results": results, "deleted": len(ids), "job_id": job_id}
+
+
+@router.put("/bulk/status")
+async def bulk_update_tunnel_status(batch: TunnelBulkStatus, user_id: int = Depends(verify_token)):
+    """Set the active status of many of your tunnels in one statement"""
+    ids = list(dict.fromkeys(batch.ids))
+    _check_batch_size(len(ids))
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        existing = _load_tunnels(cursor, ids)
+
+        results = []
+        for tunnel_id in ids:
+            tunnel = existing.get(tunnel_id)
+            error = None
+            if not tunnel:
+                error = "Tunnel not found"
+            elif tunnel['user_id'] != user_id:
+                error = "You don't have permission to update this tunnel"
+            results.append({"id": tunnel_id, "ok": error is None, "error": error})
+        _reject_batch(results)
+
+        now = datetime.utcnow() if batch.is_active else None
+        heartbeat = time.time()
+        placeholders = ",".join("?" * len(ids))
+        cursor.execute(f"""
+            UPDATE tunnels
+            SET is_active = ?, last_connected = COALESCE(?, last_connected), last_heartbeat = ?
+            WHERE id IN ({placeholders})
+        """, [int(batch.is_active), now, heartbeat] + ids)
+        conn.commit()
     finally:
         conn.close()
 
+    for tunnel_id in ids:
+        heartbeat_store.observe(tunnel_id, user_id, batch.is_active, heartbeat)
+
+    return {"results": results, "updated": len(ids), "is_active": batch.is_active}
+
 
 @router.put("/{tunnel_id}")
-async def update_tunnel(tunnel_id: int, tunnel_update: TunnelUpdate, user_id: int = Depends(verify_token)):
+async def update_tunnel(tunnel_id: int, tunnel_update: TunnelUpdate, request: Request, user_id: int = Depends(verify_token)):
     """Update a tunnel configuration (must own the tunnel or be admin)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -159,62 +792,25 @@ async def update_tunnel(tunnel_id: int, tunnel_update: TunnelUpdate, user_id: in
         conn.close()
         raise HTTPException(status_code=403, detail="You don't have permission to update this tunnel")
 
-    # Build update fields
-    update_fields = {}
-    if tunnel_update.name is not None:
-        update_fields['name'] = tunnel_update.name
-    if tunnel_update.type is not None:
-        update_fields['type'] = tunnel_update.type
-    if tunnel_update.local_port is not None:
-        update_fields['local_port'] = tunnel_update.local_port
-    if tunnel_update.local_host is not None:
-        update_fields['local_host'] = tunnel_update.local_host
-    if tunnel_update.subdomain is not None:
-        update_fields['subdomain'] = tunnel_update.subdomain
-    if tunnel_update.remote_port is not None:
-        update_fields['remote_port'] = tunnel_update.remote_port
-    if tunnel_update.ssh_user is not None:
-        update_fields['ssh_user'] = tunnel_update.ssh_user
-
-    if not update_fields:
-        conn.close()
-        raise HTTPException(status_code=400, detail="No fields to update")
-
-    # Determine final type for validation
-    final_type = update_fields.get('type', tunnel['type'])
-    final_subdomain = update_fields.get('subdomain', tunnel['subdomain'])
-    final_remote_port = update_fields.get('remote_port', tunnel['remote_port'])
-    final_ssh_user = update_fields.get('ssh_user', tunnel['ssh_user'])
-
-    # Validate type constraints
-    if final_type in ("http", "https") and not final_subdomain:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Subdomain is required for HTTP/HTTPS tunnels.")
-    if final_type == "tcp" and not final_remote_port:
+    try:
+        update_fields, claim, requested_port = _plan_tunnel_update(tunnel, tunnel_update)
+    except HTTPException:
         conn.close()
-        raise HTTPException(status_code=400, detail="Remote port is required for TCP tunnels.")
-    if final_type == "ssh":
-        if not final_remote_port:
-            conn.close()
-            raise HTTPException(status_code=400, detail="Remote port is required for SSH tunnels.")
-        if not final_ssh_user:
-            conn.close()
-            raise HTTPException(status_code=400, detail="SSH user is required for SSH tunnels.")
-
-    # Build and execute UPDATE query
-    set_clause = ", ".join(f"{k} = ?" for k in update_fields.keys())
-    values = list(update_fields.values()) + [tunnel_id]
+        raise
 
     try:
-        cursor.execute(f"UPDATE tunnels SET {set_clause} WHERE id = ?", values)
-        conn.commit()
+        # Hold the write lock from the start, so a port found free stays free
+        cursor.execute("BEGIN IMMEDIATE")
+        claimed_port = _apply_tunnel_update(cursor, tunnel_id, update_fields, claim, requested_port)
+        _commit_or_release(conn, [claimed_port])
+        _after_tunnel_update(tunnel, claim)
 
         # Fetch updated tunnel
         cursor.execute("SELECT * FROM tunnels WHERE id = ?", (tunnel_id,))
         updated_tunnel = dict(cursor.fetchone())
         conn.close()
 
-        log_activity(user_id, "tunnel_updated", f"Updated tunnel '{updated_tunnel['name']}'")
+        log_activity(user_id, "tunnel_updated", f"Updated tunnel '{updated_tunnel['name']}'", ip=get_client_ip(request))
 
         domain = get_server_domain()
         updated_tunnel['public_url'] = get_public_url(
@@ -230,15 +826,21 @@ async def update_tunnel(tunnel_id: int, tunnel_update: TunnelUpdate, user_id: in
             )
 
         return updated_tunnel
-    except sqlite3.IntegrityError:
+    except ValueError as e:
+        conn.rollback()
+        conn.close()
+        raise HTTPException(status_code=409, detail=str(e))
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
         conn.close()
-        raise HTTPException(status_code=400, detail=f"Tunnel with name '{update_fields.get('name')}' already exists.")
+        status_code, detail = _conflict_detail(e, update_fields.get('name'), update_fields.get('subdomain'))
+        raise HTTPException(status_code=status_code, detail=detail)
 
 
 @router.delete("/{tunnel_id}")
-async def delete_tunnel(tunnel_id: int, user_id: int = Depends(verify_token)):
+async def delete_tunnel(tunnel_id: int, request: Request, user_id: int = Depends(verify_token)):
     """Delete a tunnel (must own the tunnel or be admin)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -259,20 +861,37 @@ async def delete_tunnel(tunnel_id: int, user_id: int = Depends(verify_token)):
         conn.close()
         raise HTTPException(status_code=403, detail="You don't have permission to delete this tunnel")
 
-    # Delete tunnel
+    # Delete tunnel; its health and metrics rows go in the background
     cursor.execute("DELETE FROM tunnels WHERE id = ?", (tunnel_id,))
+    job_id = enqueue_deletion(cursor, "tunnels", target_id=tunnel_id, tunnel_ids=[tunnel_id], created_by=user_id)
     conn.commit()
     conn.close()
+    deletion_worker.wake()
+    port_allocator.release(tunnel['remote_port'])
+    subdomain_registry.refresh()
+    heartbeat_store.forget(tunnel_id)
+
+    log_activity(user_id, "tunnel_deleted", f"Deleted tunnel '{tunnel['name']}'", ip=get_client_ip(request))
+
+    return {"message": "Tunnel deleted successfully", "job_id": job_id}
+
 
-    log_activity(user_id, "tunnel_deleted", f"Deleted tunnel '{tunnel['name']}'")
+@router.post("/heartbeat")
+async def tunnel_heartbeat(heartbeat: TunnelHeartbeat, user_id: int = Depends(verify_token)):
+    """
+    Report the state of all of a client's tunnels at once.
 
-    return {"message": "Tunnel deleted successfully"}
+    Only changed states are written; tunnels that stop reporting are marked
+    inactive after HEARTBEAT_TIMEOUT, so clients don't need to send "inactive".
+    """
+    _check_batch_size(len(heartbeat.tunnels))
+    return heartbeat_store.record(user_id, [(item.id, item.is_active) for item in heartbeat.tunnels])
 
 
 @router.put("/{tunnel_id}/status")
 async def update_tunnel_status(tunnel_id: int, status: TunnelStatusUpdate, user_id: int = Depends(verify_token)):
     """Update tunnel active status (used by client to report connection state)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -291,13 +910,15 @@ async def update_tunnel_status(tunnel_id: int, status: TunnelStatusUpdate, user_
 
     # Update status
     now = datetime.utcnow() if status.is_active else None
+    heartbeat = time.time()
     cursor.execute("""
         UPDATE tunnels
-        SET is_active = ?, last_connected = COALESCE(?, last_connected)
+        SET is_active = ?, last_connected = COALESCE(?, last_connected), last_heartbeat = ?
         WHERE id = ?
-    """, (int(status.is_active), now, tunnel_id))
+    """, (int(status.is_active), now, heartbeat, tunnel_id))
     conn.commit()
     conn.close()
+    heartbeat_store.observe(tunnel_id, user_id, status.is_active, heartbeat)
 
     return {"message": "Tunnel status updated", "is_active": status.is_active}
 
@@ -305,7 +926,7 @@ async def update_tunnel_status(tunnel_id: int, status: TunnelStatusUpdate, user_
 @router.get("/{tunnel_id}/config")
 async def get_tunnel_config(tunnel_id: int, user_id: int = Depends(verify_token)):
     """Get frpc configuration for a specific tunnel"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -355,9 +976,9 @@ async def get_tunnel_config(tunnel_id: int, user_id: int = Depends(verify_token)
 
 
 @router.get("/{tunnel_id}/test-ssh")
-async def test_ssh_endpoint(tunnel_id: int, user_id: int = Depends(verify_token)):
+async def test_ssh_endpoint(tunnel_id: int, refresh: bool = False, user_id: int = Depends(verify_token)):
     """Test if SSH is reachable on a tunnel's remote port"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -385,5 +1006,4 @@ async def test_ssh_endpoint(tunnel_id: int, user_id: int = Depends(verify_token)
         raise HTTPException(status_code=400, detail="Tunnel has no remote port configured")
 
     domain = get_server_domain()
-    result = test_ssh_connection(domain, tunnel['remote_port'])
-    return result
+    return await probe_cached(domain, tunnel['remote_port'], read_banner=True, refresh=refresh)
@@ -1,27 +1,36 @@
 """
 User management routes
 """
+import json
 import sqlite3
 import secrets
-from fastapi import APIRouter, HTTPException, Depends
-import bcrypt
-
-from ..config import DB_FILE
-from ..models.schemas import UserCreate, UserUpdate
-from ..dependencies import verify_admin
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, USER_IMPORT_MAX_ROWS
+from ..models.schemas import UserCreate, UserImportRow, UserUpdate
+from ..dependencies import verify_admin, get_client_ip
 from ..services.activity import log_activity
+from ..services.auth import get_bcrypt_rounds, hash_password
+from ..services.deletion import deletion_worker, enqueue_deletion
+from ..services.pagination import clamp_limit, keyset_clause, paginate, parse_sort, prefix_range, stream_json
+from ..services.user_import import generate_password, generate_tokens, hash_passwords, parse_import
 
 router = APIRouter(tags=["users"])
 
 
 @router.post("")
-async def create_user(user: UserCreate, admin_id: int = Depends(verify_admin)):
+async def create_user(user: UserCreate, request: Request, admin_id: int = Depends(verify_admin)):
     """Create new user (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
+    password_hash = await run_in_threadpool(hash_password, user.password)
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
     try:
-        password_hash = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt())
         tunnel_token = secrets.token_hex(32)
 
         cursor.execute("""
@@ -32,7 +41,7 @@ async def create_user(user: UserCreate, admin_id: int = Depends(verify_admin)):
         user_id = cursor.lastrowid
         conn.commit()
 
-        log_activity(admin_id, "user_created", f"Created user {user.email}")
+        log_activity(admin_id, "user_created", f"Created user {user.email}", ip=get_client_ip(request))
 
         return {
             "id": user_id,
@@ -46,33 +55,221 @@ async def create_user(user: UserCreate, admin_id: int = Depends(verify_admin)):
         conn.close()
 
 
+def _summarize_emails(emails: List[str], limit: int = 20) -> str:
+    """Activity details for an import, e.g. "Imported 3 users: a@x, b@x, c@x" """
+    listed = ", ".join(emails[:limit])
+    more = f" and {len(emails) - limit} more" if len(emails) > limit else ""
+    return f"Imported {len(emails)} users: {listed}{more}"
+
+
+def _existing_emails(cursor: sqlite3.Cursor, emails: List[str]) -> set:
+    """Which of `emails` are already registered (queried in chunks)"""
+    existing = set()
+    for start in range(0, len(emails), 500):
+        chunk = emails[start:start + 500]
+        cursor.execute(f"SELECT email FROM users WHERE email IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+@router.post("/import")
+async def import_users(request: Request, atomic: bool = False, stream: bool = True, admin_id: int = Depends(verify_admin)):
+    """
+    Create many users from a CSV or JSON file (admin only).
+
+    Send the file as the request body: CSV (Content-Type text/csv, header
+    row email,password,max_tunnels) or JSON (a list, or {"users": [...]}).
+    Missing passwords are generated and returned once. The whole file is
+    validated first; any invalid row rejects it with per-row errors. Rows
+    whose email already exists are skipped (or, with atomic=true, reject the
+    import). Progress is streamed as NDJSON events unless stream=false.
+    """
+    try:
+        raw_rows = parse_import(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not raw_rows:
+        raise HTTPException(status_code=400, detail="Import file has no users.")
+    if len(raw_rows) > USER_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Import too large. At most {USER_IMPORT_MAX_ROWS} users per request.")
+
+    rows: List[Optional[UserImportRow]] = []
+    results = []
+    seen = set()
+    for index, raw in enumerate(raw_rows):
+        result = {"row": index + 1, "email": raw.get("email"), "ok": True, "id": None, "error": None}
+        try:
+            row = UserImportRow(**raw)
+            result["email"] = row.email
+            if row.email in seen:
+                raise ValueError(f"Duplicate email '{row.email}' in file.")
+            seen.add(row.email)
+            rows.append(row)
+        except (ValidationError, ValueError) as e:
+            message = "; ".join(err["msg"] for err in e.errors()) if isinstance(e, ValidationError) else str(e)
+            result.update(ok=False, error=message)
+            rows.append(None)
+        results.append(result)
+    if any(not result["ok"] for result in results):
+        raise HTTPException(status_code=400, detail={"message": "Import rejected; no users were created.", "results": results})
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    existing = _existing_emails(conn.cursor(), [row.email for row in rows])
+    conn.close()
+    for result in results:
+        if result["email"] in existing:
+            result.update(ok=False, error="Email already exists")
+    if atomic and existing:
+        raise HTTPException(status_code=409, detail={"message": "Import rejected; no users were created.", "results": results})
+
+    pending = [(row, result) for row, result in zip(rows, results) if result["ok"]]
+    passwords = [row.password or generate_password() for row, _ in pending]
+    ip = get_client_ip(request)
+
+    async def run_import():
+        hashes: List[Optional[bytes]] = []
+        async for done in hash_passwords(passwords, get_bcrypt_rounds(), hashes):
+            yield {"event": "progress", "stage": "hashing", "done": done, "total": len(passwords)}
+
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = conn.cursor()
+        created = []
+        rolled_back = False
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for (row, result), password, password_hash, token in zip(pending, passwords, hashes, generate_tokens(len(pending))):
+                cursor.execute("SAVEPOINT import_row")
+                try:
+                    cursor.execute("""
+                        INSERT INTO users (email, password_hash, token, max_tunnels)
+                        VALUES (?, ?, ?, ?)
+                    """, (row.email, password_hash, token, row.max_tunnels))
+                    cursor.execute("RELEASE import_row")
+                except sqlite3.IntegrityError:
+                    cursor.execute("ROLLBACK TO import_row")
+                    cursor.execute("RELEASE import_row")
+                    result.update(ok=False, error="Email already exists")
+                    continue
+                result.update(id=cursor.lastrowid, tunnel_token=token, max_tunnels=row.max_tunnels)
+                if not row.password:
+                    result["password"] = password
+                created.append(row.email)
+
+            if atomic and len(created) < len(pending):
+                conn.rollback()
+                rolled_back = True
+                created = []
+                for result in results:
+                    for key in ("tunnel_token", "password"):
+                        result.pop(key, None)
+                    result["id"] = None
+            else:
+                conn.commit()
+        finally:
+            conn.close()
+
+        if created:
+            log_activity(admin_id, "users_imported", _summarize_emails(created), ip=ip)
+
+        yield {
+            "event": "done",
+            "created": len(created),
+            "failed": len(results) - len(created),
+            "rolled_back": rolled_back,
+            "results": results,
+        }
+
+    if not stream:
+        final = None
+        async for event in run_import():
+            final = event
+        if final["rolled_back"]:
+            raise HTTPException(status_code=409, detail={"message": "Import rolled back; no users were created.", "results": results})
+        return {key: value for key, value in final.items() if key != "event"}
+
+    async def ndjson():
+        async for event in run_import():
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+USER_SORTS = ("created_at", "email", "tunnel_count")
+
+
 @router.get("")
-async def list_users(admin_id: int = Depends(verify_admin)):
-    """List all users (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
+async def list_users(
+    admin_id: int = Depends(verify_admin),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    email: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_admin: Optional[bool] = None
+):
+    """
+    List users (admin only), streamed.
+
+    Query Parameters:
+    - limit: Page size (1-1000); omit for all users
+    - cursor: next_cursor from the previous page
+    - sort: created_at, email or tunnel_count; prefix - for descending (default: -created_at)
+    - email: Email prefix
+    - is_active / is_admin: Filter by flag
+    """
+    try:
+        column, descending = parse_sort(sort, USER_SORTS, "-created_at")
+        # Users pending deletion are hidden
+        where_clauses, params = ["u.deleted_at IS NULL"], []
+        if cursor:
+            clause, values = keyset_clause(f"u.{column}", "u.id", descending, cursor)
+            where_clauses.append(clause)
+            params.extend(values)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if email:
+        clause, values = prefix_range("u.email", email)
+        where_clauses.append(clause)
+        params.extend(values)
+    if is_active is not None:
+        where_clauses.append("u.is_active = ?")
+        params.append(int(is_active))
+    if is_admin is not None:
+        where_clauses.append("u.is_admin = ?")
+        params.append(int(is_admin))
+
+    limit = clamp_limit(limit)
+    where_sql = " AND ".join(where_clauses)
+    direction = "DESC" if descending else "ASC"
+
+    # Load the page before streaming, so the read lock isn't held while a
+    # slow client downloads it
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    try:
+        rows = conn.execute(f"""
+            SELECT u.id, u.email, u.token, u.is_admin, u.is_active, u.max_tunnels,
+                   u.tunnel_count, u.created_at, u.last_login,
+                   (SELECT COUNT(*) FROM tunnels t WHERE t.user_id = u.id AND t.is_active = 1) as active_tunnels
+            FROM users u
+            WHERE {where_sql}
+            ORDER BY u.{column} {direction}, u.id {direction}
+            {"LIMIT ?" if limit is not None else ""}
+        """, params + ([limit + 1] if limit is not None else [])).fetchall()
+    finally:
+        conn.close()
 
-    cursor.execute("""
-        SELECT u.id, u.email, u.token, u.is_admin, u.is_active, u.max_tunnels,
-               u.created_at, u.last_login,
-               COUNT(t.id) as active_tunnels
-        FROM users u
-        LEFT JOIN tunnels t ON u.id = t.user_id AND t.is_active = 1
-        GROUP BY u.id
-        ORDER BY u.created_at DESC
-    """)
-
-    users = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    page: Dict[str, Any] = {}
+    users = paginate((dict(row) for row in rows), limit, column, page)
 
-    return {"users": users}
+    return StreamingResponse(stream_json("users", users, page), media_type="application/json")
 
 
 @router.put("/{user_id}")
-async def update_user(user_id: int, update: UserUpdate, admin_id: int = Depends(verify_admin)):
+async def update_user(user_id: int, update: UserUpdate, request: Request, admin_id: int = Depends(verify_admin)):
     """Update user (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
     updates = []
@@ -88,49 +285,59 @@ async def update_user(user_id: int, update: UserUpdate, admin_id: int = Depends(
 
     if updates:
         params.append(user_id)
-        cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = ?", params)
+        cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = ? AND deleted_at IS NULL", params)
         conn.commit()
 
     conn.close()
 
-    log_activity(admin_id, "user_updated", f"Updated user {user_id}")
+    log_activity(admin_id, "user_updated", f"Updated user {user_id}", ip=get_client_ip(request))
 
     return {"message": "User updated successfully"}
 
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int, admin_id: int = Depends(verify_admin)):
-    """Delete user (admin only)"""
-    conn = sqlite3.connect(DB_FILE)
+async def delete_user(user_id: int, request: Request, admin_id: int = Depends(verify_admin)):
+    """
+    Delete user (admin only).
+
+    The user is disabled and marked deleted right away, and their email is
+    replaced with a tombstone so it can be reused at once; their tunnels,
+    SSH keys, metrics and activity are removed by a background job (see
+    GET /api/jobs/{job_id}).
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
-    # Delete user's tunnels first
-    cursor.execute("DELETE FROM tunnels WHERE user_id = ?", (user_id,))
-    cursor.execute("DELETE FROM users WHERE id = ? AND is_admin = 0", (user_id,))
+    cursor.execute("""
+        UPDATE users SET deleted_at = CURRENT_TIMESTAMP, is_active = 0, email = 'deleted-' || id || '@deleted.invalid'
+        WHERE id = ? AND is_admin = 0 AND deleted_at IS NULL
+    """, (user_id,))
 
     if cursor.rowcount == 0:
         conn.close()
         raise HTTPException(status_code=400, detail="Cannot delete admin or user not found")
 
+    job_id = enqueue_deletion(cursor, "user", target_id=user_id, created_by=admin_id)
     conn.commit()
     conn.close()
+    deletion_worker.wake()
 
-    log_activity(admin_id, "user_deleted", f"Deleted user {user_id}")
+    log_activity(admin_id, "user_deleted", f"Deleted user {user_id}", ip=get_client_ip(request))
 
-    return {"message": "User deleted successfully"}
+    return {"message": "User deleted successfully", "job_id": job_id}
 
 
 @router.post("/{user_id}/regenerate-token")
-async def regenerate_token(user_id: int, admin_id: int = Depends(verify_admin)):
+async def regenerate_token(user_id: int, request: Request, admin_id: int = Depends(verify_admin)):
     """Regenerate user's tunnel token (admin only)"""
     new_token = secrets.token_hex(32)
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
-    cursor.execute("UPDATE users SET token = ? WHERE id = ?", (new_token, user_id))
+    cursor.execute("UPDATE users SET token = ? WHERE id = ? AND deleted_at IS NULL", (new_token, user_id))
     conn.commit()
     conn.close()
 
-    log_activity(admin_id, "token_regenerated", f"Regenerated token for user {user_id}")
+    log_activity(admin_id, "token_regenerated", f"Regenerated token for user {user_id}", ip=get_client_ip(request))
 
     return {"token": new_token}
@@ -0,0 +1,224 @@
+"""
+Production server launcher
+
+A small supervisor process binds the listening socket once and runs
+WEB_CONCURRENCY uvicorn workers on it (one per CPU by default), using uvloop
+and httptools when they are installed. Workers that die are restarted.
+
+SIGHUP reloads without downtime: a new generation of workers is started on
+the same socket, and only once they are serving are the old ones sent
+SIGTERM. Old workers stop accepting, finish in-flight requests (metric
+reports included) for up to SERVER_GRACEFUL_TIMEOUT seconds and run their
+lifespan shutdown, which flushes queued activity and heartbeats. SIGTERM or
+SIGINT stops every worker the same way.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+
+from .config import (
+    SERVER_BACKLOG,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_KEEPALIVE,
+    SERVER_LIMIT_CONCURRENCY,
+    SERVER_PORT,
+    WEB_CONCURRENCY,
+)
+
+logger = logging.getLogger("tunnel_server.launcher")
+
+_spawn = multiprocessing.get_context("spawn")
+
+
+def detect_loop() -> str:
+    """uvloop if installed, else the stdlib asyncio loop"""
+    return "uvloop" if find_spec("uvloop") else "asyncio"
+
+
+def detect_http() -> str:
+    """httptools if installed, else the pure-Python h11 parser"""
+    return "httptools" if find_spec("httptools") else "h11"
+
+
+def worker_count(requested: int = WEB_CONCURRENCY) -> int:
+    """Requested worker count, or one per CPU when 0"""
+    return requested if requested > 0 else (os.cpu_count() or 1)
+
+
+def server_settings(**overrides: Any) -> Dict[str, Any]:
+    """
+    uvicorn.Config keyword arguments from the SERVER_* settings.
+
+    The app is passed as an import string so each spawned worker imports it
+    fresh (which is also what makes a reload pick up new code).
+    """
+    settings = {
+        "app": "main:app",
+        "host": SERVER_HOST,
+        "port": SERVER_PORT,
+        "loop": detect_loop(),
+        "http": detect_http(),
+        "backlog": SERVER_BACKLOG,
+        "timeout_keep_alive": SERVER_KEEPALIVE,
+        "limit_concurrency": SERVER_LIMIT_CONCURRENCY or None,
+        "timeout_graceful_shutdown": SERVER_GRACEFUL_TIMEOUT,
+    }
+    settings.update(overrides)
+    return settings
+
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn server that reports when it is accepting connections"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if self.started:
+            self._ready.set()
+
+
+def _run_worker(config: uvicorn.Config, sock: socket.socket, ready) -> None:
+    """Worker process body: serve the app on the supervisor's socket"""
+    config.configure_logging()
+    _WorkerServer(config, ready).run(sockets=[sock])
+
+
+class _Worker:
+    def __init__(self, config: uvicorn.Config, sock: socket.socket):
+        self.ready = _spawn.Event()
+        self.process = _spawn.Process(target=_run_worker, args=(config, sock, self.ready), daemon=False)
+        self.process.start()
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGTERM)
+
+
+class Supervisor:
+    """Owns the listening socket and keeps a generation of workers running on it"""
+
+    def __init__(self, config: uvicorn.Config, workers: int, startup_timeout: float = 60):
+        self.config = config
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self._sock: Optional[socket.socket] = None
+        self._current: List[_Worker] = []
+        self._signals: List[int] = []
+
+    def _on_signal(self, signum: int, frame) -> None:
+        self._signals.append(signum)
+
+    def _spawn_generation(self) -> List[_Worker]:
+        return [_Worker(self.config, self._sock) for _ in range(self.workers)]
+
+    def _wait_ready(self, workers: List[_Worker]) -> bool:
+        deadline = time.monotonic() + self.startup_timeout
+        for worker in workers:
+            while not worker.ready.wait(0.1):
+                if not worker.process.is_alive() or time.monotonic() > deadline:
+                    return False
+        return True
+
+    def _stop(self, workers: List[_Worker]) -> None:
+        """SIGTERM workers and wait for their graceful shutdown (then kill stragglers)"""
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + (SERVER_GRACEFUL_TIMEOUT or 30) + 10
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.process.pid} did not stop in time; killing it")
+                worker.process.kill()
+                worker.process.join()
+
+    def reload(self) -> None:
+        """Start a new generation, then retire the old one once the new one serves"""
+        logger.info(f"Reloading: starting {self.workers} new worker(s)")
+        new = self._spawn_generation()
+        if not self._wait_ready(new):
+            logger.error("New workers failed to start; keeping the current ones")
+            self._stop(new)
+            return
+        old, self._current = self._current, new
+        self._stop(old)
+        logger.info("Reload complete")
+
+    def _replace_dead(self) -> None:
+        for index, worker in enumerate(self._current):
+            if not worker.process.is_alive():
+                logger.warning(f"Worker {worker.process.pid} exited ({worker.process.exitcode}); restarting it")
+                self._current[index] = _Worker(self.config, self._sock)
+
+    def run(self) -> None:
+        self._sock = self.config.bind_socket()
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+
+        logger.info(
+            f"Starting {self.workers} worker(s) on {self.config.host}:{self.config.port} "
+            f"(loop={self.config.loop}, http={self.config.http}, supervisor pid {os.getpid()})"
+        )
+        self._current = self._spawn_generation()
+        try:
+            while True:
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                    else:
+                        logger.info("Shutting down workers")
+                        return
+                self._replace_dead()
+                time.sleep(0.5)
+        finally:
+            self._stop(self._current)
+            self._sock.close()
+
+
+def share_jwt_secret() -> None:
+    """
+    Pin the JWT signing key for the workers.
+
+    Spawned workers re-import app.config, so without JWT_SECRET each would
+    generate its own key and reject tokens issued by the others. The
+    supervisor's generated key is exported instead (tokens still stop
+    working when the supervisor restarts).
+    """
+    if not os.getenv("JWT_SECRET"):
+        from .config import SECRET_KEY
+        os.environ["JWT_SECRET"] = SECRET_KEY
+        logger.warning("JWT_SECRET not set; using a generated key until the server restarts")
+
+
+def serve(**overrides: Any) -> None:
+    """Prepare the database once, then run the supervised workers"""
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    share_jwt_secret()
+
+    # Create the schema and calibrate (and store) the bcrypt cost before any
+    # worker starts; the workers' lifespan then finds both already in place
+    from .database import init_db
+    from .services.auth import configure_bcrypt_rounds
+    init_db()
+    configure_bcrypt_rounds()
+
+    settings = server_settings(**overrides)
+    workers = worker_count(settings.pop("workers", WEB_CONCURRENCY))
+    # Resolved count for the workers (e.g. to size their hashing pools)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    Supervisor(uvicorn.Config(**settings), workers).run()
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,18 +1,332 @@
 """
 Activity logging service
+
+Callers enqueue events without touching the database; a background writer
+thread drains the queue and inserts events in multi-row transactions.
 """
+import base64
+import logging
+import queue
 import sqlite3
-from typing import Optional
-from ..config import DB_FILE
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import (
+    DB_BUSY_TIMEOUT,
+    DB_FILE,
+    ACTIVITY_QUEUE_SIZE,
+    ACTIVITY_BATCH_SIZE,
+    ACTIVITY_FLUSH_INTERVAL,
+    ACTIVITY_RETENTION_DAYS,
+)
+
+logger = logging.getLogger(__name__)
+
+ActivityEvent = Tuple[Optional[int], str, str, str, str]
+
+_STOP = object()
+
+
+def _write_events(events: List[ActivityEvent]) -> None:
+    """Insert a batch of events in a single transaction"""
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    try:
+        conn.executemany("""
+            INSERT INTO activity_logs (user_id, action, details, ip_address, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, events)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class ActivityLogWriter:
+    """Bounded queue plus a background thread that batches activity inserts"""
+
+    def __init__(
+        self,
+        max_queue: int = ACTIVITY_QUEUE_SIZE,
+        batch_size: int = ACTIVITY_BATCH_SIZE,
+        flush_interval: float = ACTIVITY_FLUSH_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the writer thread (no-op if already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything queued so far and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+        # Events that raced in behind the stop marker are written inline
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._write(leftovers)
+
+    def enqueue(self, event: ActivityEvent) -> bool:
+        """Queue an event without blocking; returns False if it was dropped"""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._counters_lock:
+                self._counters["dropped"] += 1
+            return False
+        with self._counters_lock:
+            self._counters["enqueued"] += 1
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], self._queue.qsize())
+        return True
+
+    def flush(self) -> None:
+        """Block until every event queued so far has been written"""
+        if self.running:
+            self._queue.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = []
+            taken = 1
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+
+            # Drain whatever else is already waiting, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+
+    def _write(self, batch: List[ActivityEvent]) -> None:
+        try:
+            _write_events(batch)
+            with self._counters_lock:
+                self._counters["written"] += len(batch)
+                self._counters["batches"] += 1
+        except Exception as e:
+            with self._counters_lock:
+                self._counters["failed"] += len(batch)
+            logger.error(f"Failed to write {len(batch)} activity events: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "running": self.running,
+        }
+
+
+# Singleton writer started and stopped by the app lifespan
+activity_writer = ActivityLogWriter()
 
 
 def log_activity(user_id: Optional[int], action: str, details: str = "", ip: str = ""):
-    """Log user activity to database"""
-    conn = sqlite3.connect(DB_FILE)
+    """Log user activity (queued; written synchronously if the writer isn't running)"""
+    event = (user_id, action, details, ip or "", datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+    if activity_writer.running:
+        activity_writer.enqueue(event)
+    else:
+        _write_events([event])
+
+
+def encode_cursor(created_at: str, log_id: int) -> str:
+    """Encode a keyset position as an opaque cursor"""
+    return base64.urlsafe_b64encode(f"{created_at}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor from encode_cursor; raises ValueError if malformed"""
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return created_at, int(log_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query of quoted prefix terms (all must match)"""
+    terms = [t.replace('"', '""') for t in text.split()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def query_activity(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    search: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Keyset-paginated activity logs, newest first.
+
+    Args:
+        limit: Max rows per page (1-500)
+        cursor: next_cursor from the previous page
+        user_id, action: Exact-match filters
+        since, until: created_at bounds ('YYYY-MM-DD HH:MM:SS', UTC)
+        search: Full-text search over details
+
+    Returns:
+        Dict with logs and next_cursor (None on the last page)
+    """
+    limit = max(1, min(limit, 500))
+
+    where_clauses = []
+    params: List[Any] = []
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        where_clauses.append("(a.created_at, a.id) < (?, ?)")
+        params.extend([cursor_created_at, cursor_id])
+
+    if user_id is not None:
+        where_clauses.append("a.user_id = ?")
+        params.append(user_id)
+
+    if action:
+        where_clauses.append("a.action = ?")
+        params.append(action)
+
+    if since:
+        where_clauses.append("a.created_at >= ?")
+        params.append(since)
+
+    if until:
+        where_clauses.append("a.created_at < ?")
+        params.append(until)
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    db_cursor = conn.cursor()
+
+    if search and search.strip():
+        db_cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'activity_logs_fts'")
+        if db_cursor.fetchone():
+            where_clauses.append("a.id IN (SELECT rowid FROM activity_logs_fts WHERE activity_logs_fts MATCH ?)")
+            params.append(_fts_query(search))
+        else:
+            where_clauses.append("a.details LIKE ?")
+            params.append(f"%{search.strip()}%")
+
+    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+
+    db_cursor.execute(f"""
+        SELECT a.*, u.email
+        FROM activity_logs a
+        LEFT JOIN users u ON a.user_id = u.id
+        WHERE {where_sql}
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT ?
+    """, params + [limit + 1])
+    logs = [dict(row) for row in db_cursor.fetchall()]
+    conn.close()
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1]["created_at"], logs[-1]["id"])
+
+    return {"logs": logs, "next_cursor": next_cursor}
+
+
+def archive_old_activity(days: int = ACTIVITY_RETENTION_DAYS, batch_size: int = 1000) -> int:
+    """
+    Move activity logs older than `days` into activity_logs_archive.
+
+    Works in small batches so the write lock is never held for long.
+    Returns number of rows archived.
+    """
+    if days <= 0:
+        return 0
+
+    cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    archived = 0
+
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO activity_logs (user_id, action, details, ip_address)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, action, details, ip))
-    conn.commit()
+    while True:
+        cursor.execute("""
+            SELECT id FROM activity_logs
+            WHERE created_at < ?
+            ORDER BY created_at, id
+            LIMIT ?
+        """, (cutoff, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            break
+
+        placeholders = ", ".join("?" for _ in ids)
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO activity_logs_archive (id, user_id, action, details, ip_address, created_at)
+            SELECT id, user_id, action, details, ip_address, created_at
+            FROM activity_logs WHERE id IN ({placeholders})
+        """, ids)
+        cursor.execute(f"DELETE FROM activity_logs WHERE id IN ({placeholders})", ids)
+        conn.commit()
+        archived += len(ids)
+
     conn.close()
+
+    if archived > 0:
+        logger.info(f"Archived {archived} activity log records older than {days} days")
+
+    return archived
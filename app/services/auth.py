@@ -1,10 +1,31 @@
 """
 Authentication services - JWT creation, password hashing
 """
+import json
+import logging
+import math
+import sqlite3
+import time
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 import jwt
 import bcrypt
-from ..config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_TARGET_MS,
+    BCRYPT_MIN_ROUNDS,
+    BCRYPT_MAX_ROUNDS,
+    BCRYPT_ROUNDS,
+    DB_BUSY_TIMEOUT,
+    DB_FILE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cost factor used for new hashes (set by configure_bcrypt_rounds at startup)
+_bcrypt_rounds: Optional[int] = None
 
 
 def create_access_token(data: dict) -> str:
@@ -15,11 +36,121 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def hash_password(password: str) -> bytes:
+def time_bcrypt_hash(rounds: int, samples: int = 3) -> float:
+    """Return the fastest of several hash timings at the given cost, in milliseconds"""
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", bcrypt.gensalt(rounds=rounds))
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: int = BCRYPT_TARGET_MS,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS
+) -> int:
+    """
+    Pick the highest cost whose hash time stays within target_ms on this machine.
+
+    Only min_rounds is measured; each extra round doubles the work, so the
+    rest is extrapolated instead of paying for slow hashes at startup.
+    """
+    base_ms = time_bcrypt_hash(min_rounds)
+    if base_ms >= target_ms:
+        return min_rounds
+    extra = int(math.floor(math.log2(target_ms / base_ms)))
+    return max(min_rounds, min(max_rounds, min_rounds + extra))
+
+
+def _shared_bcrypt_rounds() -> int:
+    """
+    The calibrated cost stored in server_settings, calibrating if none is
+    stored yet (or it was chosen for another BCRYPT_TARGET_MS).
+
+    The first process to store a cost wins, so every worker and restart
+    hashes with the same cost instead of its own noisy measurement.
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    try:
+        row = conn.execute("SELECT value FROM server_settings WHERE key = 'bcrypt_rounds'").fetchone()
+        stored = json.loads(row[0]) if row else None
+        if stored and stored.get("target_ms") == BCRYPT_TARGET_MS:
+            return stored["rounds"]
+
+        rounds = calibrate_bcrypt_rounds()
+        logger.info(f"Calibrated bcrypt cost to {rounds} (target {BCRYPT_TARGET_MS} ms)")
+        value = json.dumps({"rounds": rounds, "target_ms": BCRYPT_TARGET_MS})
+        # Insert, or replace a cost calibrated for another target; a
+        # concurrent worker's fresh row is kept
+        conn.execute("""
+            INSERT INTO server_settings (key, value, updated_at) VALUES ('bcrypt_rounds', ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            WHERE json_extract(server_settings.value, '$.target_ms') IS NOT ?
+        """, (value, time.time(), BCRYPT_TARGET_MS))
+        conn.commit()
+        row = conn.execute("SELECT value FROM server_settings WHERE key = 'bcrypt_rounds'").fetchone()
+        return json.loads(row[0])["rounds"]
+    finally:
+        conn.close()
+
+
+def configure_bcrypt_rounds() -> int:
+    """Set the cost for new hashes from BCRYPT_ROUNDS or the shared calibrated cost"""
+    global _bcrypt_rounds
+    if BCRYPT_ROUNDS:
+        _bcrypt_rounds = BCRYPT_ROUNDS
+    else:
+        try:
+            _bcrypt_rounds = _shared_bcrypt_rounds()
+        except sqlite3.OperationalError:
+            # Database not initialized yet: calibrate for this process only
+            _bcrypt_rounds = calibrate_bcrypt_rounds()
+    return _bcrypt_rounds
+
+
+def get_bcrypt_rounds() -> int:
+    """Get the cost factor for new hashes, calibrating on first use"""
+    if _bcrypt_rounds is None:
+        return configure_bcrypt_rounds()
+    return _bcrypt_rounds
+
+
+def get_hash_rounds(password_hash: bytes) -> Optional[int]:
+    """Read the cost factor stored in a bcrypt hash ($2b$<cost>$...)"""
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode()
+    try:
+        return int(password_hash.split(b"$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash: bytes) -> bool:
+    """Check if a hash was made with a lower cost than the current one"""
+    rounds = get_hash_rounds(password_hash)
+    return rounds is None or rounds < get_bcrypt_rounds()
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> bytes:
     """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds or get_bcrypt_rounds()))
 
 
 def verify_password(password: str, password_hash: bytes) -> bool:
     """Verify password against hash"""
     return bcrypt.checkpw(password.encode(), password_hash)
+
+
+def benchmark_bcrypt_costs(min_rounds: int = 4, max_rounds: int = BCRYPT_MAX_ROUNDS) -> List[Dict[str, float]]:
+    """Measure hash and verify time for each cost factor on this machine"""
+    results = []
+    for rounds in range(min_rounds, max_rounds + 1):
+        hash_ms = time_bcrypt_hash(rounds, samples=1)
+        hashed = bcrypt.hashpw(b"benchmark-password", bcrypt.gensalt(rounds=rounds))
+        start = time.perf_counter()
+        bcrypt.checkpw(b"benchmark-password", hashed)
+        verify_ms = (time.perf_counter() - start) * 1000
+        results.append({"rounds": rounds, "hash_ms": round(hash_ms, 2), "verify_ms": round(verify_ms, 2)})
+    return results
@@ -0,0 +1,111 @@
+"""
+Tunnel change journal for delta sync
+
+Triggers append a row to tunnel_changes for every tunnel insert, update and
+delete (and owner email change), so clients holding a version can fetch
+just what changed since. Rows older than TUNNEL_CHANGES_RETENTION_HOURS are
+pruned; a client whose version predates the oldest kept row must resync.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, TUNNEL_CHANGES_RETENTION_HOURS
+
+logger = logging.getLogger(__name__)
+
+# How often a long-poll re-checks the journal (one indexed lookup)
+POLL_INTERVAL = 0.5
+
+
+def current_version(cursor: sqlite3.Cursor) -> int:
+    """Latest journal version; AUTOINCREMENT keeps it monotonic even after pruning"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tunnel_changes'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def has_changes(cursor: sqlite3.Cursor, since: int, user_id: Optional[int] = None) -> bool:
+    """True if the journal has entries after `since` (for one owner, or all if user_id is None)"""
+    if user_id is None:
+        cursor.execute("SELECT 1 FROM tunnel_changes WHERE version > ? LIMIT 1", (since,))
+    else:
+        cursor.execute(
+            "SELECT 1 FROM tunnel_changes WHERE user_id = ? AND version > ? LIMIT 1", (user_id, since)
+        )
+    return cursor.fetchone() is not None
+
+
+def get_changes(cursor: sqlite3.Cursor, since: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Collapse journal entries after `since` to the latest op per tunnel.
+
+    Returns dict with the current version, reset (True when `since` is older
+    than the retained journal or newer than the database, so the client must
+    do a full fetch), upserted tunnel ids and deleted tunnel ids.
+    """
+    version = current_version(cursor)
+    cursor.execute("SELECT MIN(version) FROM tunnel_changes")
+    oldest = cursor.fetchone()[0] or version + 1
+    if since > version or since < oldest - 1:
+        return {"version": version, "reset": True, "upserted": [], "deleted": []}
+
+    if user_id is None:
+        cursor.execute("""
+            SELECT tunnel_id, op FROM tunnel_changes
+            WHERE version > ? AND version <= ?
+            ORDER BY version
+        """, (since, version))
+    else:
+        cursor.execute("""
+            SELECT tunnel_id, op FROM tunnel_changes
+            WHERE user_id = ? AND version > ? AND version <= ?
+            ORDER BY version
+        """, (user_id, since, version))
+
+    latest: Dict[int, str] = {}
+    for tunnel_id, op in cursor.fetchall():
+        latest[tunnel_id] = op
+
+    return {
+        "version": version,
+        "reset": False,
+        "upserted": [tunnel_id for tunnel_id, op in latest.items() if op == "upsert"],
+        "deleted": [tunnel_id for tunnel_id, op in latest.items() if op == "delete"],
+    }
+
+
+async def wait_for_changes(since: int, user_id: Optional[int], timeout: float) -> bool:
+    """Long-poll until the journal has entries after `since` or `timeout` passes; returns whether it did"""
+    deadline = time.monotonic() + timeout
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    try:
+        cursor = conn.cursor()
+        while True:
+            if has_changes(cursor, since, user_id) or since > current_version(cursor):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+    finally:
+        conn.close()
+
+
+def prune_tunnel_changes(hours: float = TUNNEL_CHANGES_RETENTION_HOURS) -> int:
+    """Delete journal rows older than `hours`; returns number removed (0 disables)"""
+    if hours <= 0:
+        return 0
+    cutoff = (datetime.utcnow() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM tunnel_changes WHERE changed_at < ?", (cutoff,))
+    removed = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if removed:
+        logger.info(f"Pruned {removed} tunnel change journal entries")
+    return removed
@@ -0,0 +1,78 @@
+"""
+Maintained user/tunnel counters for the stats overview
+
+The stats_counters row is kept current by triggers on users and tunnels
+(see database._init_stats_counters); reading it replaces COUNT(*) scans.
+"""
+import logging
+import sqlite3
+from typing import Any, Dict
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
+from ..database import COUNTER_RECOMPUTE_SQL
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLUMNS = (
+    "users_total",
+    "users_active",
+    "tunnels_total",
+    "tunnels_active",
+    "tunnels_http",
+    "tunnels_https",
+    "tunnels_tcp",
+    "tunnels_ssh",
+)
+
+
+def get_counters() -> Dict[str, int]:
+    """Read the counters row"""
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(COUNTER_COLUMNS)} FROM stats_counters WHERE id = 1")
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else {column: 0 for column in COUNTER_COLUMNS}
+
+
+def reconcile_counters() -> Dict[str, Any]:
+    """
+    Recompute every counter from the source tables and repair drift.
+
+    Also repairs users.tunnel_count. Returns dict with the corrected
+    counters, a drift map of column -> (stored, actual) for every column
+    that was wrong, and the number of users whose tunnel_count was fixed.
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute(f"SELECT {', '.join(COUNTER_COLUMNS)} FROM stats_counters WHERE id = 1")
+    row = cursor.fetchone()
+    stored = dict(row) if row else {}
+
+    cursor.execute("INSERT OR IGNORE INTO stats_counters (id) VALUES (1)")
+    cursor.execute(f"UPDATE stats_counters SET {COUNTER_RECOMPUTE_SQL} WHERE id = 1")
+    cursor.execute(f"SELECT {', '.join(COUNTER_COLUMNS)} FROM stats_counters WHERE id = 1")
+    actual = dict(cursor.fetchone())
+    cursor.execute("""
+        UPDATE users SET tunnel_count = (SELECT COUNT(*) FROM tunnels WHERE tunnels.user_id = users.id)
+        WHERE tunnel_count != (SELECT COUNT(*) FROM tunnels WHERE tunnels.user_id = users.id)
+    """)
+    tunnel_counts_repaired = cursor.rowcount
+    conn.commit()
+    conn.close()
+
+    drift = {
+        column: (stored.get(column), actual[column])
+        for column in COUNTER_COLUMNS
+        if stored.get(column) != actual[column]
+    }
+    if drift:
+        logger.warning(f"Repaired stats counter drift: {drift}")
+    if tunnel_counts_repaired:
+        logger.warning(f"Repaired tunnel_count for {tunnel_counts_repaired} users")
+
+    return {"counters": actual, "drift": drift, "tunnel_counts_repaired": tunnel_counts_repaired}
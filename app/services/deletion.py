@@ -0,0 +1,252 @@
+"""
+Background cascade deletion
+
+Deleting a user only marks the row (users.deleted_at) and queues a job;
+deleting tunnels removes the tunnel rows and queues a job for what hangs off
+them. A background worker then removes dependent rows (tunnels, health,
+metrics, SSH keys, activity) in batches of DELETION_BATCH_SIZE, each in its
+own short transaction with a pause in between, so other writers are never
+locked out for long. Job state lives in deletion_jobs, so an interrupted job
+resumes from its current step after a restart.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, DELETION_BATCH_SIZE, DELETION_BATCH_PAUSE
+from .heartbeat import heartbeat_store
+from .ports import port_allocator
+
+logger = logging.getLogger(__name__)
+
+# Tables cleaned for the tunnel ids recorded on a job
+_TUNNEL_ROWS = {
+    "tunnel_health": "tunnel_id IN (SELECT value FROM json_each(?))",
+    "tunnel_metrics": "tunnel_id IN (SELECT value FROM json_each(?))",
+    "request_metrics": "tunnel_id IN (SELECT value FROM json_each(?))",
+}
+
+# Tables cleaned for a deleted user
+_USER_ROWS = {
+    "ssh_keys": "user_id = ?",
+    "activity_logs": "user_id = ?",
+    "activity_logs_archive": "user_id = ?",
+}
+
+JOB_STEPS = {
+    "user": ("tunnels", *_TUNNEL_ROWS, *_USER_ROWS, "user"),
+    "tunnels": tuple(_TUNNEL_ROWS),
+}
+
+
+def enqueue_deletion(
+    cursor: sqlite3.Cursor,
+    kind: str,
+    target_id: Optional[int] = None,
+    tunnel_ids: Optional[List[int]] = None,
+    created_by: Optional[int] = None
+) -> int:
+    """
+    Queue a deletion job inside the caller's transaction; returns the job id.
+
+    Call deletion_worker.wake() after committing to start it right away.
+    """
+    cursor.execute("""
+        INSERT INTO deletion_jobs (kind, target_id, tunnel_ids, step, created_by)
+        VALUES (?, ?, ?, ?, ?)
+    """, (kind, target_id, json.dumps(tunnel_ids or []), JOB_STEPS[kind][0], created_by))
+    return cursor.lastrowid
+
+
+def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["tunnel_count"] = len(json.loads(job.pop("tunnel_ids")))
+    job["progress"] = json.loads(job["progress"])
+    return job
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM deletion_jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return _job_dict(row) if row else None
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent jobs first, optionally filtered by status"""
+    limit = max(1, min(limit, 500))
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    if status:
+        rows = conn.execute(
+            "SELECT * FROM deletion_jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM deletion_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [_job_dict(row) for row in rows]
+
+
+class DeletionWorker:
+    """Runs queued deletion jobs one batch at a time"""
+
+    def __init__(self, batch_size: int = DELETION_BATCH_SIZE, pause: float = DELETION_BATCH_PAUSE, poll_interval: float = 30):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self) -> None:
+        """Start queued jobs now instead of at the next poll (call from the event loop)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def recover(self) -> int:
+        """Requeue jobs left running by a previous process; returns count"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE deletion_jobs SET status = 'pending' WHERE status = 'running'")
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def _next_job_id(self) -> Optional[int]:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        row = conn.execute(
+            "SELECT id FROM deletion_jobs WHERE status IN ('pending', 'running') ORDER BY id LIMIT 1"
+        ).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def _delete_tunnels(self, cursor: sqlite3.Cursor, job: sqlite3.Row) -> Tuple[int, List[sqlite3.Row]]:
+        """Delete one batch of the user's tunnels, recording their ids on the job for the metric steps"""
+        cursor.execute(
+            "SELECT id, remote_port FROM tunnels WHERE user_id = ? LIMIT ?",
+            (job["target_id"], self.batch_size)
+        )
+        tunnels = cursor.fetchall()
+        if not tunnels:
+            return 0, []
+        ids = [t["id"] for t in tunnels]
+        cursor.execute(f"DELETE FROM tunnels WHERE id IN ({','.join('?' * len(ids))})", ids)
+        cursor.execute(
+            "UPDATE deletion_jobs SET tunnel_ids = ? WHERE id = ?",
+            (json.dumps(json.loads(job["tunnel_ids"]) + ids), job["id"])
+        )
+        return len(ids), tunnels
+
+    def run_batch(self, job_id: int) -> bool:
+        """
+        Run one batch of a job's current step in its own transaction.
+
+        Moves to the next step when a step has nothing left and marks the
+        job done after the last. Returns True while work remains.
+        """
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        released: List[sqlite3.Row] = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            job = cursor.execute("SELECT * FROM deletion_jobs WHERE id = ?", (job_id,)).fetchone()
+            if not job or job["status"] in ("done", "failed"):
+                conn.rollback()
+                return False
+
+            step = job["step"]
+            if step == "tunnels":
+                deleted, released = self._delete_tunnels(cursor, job)
+            elif step == "user":
+                cursor.execute("DELETE FROM users WHERE id = ? AND deleted_at IS NOT NULL", (job["target_id"],))
+                deleted = cursor.rowcount
+            else:
+                where = _TUNNEL_ROWS.get(step) or _USER_ROWS[step]
+                param = job["tunnel_ids"] if step in _TUNNEL_ROWS else job["target_id"]
+                cursor.execute(f"""
+                    DELETE FROM {step} WHERE rowid IN (
+                        SELECT rowid FROM {step} WHERE {where} LIMIT ?
+                    )
+                """, (param, self.batch_size))
+                deleted = cursor.rowcount
+
+            progress = json.loads(job["progress"])
+            progress[step] = progress.get(step, 0) + deleted
+
+            steps = JOB_STEPS[job["kind"]]
+            status, next_step = "running", step
+            if deleted < self.batch_size or step == "user":
+                index = steps.index(step) + 1
+                if index < len(steps):
+                    next_step = steps[index]
+                else:
+                    status, next_step = "done", None
+
+            cursor.execute("""
+                UPDATE deletion_jobs
+                SET status = ?, step = ?, rows_deleted = rows_deleted + ?, progress = ?,
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                    finished_at = CASE WHEN ? = 'done' THEN CURRENT_TIMESTAMP END
+                WHERE id = ?
+            """, (status, next_step, deleted, json.dumps(progress), status, job_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        for tunnel in released:
+            port_allocator.release(tunnel["remote_port"])
+            heartbeat_store.forget(tunnel["id"])
+
+        return status != "done"
+
+    def _fail(self, job_id: int, error: str) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.execute(
+            "UPDATE deletion_jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (error, job_id)
+        )
+        conn.commit()
+        conn.close()
+
+    async def process(self, job_id: int) -> None:
+        """Run a job to completion, yielding to other work between batches"""
+        try:
+            while await asyncio.to_thread(self.run_batch, job_id):
+                await asyncio.sleep(self.pause)
+        except Exception as e:
+            logger.error(f"Deletion job {job_id} failed: {e}")
+            await asyncio.to_thread(self._fail, job_id, str(e))
+
+    async def run_pending(self) -> int:
+        """Run every queued job; returns how many were run"""
+        count = 0
+        while True:
+            job_id = await asyncio.to_thread(self._next_job_id)
+            if job_id is None:
+                return count
+            await self.process(job_id)
+            count += 1
+
+    async def run(self) -> None:
+        """Background loop: run queued jobs, then wait for wake() or the next poll"""
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_pending()
+            except Exception as e:
+                logger.error(f"Deletion worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Singleton worker started by the app lifespan
+deletion_worker = DeletionWorker()
@@ -1,115 +1,379 @@
 """
 Netlify DNS API integration for automatic DNS record management
+
+The zone is fetched once into a (hostname, type) index and trusted for
+DNS_CACHE_TTL seconds. Desired records are diffed against it and only the
+differences are sent to Netlify, over a pooled session that retries
+transient failures with backoff.
+
+Startup setup runs as a background task (dns_setup) in the leader worker,
+so the API comes up without waiting on the IP providers or Netlify. Its
+state is shared through server_settings so every worker reports the same
+readiness.
 """
+import asyncio
+import ipaddress
+import json
 import logging
-import requests
-from typing import Optional
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from typing import Any, Dict, List, Optional, Tuple
 
-from ..config import NETLIFY_API_TOKEN, NETLIFY_DNS_ZONE_ID, TUNNEL_DOMAIN
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import (
+    DB_BUSY_TIMEOUT,
+    DB_FILE,
+    DNS_CACHE_TTL,
+    NETLIFY_API_RATE,
+    NETLIFY_API_TOKEN,
+    NETLIFY_DNS_ZONE_ID,
+    PUBLIC_IP_FILE,
+    TUNNEL_DOMAIN,
+)
 
 logger = logging.getLogger(__name__)
 
 NETLIFY_API_BASE = "https://api.netlify.com/api/v1"
 
-# Cache for zone ID lookup
-_cached_zone_id: Optional[str] = None
+PUBLIC_IP_SERVICES = [
+    "https://api.ipify.org",
+    "https://ifconfig.me/ip",
+    "https://icanhazip.com",
+]
 
+RecordKey = Tuple[str, str]  # (hostname, type)
 
-def _get_zone_id() -> Optional[str]:
-    """
-    Get the DNS zone ID, either from config or by auto-detecting from the domain.
 
-    If NETLIFY_DNS_ZONE_ID is set, use it directly.
-    Otherwise, query Netlify API to find the zone for TUNNEL_DOMAIN.
+def create_session(retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
     """
-    global _cached_zone_id
+    Session with keep-alive and retry/backoff.
 
-    # Use configured zone ID if available
-    if NETLIFY_DNS_ZONE_ID:
-        return NETLIFY_DNS_ZONE_ID
+    Reads and deletes are retried on connection errors and 429/5xx
+    (honoring Retry-After); creates only on connection errors, since a
+    retried POST could add a duplicate record.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "DELETE"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class DnsReconciler:
+    """Cached view of one Netlify DNS zone that applies record diffs"""
+
+    def __init__(
+        self,
+        token: Optional[str] = NETLIFY_API_TOKEN,
+        zone_id: Optional[str] = NETLIFY_DNS_ZONE_ID,
+        domain: str = TUNNEL_DOMAIN,
+        cache_ttl: float = DNS_CACHE_TTL,
+        api_base: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        rate: float = NETLIFY_API_RATE,
+    ):
+        self.token = token
+        self.domain = domain
+        self.cache_ttl = cache_ttl
+        self.rate = rate
+        self._next_slot = 0.0
+        self._throttle_lock = threading.Lock()
+        self._api_base = api_base
+        self._zone_id = zone_id
+        self._session = session
+        self._records: Optional[Dict[RecordKey, List[Dict[str, Any]]]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def api_base(self) -> str:
+        # Resolved per call so tests can point the module constant at a fake server
+        return self._api_base or NETLIFY_API_BASE
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+
+    def _headers(self) -> dict:
+        """Get authorization headers for Netlify API"""
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+    def _throttle(self) -> None:
+        """Space API calls at least 1/rate seconds apart (0 = unlimited)"""
+        if not self.rate:
+            return
+        with self._throttle_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        self._throttle()
+        response = self.session.request(
+            method, f"{self.api_base}{path}", headers=self._headers(), timeout=10, **kwargs
+        )
+        response.raise_for_status()
+        return response
 
-    # Return cached value if we already looked it up
-    if _cached_zone_id:
-        return _cached_zone_id
+    def zone_id(self) -> Optional[str]:
+        """
+        Get the DNS zone ID, either from config or by auto-detecting from the domain.
 
-    if not NETLIFY_API_TOKEN or not TUNNEL_DOMAIN:
-        return None
+        If a zone ID was configured, use it directly. Otherwise, look up the
+        zone for the base domain once and remember it.
+        """
+        if self._zone_id:
+            return self._zone_id
+        if not self.token or not self.domain:
+            return None
 
-    # Extract the base domain (e.g., "ersantana.com" from "tunnel.ersantana.com")
-    parts = TUNNEL_DOMAIN.split(".")
-    if len(parts) >= 2:
-        base_domain = ".".join(parts[-2:])  # Last two parts
-    else:
-        base_domain = TUNNEL_DOMAIN
+        # Extract the base domain (e.g., "ersantana.com" from "tunnel.ersantana.com")
+        parts = self.domain.split(".")
+        base_domain = ".".join(parts[-2:]) if len(parts) >= 2 else self.domain
 
-    try:
-        response = requests.get(
-            f"{NETLIFY_API_BASE}/dns_zones",
-            headers=_get_headers(),
-            timeout=10,
-        )
-        response.raise_for_status()
-        zones = response.json()
+        try:
+            zones = self._request("GET", "/dns_zones").json()
+        except Exception as e:
+            logger.error(f"Failed to auto-detect DNS zone ID: {e}")
+            return None
 
         for zone in zones:
             if zone.get("name") == base_domain:
-                _cached_zone_id = zone.get("id")
-                logger.info(f"Auto-detected DNS zone ID for {base_domain}: {_cached_zone_id}")
-                return _cached_zone_id
+                self._zone_id = zone.get("id")
+                logger.info(f"Auto-detected DNS zone ID for {base_domain}: {self._zone_id}")
+                return self._zone_id
 
         logger.warning(f"No DNS zone found for domain {base_domain}")
         return None
-    except Exception as e:
-        logger.error(f"Failed to auto-detect DNS zone ID: {e}")
-        return None
 
+    def configured(self) -> bool:
+        return bool(self.token and self.zone_id())
+
+    def records(self, refresh: bool = False) -> Dict[RecordKey, List[Dict[str, Any]]]:
+        """
+        Zone records indexed by (hostname, type), fetched at most once per TTL.
+
+        Raises requests.RequestException if the zone can't be fetched.
+        """
+        with self._lock:
+            stale = time.monotonic() - self._fetched_at > self.cache_ttl
+            if self._records is None or refresh or stale:
+                zone_id = self.zone_id()
+                records = self._request("GET", f"/dns_zones/{zone_id}/dns_records").json()
+                index: Dict[RecordKey, List[Dict[str, Any]]] = {}
+                for record in records:
+                    index.setdefault((record.get("hostname"), record.get("type")), []).append(record)
+                self._records = index
+                self._fetched_at = time.monotonic()
+            return self._records
+
+    def invalidate(self) -> None:
+        """Drop the cached zone so the next read refetches it"""
+        with self._lock:
+            self._records = None
+
+    def plan(self, desired: Dict[RecordKey, Optional[str]]) -> Dict[str, List[Any]]:
+        """
+        Diff desired (hostname, type) -> value against the zone.
+
+        A key already holding the value keeps that record and loses any
+        duplicates; otherwise its records are replaced (Netlify has no update
+        for records). A value of None removes every record for the key. Keys
+        not in `desired` are never touched.
+        """
+        current = self.records()
+        create, delete, unchanged = [], [], []
+        for key, value in desired.items():
+            existing = current.get(key, [])
+            if value is None:
+                delete.extend(existing)
+                if not existing:
+                    unchanged.append(key)
+                continue
+            keep = next((r for r in existing if r.get("value") == value), None)
+            delete.extend(r for r in existing if r is not keep)
+            if keep:
+                unchanged.append(key)
+            else:
+                create.append((key, value))
+        return {"create": create, "delete": delete, "unchanged": unchanged}
+
+    def create_record(self, hostname: str, value: str, record_type: str = "A", ttl: int = 300) -> bool:
+        """Create a new DNS record"""
+        try:
+            record = self._request("POST", f"/dns_zones/{self.zone_id()}/dns_records", json={
+                "type": record_type,
+                "hostname": hostname,
+                "value": value,
+                "ttl": ttl,
+            }).json()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to create DNS record {hostname}: {e.response.text}")
+            return False
+        except Exception as e:
+            logger.error(f"Failed to create DNS record {hostname}: {e}")
+            return False
+
+        with self._lock:
+            if self._records is not None:
+                self._records.setdefault((hostname, record_type), []).append(
+                    record if isinstance(record, dict) and record.get("id") else
+                    {"hostname": hostname, "type": record_type, "value": value, "ttl": ttl}
+                )
+        logger.info(f"Created DNS record: {hostname} -> {value}")
+        return True
 
-def get_public_ip() -> Optional[str]:
-    """Get the server's public IP address"""
-    services = [
-        "https://api.ipify.org",
-        "https://ifconfig.me/ip",
-        "https://icanhazip.com",
-    ]
+    def delete_record(self, record: Dict[str, Any]) -> bool:
+        """Delete a DNS record"""
+        try:
+            self._request("DELETE", f"/dns_zones/{self.zone_id()}/dns_records/{record['id']}")
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                logger.error(f"Failed to delete DNS record {record['id']}: {e}")
+                return False
+        except Exception as e:
+            logger.error(f"Failed to delete DNS record {record['id']}: {e}")
+            return False
+
+        with self._lock:
+            if self._records is not None:
+                key = (record.get("hostname"), record.get("type"))
+                remaining = [r for r in self._records.get(key, []) if r.get("id") != record["id"]]
+                if remaining:
+                    self._records[key] = remaining
+                else:
+                    self._records.pop(key, None)
+        logger.info(f"Deleted DNS record: {record['id']}")
+        return True
+
+    def apply(self, desired: Dict[RecordKey, Optional[str]], ttl: int = 300) -> Dict[str, Any]:
+        """
+        Bring the desired records up to date with as few API calls as possible.
+
+        Returns dict with created, deleted and unchanged counts, failed (keys
+        whose changes didn't all go through) and ok (False if the zone
+        couldn't be read or any change failed).
+        """
+        summary = {"created": 0, "deleted": 0, "unchanged": 0, "failed": [], "ok": True}
+        if not self.configured():
+            logger.warning("Netlify DNS not configured (missing API token or zone ID)")
+            summary.update(ok=False, failed=list(desired))
+            return summary
 
-    for service in services:
         try:
-            response = requests.get(service, timeout=5)
-            if response.status_code == 200:
-                ip = response.text.strip()
-                logger.info(f"Detected public IP: {ip}")
-                return ip
+            changes = self.plan(desired)
         except Exception as e:
-            logger.debug(f"Failed to get IP from {service}: {e}")
-            continue
+            logger.error(f"Failed to list DNS records: {e}")
+            summary.update(ok=False, failed=list(desired))
+            return summary
+
+        failed = set()
+        summary["unchanged"] = len(changes["unchanged"])
+        for record in changes["delete"]:
+            if self.delete_record(record):
+                summary["deleted"] += 1
+            else:
+                failed.add((record.get("hostname"), record.get("type")))
+        for key, value in changes["create"]:
+            if self.create_record(key[0], value, key[1], ttl):
+                summary["created"] += 1
+            else:
+                failed.add(key)
+
+        summary["failed"] = [key for key in desired if key in failed]
+        summary["ok"] = not failed
+
+        if not summary["ok"]:
+            # Something diverged from what we think the zone holds
+            self.invalidate()
+        return summary
+
+
+# Shared reconciler for the configured zone
+dns_reconciler = DnsReconciler()
+
+
+def get_public_ip(services: Optional[List[str]] = None, timeout: float = 5) -> Optional[str]:
+    """
+    Get the server's public IP address.
+
+    All providers are asked at once and the first valid answer wins, so one
+    slow provider costs nothing when another answers quickly.
+    """
+    services = services or PUBLIC_IP_SERVICES
+
+    def fetch(service: str) -> str:
+        response = requests.get(service, timeout=timeout)
+        response.raise_for_status()
+        return str(ipaddress.ip_address(response.text.strip()))
+
+    executor = ThreadPoolExecutor(max_workers=len(services), thread_name_prefix="public-ip")
+    futures = {executor.submit(fetch, service): service for service in services}
+    try:
+        for future in as_completed(futures, timeout=timeout + 1):
+            try:
+                ip = future.result()
+            except Exception as e:
+                logger.debug(f"Failed to get IP from {futures[future]}: {e}")
+                continue
+            logger.info(f"Detected public IP: {ip} (via {futures[future]})")
+            return ip
+    except FuturesTimeout:
+        pass
+    finally:
+        # Don't wait for the providers that lost the race
+        executor.shutdown(wait=False, cancel_futures=True)
 
     logger.error("Failed to detect public IP from any service")
     return None
 
 
-def _get_headers() -> dict:
-    """Get authorization headers for Netlify API"""
-    return {
-        "Authorization": f"Bearer {NETLIFY_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
+def load_last_ip(path: str = PUBLIC_IP_FILE) -> Optional[str]:
+    """Last public IP saved by save_last_ip, or None"""
+    try:
+        with open(path) as f:
+            return str(ipaddress.ip_address(f.read().strip()))
+    except (OSError, ValueError):
+        return None
+
+
+def save_last_ip(ip: str, path: str = PUBLIC_IP_FILE) -> None:
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(ip)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not save public IP to {path}: {e}")
 
 
 def list_dns_records() -> list:
-    """List all DNS records in the zone"""
-    zone_id = _get_zone_id()
-    if not NETLIFY_API_TOKEN or not zone_id:
+    """List all DNS records in the zone (from the cached zone view)"""
+    if not dns_reconciler.configured():
         logger.warning("Netlify DNS not configured (missing API token or zone ID)")
         return []
-
     try:
-        response = requests.get(
-            f"{NETLIFY_API_BASE}/dns_zones/{zone_id}/dns_records",
-            headers=_get_headers(),
-            timeout=10,
-        )
-        response.raise_for_status()
-        return response.json()
+        return [record for records in dns_reconciler.records().values() for record in records]
     except Exception as e:
         logger.error(f"Failed to list DNS records: {e}")
         return []
@@ -117,116 +381,169 @@ def list_dns_records() -> list:
 
 def find_record(hostname: str, record_type: str = "A") -> Optional[dict]:
     """Find an existing DNS record by hostname and type"""
-    records = list_dns_records()
-    for record in records:
-        if record.get("hostname") == hostname and record.get("type") == record_type:
-            return record
-    return None
+    if not dns_reconciler.configured():
+        return None
+    try:
+        records = dns_reconciler.records().get((hostname, record_type))
+    except Exception as e:
+        logger.error(f"Failed to list DNS records: {e}")
+        return None
+    return records[0] if records else None
 
 
 def create_dns_record(hostname: str, ip: str, record_type: str = "A", ttl: int = 300) -> bool:
     """Create a new DNS record"""
-    zone_id = _get_zone_id()
-    if not NETLIFY_API_TOKEN or not zone_id:
+    if not dns_reconciler.configured():
         logger.warning("Netlify DNS not configured (missing API token or zone ID)")
         return False
-
-    try:
-        response = requests.post(
-            f"{NETLIFY_API_BASE}/dns_zones/{zone_id}/dns_records",
-            headers=_get_headers(),
-            json={
-                "type": record_type,
-                "hostname": hostname,
-                "value": ip,
-                "ttl": ttl,
-            },
-            timeout=10,
-        )
-        response.raise_for_status()
-        logger.info(f"Created DNS record: {hostname} -> {ip}")
-        return True
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to create DNS record {hostname}: {e.response.text}")
-        return False
-    except Exception as e:
-        logger.error(f"Failed to create DNS record {hostname}: {e}")
-        return False
+    return dns_reconciler.create_record(hostname, ip, record_type, ttl)
 
 
 def delete_dns_record(record_id: str) -> bool:
     """Delete a DNS record by ID"""
-    zone_id = _get_zone_id()
-    if not NETLIFY_API_TOKEN or not zone_id:
-        return False
-
-    try:
-        response = requests.delete(
-            f"{NETLIFY_API_BASE}/dns_zones/{zone_id}/dns_records/{record_id}",
-            headers=_get_headers(),
-            timeout=10,
-        )
-        response.raise_for_status()
-        logger.info(f"Deleted DNS record: {record_id}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to delete DNS record {record_id}: {e}")
+    if not dns_reconciler.configured():
         return False
+    record = next(
+        (r for records in (dns_reconciler._records or {}).values() for r in records if r.get("id") == record_id),
+        {"id": record_id},
+    )
+    return dns_reconciler.delete_record(record)
 
 
 def update_or_create_record(hostname: str, ip: str, record_type: str = "A", ttl: int = 300) -> bool:
-    """Update an existing record or create a new one"""
-    existing = find_record(hostname, record_type)
-
-    if existing:
-        # Check if IP already matches
-        if existing.get("value") == ip:
-            logger.info(f"DNS record {hostname} already points to {ip}, skipping")
-            return True
-
-        # Delete old record and create new one (Netlify doesn't support PATCH for records)
-        logger.info(f"Updating DNS record {hostname}: {existing.get('value')} -> {ip}")
-        if delete_dns_record(existing["id"]):
-            return create_dns_record(hostname, ip, record_type, ttl)
-        return False
-    else:
-        return create_dns_record(hostname, ip, record_type, ttl)
+    """Point a record at `ip`, changing it only if it differs"""
+    return dns_reconciler.apply({(hostname, record_type): ip}, ttl)["ok"]
 
 
-def setup_tunnel_dns() -> bool:
+class DnsSetup:
     """
-    Set up DNS records for the tunnel server:
-    - tunnel.ersantana.com -> server IP
-    - *.tunnel.ersantana.com -> server IP (wildcard)
+    Startup DNS setup run as a background task, with readiness state.
 
-    Returns True if successful, False otherwise.
+    If a public IP was saved by a previous run, records are reconciled
+    against it right away; the IP is then re-detected and the records
+    updated only if it changed. With a settings_key, the state is stored
+    in server_settings and read back by workers that don't run the setup.
     """
-    zone_id = _get_zone_id()
-    if not NETLIFY_API_TOKEN or not zone_id:
-        logger.info("Netlify DNS not configured, skipping DNS setup")
-        return False
 
-    ip = get_public_ip()
-    if not ip:
-        logger.error("Could not determine public IP, skipping DNS setup")
-        return False
+    def __init__(
+        self,
+        reconciler: Optional[DnsReconciler] = None,
+        ip_file: str = PUBLIC_IP_FILE,
+        settings_key: Optional[str] = None,
+    ):
+        self.reconciler = reconciler or dns_reconciler
+        self.ip_file = ip_file
+        self.settings_key = settings_key
+        self._state: Dict[str, Any] = {"status": "pending"}
+
+    def _load_shared(self) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            row = conn.execute("SELECT value FROM server_settings WHERE key = ?", (self.settings_key,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
 
-    logger.info(f"Setting up DNS records for {TUNNEL_DOMAIN} pointing to {ip}")
+    def _store_shared(self) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            conn.execute("""
+                INSERT INTO server_settings (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """, (self.settings_key, json.dumps(self._state), time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def state(self) -> Dict[str, Any]:
+        """Copy of the current state; status is pending, running, ready, failed or disabled"""
+        if self.settings_key:
+            try:
+                shared = self._load_shared()
+                if shared is not None:
+                    return shared
+            except sqlite3.OperationalError:
+                pass  # Database not initialized yet: this worker's own view
+        return dict(self._state)
+
+    @property
+    def ready(self) -> bool:
+        # Once records have been set, a later refresh doesn't make us unready
+        state = self.state()
+        return state["status"] in ("ready", "disabled") or state.get("ip") is not None
+
+    def _update(self, **fields) -> None:
+        self._state = {**self._state, **fields}
+        if self.settings_key:
+            try:
+                self._store_shared()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not share DNS setup state: {e}")
+
+    def _apply(self, ip: str, source: str) -> bool:
+        domain = self.reconciler.domain
+        logger.info(f"Setting up DNS records for {domain} pointing to {ip} ({source} IP)")
+        summary = self.reconciler.apply({(domain, "A"): ip, (f"*.{domain}", "A"): ip})
+        if summary["ok"]:
+            self._update(status="ready", ip=ip, ip_source=source, error=None, changes={
+                "created": summary["created"], "deleted": summary["deleted"], "unchanged": summary["unchanged"]
+            })
+            logger.info(
+                f"DNS setup complete: {domain} and *.{domain} -> {ip} "
+                f"({summary['created']} created, {summary['deleted']} deleted, {summary['unchanged']} unchanged)"
+            )
+        return summary["ok"]
+
+    def run_once(self) -> bool:
+        """Reconcile the tunnel records (blocking); returns True once they point at the current IP"""
+        if self.settings_key:
+            # Carry on from the previous leader's state so readiness holds during the run
+            self._state = self.state()
+        self._update(status="running", started_at=time.time())
+        try:
+            if not self.reconciler.configured():
+                logger.info("Netlify DNS not configured, skipping DNS setup")
+                self._update(status="disabled")
+                return False
+
+            last_ip = load_last_ip(self.ip_file)
+            if last_ip:
+                self._apply(last_ip, "saved")
+
+            ip = get_public_ip()
+            if not ip:
+                if self._state["status"] != "ready":
+                    self._update(status="failed", error="Could not determine public IP")
+                return self._state["status"] == "ready"
+            if ip == last_ip and self._state["status"] == "ready":
+                return True
+            save_last_ip(ip, self.ip_file)
+            if not self._apply(ip, "detected"):
+                self._update(status="failed", error="DNS records could not be updated")
+            return self._state["status"] == "ready"
+        except Exception as e:
+            logger.error(f"DNS setup failed: {e}")
+            self._update(status="failed", error=str(e))
+            return False
+        finally:
+            self._update(finished_at=time.time())
 
-    success = True
+    async def run(self) -> None:
+        """Leader job: run setup once without holding up startup"""
+        await asyncio.to_thread(self.run_once)
 
-    # Create/update the main domain record (tunnel.ersantana.com)
-    if not update_or_create_record(TUNNEL_DOMAIN, ip):
-        success = False
 
-    # Create/update the wildcard record (*.tunnel.ersantana.com)
-    wildcard_hostname = f"*.{TUNNEL_DOMAIN}"
-    if not update_or_create_record(wildcard_hostname, ip):
-        success = False
+# Startup DNS setup, run by the leader worker; state shared with the others
+dns_setup = DnsSetup(settings_key="dns_setup")
 
-    if success:
-        logger.info(f"DNS setup complete: {TUNNEL_DOMAIN} and {wildcard_hostname} -> {ip}")
-    else:
-        logger.warning("DNS setup completed with errors")
 
-    return success
+def setup_tunnel_dns() -> bool:
+    """
+    Set up DNS records for the tunnel server:
+    - tunnel.ersantana.com -> server IP
+    - *.tunnel.ersantana.com -> server IP (wildcard)
+
+    Blocking; the app runs this through dns_setup in the background.
+    Returns True if successful, False otherwise.
+    """
+    return dns_setup.run_once()
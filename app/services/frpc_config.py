@@ -0,0 +1,171 @@
+"""
+frpc client config rendering (TOML and legacy INI) with a per-user cache
+
+A user's whole client config is rendered from one query and cached under
+users.config_version, which triggers bump on any change to the user's
+tunnels or token. The version also makes a cheap ETag, so unchanged
+configs can be answered with 304 without rendering anything.
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
+from .frps_config import get_frps_settings
+from .tunnel import get_server_domain
+
+FRPC_FORMATS = ("toml", "ini")
+
+MEDIA_TYPES = {
+    "toml": "application/toml",
+    "ini": "text/plain",
+}
+
+
+def _frpc_type(tunnel_type: str) -> str:
+    # SSH tunnels map to TCP in frpc (frp has no native SSH type)
+    return "tcp" if tunnel_type == "ssh" else tunnel_type
+
+
+def _toml_string(value: str) -> str:
+    # JSON string escapes are valid TOML basic-string escapes
+    return json.dumps(value)
+
+
+def render_frpc_toml(tunnels: List[Dict[str, Any]], domain: str, bind_port: int, token: Optional[str]) -> str:
+    """Render a complete frpc.toml (frp 0.52+) for a list of tunnel rows"""
+    lines = [
+        f"serverAddr = {_toml_string(domain)}",
+        f"serverPort = {bind_port}",
+    ]
+    if token:
+        lines.append('auth.method = "token"')
+        lines.append(f"auth.token = {_toml_string(token)}")
+
+    for t in tunnels:
+        lines.append("")
+        lines.append("[[proxies]]")
+        lines.append(f"name = {_toml_string(t['name'])}")
+        lines.append(f"type = {_toml_string(_frpc_type(t['type']))}")
+        lines.append(f"localIP = {_toml_string(t['local_host'] or '127.0.0.1')}")
+        lines.append(f"localPort = {t['local_port']}")
+        if t['type'] in ("http", "https") and t['subdomain']:
+            lines.append(f"subdomain = {_toml_string(t['subdomain'])}")
+        elif t['type'] in ("tcp", "ssh") and t['remote_port']:
+            lines.append(f"remotePort = {t['remote_port']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def render_frpc_ini(tunnels: List[Dict[str, Any]], domain: str, bind_port: int, token: Optional[str]) -> str:
+    """Render a complete legacy frpc.ini for a list of tunnel rows"""
+    lines = [
+        "[common]",
+        f"server_addr = {domain}",
+        f"server_port = {bind_port}",
+    ]
+    if token:
+        lines.append(f"token = {token}")
+
+    for t in tunnels:
+        lines.append("")
+        lines.append(f"[{t['name']}]")
+        lines.append(f"type = {_frpc_type(t['type'])}")
+        lines.append(f"local_ip = {t['local_host'] or '127.0.0.1'}")
+        lines.append(f"local_port = {t['local_port']}")
+        if t['type'] in ("http", "https") and t['subdomain']:
+            lines.append(f"subdomain = {t['subdomain']}")
+        elif t['type'] in ("tcp", "ssh") and t['remote_port']:
+            lines.append(f"remote_port = {t['remote_port']}")
+
+    return "\n".join(lines) + "\n"
+
+
+RENDERERS = {
+    "toml": render_frpc_toml,
+    "ini": render_frpc_ini,
+}
+
+
+class FrpcConfigCache:
+    """LRU of rendered client configs keyed by (user_id, format)"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        # (user_id, fmt) -> (version, server, body)
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, Tuple[str, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _server() -> Tuple[str, int]:
+        return get_server_domain(), get_frps_settings()["bind_port"]
+
+    @staticmethod
+    def etag(user_id: int, version: int, fmt: str, server: Tuple[str, int]) -> str:
+        # The server address is part of the config, so a domain or port change invalidates it too
+        server_key = f"{server[0]}:{server[1]}".encode().hex()[:16]
+        return f'"{user_id}-{version}-{fmt}-{server_key}"'
+
+    def current_etag(self, user_id: int, fmt: str) -> Optional[str]:
+        """ETag for the user's current config version (one indexed lookup, no rendering)"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        row = conn.execute("SELECT config_version FROM users WHERE id = ?", (user_id,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        return self.etag(user_id, row[0], fmt, self._server())
+
+    def render(self, user_id: int, fmt: str) -> Optional[Tuple[str, str]]:
+        """
+        Rendered config for a user.
+
+        Returns (etag, body), or None if the user doesn't exist. The user row
+        and all their tunnels come from a single query; cached output is
+        reused while config_version and the server address are unchanged.
+        """
+        server = self._server()
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        version_row = conn.execute("SELECT config_version FROM users WHERE id = ?", (user_id,)).fetchone()
+        if not version_row:
+            conn.close()
+            return None
+
+        key = (user_id, fmt)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] == version_row[0] and cached[1] == server:
+                self._entries.move_to_end(key)
+                conn.close()
+                return self.etag(user_id, cached[0], fmt, server), cached[2]
+
+        rows = conn.execute("""
+            SELECT u.token, u.config_version,
+                   t.id, t.name, t.type, t.local_port, t.local_host, t.subdomain, t.remote_port
+            FROM users u
+            LEFT JOIN tunnels t ON t.user_id = u.id
+            WHERE u.id = ?
+            ORDER BY t.id
+        """, (user_id,)).fetchall()
+        conn.close()
+
+        token, version = rows[0]['token'], rows[0]['config_version']
+        tunnels = [dict(row) for row in rows if row['id'] is not None]
+        body = RENDERERS[fmt](tunnels, server[0], server[1], token)
+
+        with self._lock:
+            self._entries[key] = (version, server, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return self.etag(user_id, version, fmt, server), body
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton cache shared by the frpc config routes
+frpc_config_cache = FrpcConfigCache()
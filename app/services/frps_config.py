@@ -0,0 +1,167 @@
+"""
+frps server config parser (TOML and legacy INI) with a change-aware cache
+"""
+import configparser
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+from ..config import FRPS_CONFIG, FRPS_CONFIG_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# frps defaults for settings missing from the config file
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "subdomain_host": None,
+    "bind_port": 7000,
+    "vhost_http_port": None,
+    "vhost_https_port": None,
+    "allow_ports": [],
+}
+
+
+def parse_port_ranges(value: str) -> List[Tuple[int, int]]:
+    """Parse INI allow_ports ("2000-3000,3001,3003") into (start, end) ranges"""
+    ranges = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ranges.append((int(start), int(end)))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+def _parse_toml(text: str) -> Dict[str, Any]:
+    data = tomllib.loads(text)
+    allow_ports = []
+    for entry in data.get("allowPorts", []):
+        if "single" in entry:
+            allow_ports.append((int(entry["single"]), int(entry["single"])))
+        elif "start" in entry and "end" in entry:
+            allow_ports.append((int(entry["start"]), int(entry["end"])))
+    return {
+        # frp spells it subDomainHost; accept the common lower-camel variant too
+        "subdomain_host": data.get("subDomainHost") or data.get("subdomainHost"),
+        "bind_port": data.get("bindPort"),
+        "vhost_http_port": data.get("vhostHTTPPort"),
+        "vhost_https_port": data.get("vhostHTTPSPort"),
+        "allow_ports": allow_ports,
+    }
+
+
+def _parse_ini(text: str) -> Dict[str, Any]:
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read_string(text)
+    common = parser["common"] if parser.has_section("common") else {}
+
+    def get_int(key: str) -> Optional[int]:
+        value = common.get(key)
+        return int(value) if value else None
+
+    return {
+        "subdomain_host": common.get("subdomain_host") or None,
+        "bind_port": get_int("bind_port"),
+        "vhost_http_port": get_int("vhost_http_port"),
+        "vhost_https_port": get_int("vhost_https_port"),
+        "allow_ports": parse_port_ranges(common.get("allow_ports", "")),
+    }
+
+
+def parse_frps_config(text: str, path: str = "") -> Dict[str, Any]:
+    """
+    Parse frps config text into normalized settings.
+
+    Format is chosen by file extension; unknown extensions try TOML then INI.
+    Missing keys fall back to DEFAULT_SETTINGS.
+    """
+    if path.endswith(".toml"):
+        parsed = _parse_toml(text)
+    elif path.endswith(".ini"):
+        parsed = _parse_ini(text)
+    else:
+        try:
+            parsed = _parse_toml(text)
+        except tomllib.TOMLDecodeError:
+            parsed = _parse_ini(text)
+
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({k: v for k, v in parsed.items() if v not in (None, [])})
+    return settings
+
+
+class FrpsConfigCache:
+    """
+    Parsed frps settings, re-read only when the file changes.
+
+    The file is stat()ed at most once per check_interval; it is re-parsed
+    only when its inode, mtime or size differ from the last load.
+    """
+
+    def __init__(self, path: str = FRPS_CONFIG, check_interval: float = FRPS_CONFIG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._settings: Dict[str, Any] = dict(DEFAULT_SETTINGS)
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        """Return current settings, reloading if the file changed"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._settings
+
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._refresh()
+                self._checked_at = now
+        return self._settings
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._signature is not None:
+                logger.warning(f"frps config {self.path} disappeared, using defaults")
+            self._signature = None
+            self._settings = dict(DEFAULT_SETTINGS)
+            return
+
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                self._settings = parse_frps_config(f.read(), self.path)
+            self._signature = signature
+            logger.info(f"Loaded frps config from {self.path}")
+        except Exception as e:
+            # Keep the last good settings; retry on the next check
+            logger.error(f"Failed to parse frps config {self.path}: {e}")
+
+    def invalidate(self) -> None:
+        """Force a stat check on the next get()"""
+        self._checked_at = None
+
+
+_cache: Optional[FrpsConfigCache] = None
+
+
+def get_frps_settings() -> Dict[str, Any]:
+    """Get cached frps settings (subdomain_host, bind_port, vhost ports, allow_ports)"""
+    global _cache
+    if _cache is None:
+        _cache = FrpsConfigCache()
+    return _cache.get()
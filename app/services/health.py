@@ -0,0 +1,322 @@
+"""
+Background end-to-end health checks for active tunnels
+
+Each active tunnel's public endpoint is probed on its own jittered schedule
+(HTTP HEAD for http/https, TCP connect for tcp/ssh). Dead tunnels back off
+exponentially. Results live in an in-memory status map for cheap reads and
+are persisted in batches to the tunnel_health table.
+
+Only the leader worker runs the checks; the others follow tunnel_health so
+every worker serves the same statuses.
+"""
+import asyncio
+import heapq
+import logging
+import random
+import sqlite3
+import ssl
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from ..config import (
+    DB_BUSY_TIMEOUT,
+    DB_FILE,
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_CONCURRENCY,
+    HEALTH_CHECK_TIMEOUT,
+    HEALTH_CHECK_MAX_BACKOFF,
+)
+from .probe import probe_tcp
+from .tunnel import get_public_url, get_server_domain
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5  # seconds between batched writes (and follower re-reads)
+
+
+async def probe_http(url: str, timeout: float = HEALTH_CHECK_TIMEOUT) -> Dict[str, Any]:
+    """
+    Send an HTTP HEAD request and read the status line, all within `timeout` seconds.
+
+    Returns dict with status_code, latency_ms and error.
+    """
+    parts = urlsplit(url)
+    use_tls = parts.scheme == "https"
+    host = parts.hostname or ""
+    port = parts.port or (443 if use_tls else 80)
+    result: Dict[str, Any] = {"status_code": None, "latency_ms": None, "error": None}
+    start = time.perf_counter()
+
+    async def request() -> int:
+        ssl_context = ssl.create_default_context() if use_tls else None
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl_context, server_hostname=host if use_tls else None
+        )
+        try:
+            writer.write(
+                f"HEAD {parts.path or '/'} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                "User-Agent: tunnel-server-healthcheck\r\n"
+                "Connection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        # e.g. b"HTTP/1.1 200 OK\r\n"
+        return int(status_line.split()[1])
+
+    try:
+        result["status_code"] = await asyncio.wait_for(request(), timeout)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except (OSError, ssl.SSLError, ValueError, IndexError) as e:
+        result["error"] = str(e) or e.__class__.__name__
+    return result
+
+
+def _is_http_up(status_code: Optional[int]) -> bool:
+    """Server errors and frps's 404 for unregistered subdomains count as down"""
+    return status_code is not None and status_code < 500 and status_code != 404
+
+
+async def check_tunnel(tunnel: Dict[str, Any], domain: str, timeout: float = HEALTH_CHECK_TIMEOUT) -> Dict[str, Any]:
+    """Probe one tunnel's public endpoint and return a health record"""
+    url = get_public_url(tunnel["type"], tunnel.get("subdomain"), tunnel.get("remote_port"), domain)
+    if url is None:
+        return {"status": "unknown", "status_code": None, "latency_ms": None, "error": "no public endpoint"}
+
+    if tunnel["type"] in ("http", "https"):
+        probe = await probe_http(url, timeout)
+        up = _is_http_up(probe["status_code"])
+    else:
+        probe = await probe_tcp(domain, tunnel["remote_port"], timeout=timeout)
+        probe["status_code"] = None
+        up = probe["reachable"]
+
+    return {
+        "status": "up" if up else "down",
+        "status_code": probe["status_code"],
+        "latency_ms": probe["latency_ms"],
+        "error": probe["error"],
+    }
+
+
+class HealthChecker:
+    """Schedules health checks for all active tunnels with a global concurrency limit"""
+
+    def __init__(
+        self,
+        interval: float = HEALTH_CHECK_INTERVAL,
+        concurrency: int = HEALTH_CHECK_CONCURRENCY,
+        timeout: float = HEALTH_CHECK_TIMEOUT,
+        max_backoff: float = HEALTH_CHECK_MAX_BACKOFF,
+        jitter: float = 0.1
+    ):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses: Dict[int, Dict[str, Any]] = {}
+        self._targets: Dict[int, Dict[str, Any]] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._scheduled: Set[int] = set()
+        self._pending_writes: Dict[int, Dict[str, Any]] = {}
+        self._targets_loaded_at: Optional[float] = None
+        self._running = False
+
+    def get_status(self, tunnel_id: int) -> Optional[Dict[str, Any]]:
+        """Latest health record for a tunnel (None if never checked)"""
+        return self.statuses.get(tunnel_id)
+
+    def next_delay(self, consecutive_failures: int) -> float:
+        """Seconds until the next check: the base interval, doubled per failure, jittered"""
+        delay = min(self.max_backoff, self.interval * (2 ** consecutive_failures))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def read_persisted(self) -> Dict[int, Dict[str, Any]]:
+        """Health records as last written to tunnel_health (blocking)"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tunnel_health")
+        statuses = {}
+        for row in cursor.fetchall():
+            record = dict(row)
+            statuses[record.pop("tunnel_id")] = record
+        conn.close()
+        return statuses
+
+    def load_targets(self) -> Dict[int, Dict[str, Any]]:
+        """Read the active tunnel list and prune health rows of the others (blocking, no shared state)"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, type, subdomain, remote_port FROM tunnels
+            WHERE is_active = 1
+        """)
+        targets = {row["id"]: dict(row) for row in cursor.fetchall()}
+        # Keep the health table compact: one row per active tunnel
+        cursor.execute("""
+            DELETE FROM tunnel_health
+            WHERE tunnel_id NOT IN (SELECT id FROM tunnels WHERE is_active = 1)
+        """)
+        conn.commit()
+        conn.close()
+        return targets
+
+    def apply_targets(self, targets: Dict[int, Dict[str, Any]], now: float) -> None:
+        """
+        Install a loaded tunnel list and schedule newcomers at a random offset.
+
+        Touches the heap and status map, so it must run on the event loop
+        alongside the checks, never in a worker thread.
+        """
+        self._targets = targets
+        self._targets_loaded_at = now
+
+        for tunnel_id in self._targets:
+            if tunnel_id not in self._scheduled:
+                # Spread first checks across one interval so startup isn't a burst
+                heapq.heappush(self._heap, (now + random.uniform(0, self.interval), tunnel_id))
+                self._scheduled.add(tunnel_id)
+
+        # Forget tunnels that went away or were deactivated
+        for tunnel_id in list(self.statuses):
+            if tunnel_id not in self._targets:
+                self.statuses.pop(tunnel_id, None)
+
+    def refresh_targets(self, now: float) -> None:
+        """Reload the active tunnel list (blocking; the run loop splits this across thread and loop)"""
+        self.apply_targets(self.load_targets(), now)
+
+    async def _check(self, tunnel_id: int, semaphore: asyncio.Semaphore) -> None:
+        tunnel = self._targets.get(tunnel_id)
+        if tunnel is None:
+            self._scheduled.discard(tunnel_id)
+            return
+
+        async with semaphore:
+            try:
+                record = await check_tunnel(tunnel, get_server_domain(), self.timeout)
+            except Exception as e:
+                logger.error(f"Health check for tunnel {tunnel_id} failed: {e}")
+                record = {"status": "down", "status_code": None, "latency_ms": None, "error": str(e)}
+
+        previous = self.statuses.get(tunnel_id) or {}
+        failures = 0 if record["status"] != "down" else (previous.get("consecutive_failures") or 0) + 1
+        record["consecutive_failures"] = failures
+        record["checked_at"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+        if tunnel_id in self._targets:
+            self.statuses[tunnel_id] = record
+            self._pending_writes[tunnel_id] = record
+            heapq.heappush(self._heap, (time.monotonic() + self.next_delay(failures), tunnel_id))
+        else:
+            self._scheduled.discard(tunnel_id)
+
+    def take_pending_writes(self) -> Dict[int, Dict[str, Any]]:
+        """Hand over the records gathered since the last flush (on the event loop)"""
+        pending, self._pending_writes = self._pending_writes, {}
+        return pending
+
+    def write_records(self, pending: Dict[int, Dict[str, Any]]) -> int:
+        """Persist health records in one transaction (blocking)"""
+        if not pending:
+            return 0
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.executemany("""
+            INSERT INTO tunnel_health
+                (tunnel_id, status, status_code, latency_ms, error, consecutive_failures, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(tunnel_id) DO UPDATE SET
+                status = excluded.status,
+                status_code = excluded.status_code,
+                latency_ms = excluded.latency_ms,
+                error = excluded.error,
+                consecutive_failures = excluded.consecutive_failures,
+                checked_at = excluded.checked_at
+        """, [
+            (tunnel_id, r["status"], r["status_code"], r["latency_ms"], r["error"],
+             r["consecutive_failures"], r["checked_at"])
+            for tunnel_id, r in pending.items()
+        ])
+        conn.commit()
+        conn.close()
+        return len(pending)
+
+    def flush_writes(self) -> int:
+        """Persist health records gathered since the last flush in one transaction"""
+        return self.write_records(self.take_pending_writes())
+
+    async def run_due(self, semaphore: asyncio.Semaphore) -> List[asyncio.Task]:
+        """Start checks for every tunnel whose next check time has passed"""
+        now = time.monotonic()
+        tasks = []
+        while self._heap and self._heap[0][0] <= now:
+            _, tunnel_id = heapq.heappop(self._heap)
+            tasks.append(asyncio.create_task(self._check(tunnel_id, semaphore)))
+        return tasks
+
+    async def run(self) -> None:
+        """Leader job: scheduler loop; runs until cancelled"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight: Set[asyncio.Task] = set()
+        last_flush = time.monotonic()
+
+        self._running = True
+        try:
+            self.statuses = await asyncio.to_thread(self.read_persisted)  # before any check starts
+            while True:
+                now = time.monotonic()
+                if self._targets_loaded_at is None or now - self._targets_loaded_at >= self.interval:
+                    # Only the SQL runs in a thread; the heap and status map are
+                    # updated here on the loop, where the checks also touch them
+                    targets = await asyncio.to_thread(self.load_targets)
+                    self.apply_targets(targets, now)
+
+                for task in await self.run_due(semaphore):
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                if now - last_flush >= FLUSH_INTERVAL:
+                    await asyncio.to_thread(self.write_records, self.take_pending_writes())
+                    last_flush = now
+
+                sleep_for = 1.0
+                if self._heap:
+                    sleep_for = max(0.05, min(sleep_for, self._heap[0][0] - time.monotonic()))
+                await asyncio.sleep(sleep_for)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            self.flush_writes()
+            # Forget the schedule so a later term as leader starts afresh
+            self._heap, self._scheduled, self._targets_loaded_at = [], set(), None
+            self._running = False
+
+    async def follow(self) -> None:
+        """
+        Keep the status map in step with tunnel_health while another worker
+        runs the checks; runs until cancelled.
+        """
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            if self._running:
+                continue
+            try:
+                statuses = await asyncio.to_thread(self.read_persisted)
+            except Exception as e:
+                logger.error(f"Reading health statuses failed: {e}")
+                continue
+            if not self._running:
+                self.statuses = statuses
+
+
+# Singleton checker: run by the leader worker, followed by the others
+health_checker = HealthChecker()
@@ -0,0 +1,293 @@
+"""
+Coalesced tunnel heartbeats
+
+Clients report the state of all their tunnels in one call. Reports are kept
+in memory; the tunnels table is written when a tunnel's state changes, when
+the last_heartbeat this worker stored is getting old, and on each worker's
+periodic flush, which also brings last_connected up to date.
+
+last_heartbeat in SQLite is the one clock all workers share: the leader
+worker's sweep marks tunnels inactive once it is older than
+HEARTBEAT_TIMEOUT, whichever worker the client last talked to.
+
+Tunnel owners are cached so a heartbeat needs no ownership query. Each
+worker replays the tunnel change journal every REFRESH_INTERVAL seconds, so
+tunnels deleted or reassigned through another worker stop being accepted.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT
+from .changes import current_version, get_changes
+
+logger = logging.getLogger(__name__)
+
+# How often each worker replays the tunnel change journal into its owner cache
+REFRESH_INTERVAL = 1
+
+
+def _utc_now() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class HeartbeatStore:
+    """Latest reported state per tunnel plus what this worker last wrote to SQLite"""
+
+    def __init__(self, timeout: float = HEARTBEAT_TIMEOUT):
+        self.timeout = timeout
+        # tunnel_id -> {"active", "heartbeat" (unix time), "seen_at" (UTC), "stored_active", "stored_heartbeat"}
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._owners: Dict[int, int] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        # One refresh at a time, so an older journal read never lands after a newer one
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+
+    def load(self) -> int:
+        """Seed tunnel owners from the database so heartbeats skip the ownership query"""
+        with self._refresh_lock:
+            return self._load()
+
+    def _load(self) -> int:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = conn.cursor()
+        # Version first: changes made while reading are replayed again, never missed
+        version = current_version(cursor)
+        cursor.execute("SELECT id, user_id FROM tunnels")
+        rows = cursor.fetchall()
+        conn.close()
+
+        with self._lock:
+            self._owners = dict(rows)
+            self._version = version
+            self._loaded = True
+        return len(rows)
+
+    def refresh(self) -> int:
+        """
+        Apply journal entries written since the last refresh, by any worker;
+        returns tunnels touched.
+
+        Deleted tunnels are dropped, and a tunnel that changed owner loses the
+        state its previous owner reported.
+        """
+        self._ensure_loaded()
+        with self._refresh_lock:
+            conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+            try:
+                cursor = conn.cursor()
+                changes = get_changes(cursor, self._version)
+                if changes["reset"]:
+                    conn.close()
+                    logger.info("Heartbeat owner cache fell behind the tunnel change journal, reloading")
+                    return self._load()
+                current: Dict[int, Optional[int]] = {tunnel_id: None for tunnel_id in changes["deleted"]}
+                upserted = changes["upserted"]
+                for start in range(0, len(upserted), 500):
+                    chunk = upserted[start:start + 500]
+                    current.update({tunnel_id: None for tunnel_id in chunk})
+                    cursor.execute(
+                        f"SELECT id, user_id FROM tunnels WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                    current.update(cursor.fetchall())
+            finally:
+                conn.close()
+
+            with self._lock:
+                for tunnel_id, owner in current.items():
+                    if self._owners.get(tunnel_id) != owner:
+                        self._entries.pop(tunnel_id, None)
+                    if owner is None:
+                        self._owners.pop(tunnel_id, None)
+                    else:
+                        self._owners[tunnel_id] = owner
+                self._version = changes["version"]
+            return len(current)
+
+    async def follow(self) -> None:
+        """Background task: replay the journal every REFRESH_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Heartbeat owner cache refresh failed: {e}")
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _owners_for(self, tunnel_ids: List[int]) -> Dict[int, int]:
+        """Owner of each tunnel, querying only ids not seen before"""
+        missing = [tunnel_id for tunnel_id in tunnel_ids if tunnel_id not in self._owners]
+        if missing:
+            conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+            cursor = conn.cursor()
+            placeholders = ",".join("?" * len(missing))
+            cursor.execute(f"SELECT id, user_id FROM tunnels WHERE id IN ({placeholders})", missing)
+            found = dict(cursor.fetchall())
+            conn.close()
+            with self._lock:
+                self._owners.update(found)
+        return {tunnel_id: self._owners.get(tunnel_id) for tunnel_id in tunnel_ids}
+
+    def _write(self, changes: List[Tuple[int, bool, str, float]], refreshes: List[Tuple[int, str, float]]) -> None:
+        """
+        Write state changes and heartbeat refreshes in one transaction.
+
+        A report older than the stored last_heartbeat (another worker heard
+        from the client since) is dropped. Refreshes leave is_active alone,
+        so they don't land in the tunnel change journal, unless the sweep
+        had already marked the tunnel inactive.
+        """
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.executemany("""
+            UPDATE tunnels
+            SET is_active = ?, last_connected = CASE WHEN ? THEN ? ELSE last_connected END, last_heartbeat = ?
+            WHERE id = ? AND IFNULL(last_heartbeat, 0) <= ?
+        """, [
+            (int(active), int(active), seen_at, heartbeat, tunnel_id, heartbeat)
+            for tunnel_id, active, seen_at, heartbeat in changes
+        ])
+        conn.executemany("""
+            UPDATE tunnels SET last_connected = ?, last_heartbeat = ?
+            WHERE id = ? AND IFNULL(last_heartbeat, 0) <= ?
+        """, [(seen_at, heartbeat, tunnel_id, heartbeat) for tunnel_id, seen_at, heartbeat in refreshes])
+        conn.executemany(
+            "UPDATE tunnels SET is_active = 1 WHERE id = ? AND is_active = 0 AND last_heartbeat = ?",
+            [(tunnel_id, heartbeat) for tunnel_id, _, heartbeat in refreshes]
+        )
+        conn.commit()
+        conn.close()
+
+    def record(self, user_id: int, reports: Iterable[Tuple[int, bool]]) -> Dict[str, Any]:
+        """
+        Apply one client's heartbeat.
+
+        Tunnels whose active state changed, and active tunnels whose stored
+        last_heartbeat is half a timeout old, are written in one transaction.
+        Returns dict with accepted ids, rejected ids with reasons, the number
+        of changed tunnels and the suggested interval.
+        """
+        self._ensure_loaded()
+        reports = list(reports)
+        owners = self._owners_for([tunnel_id for tunnel_id, _ in reports])
+        now, seen_at = time.time(), _utc_now()
+
+        accepted, rejected, changes, refreshes = [], [], [], []
+        with self._lock:
+            for tunnel_id, active in reports:
+                owner = owners.get(tunnel_id)
+                if owner is None:
+                    rejected.append({"id": tunnel_id, "error": "Tunnel not found"})
+                    continue
+                if owner != user_id:
+                    rejected.append({"id": tunnel_id, "error": "You don't have permission to update this tunnel"})
+                    continue
+                entry = self._entries.setdefault(
+                    tunnel_id, {"stored_active": None, "stored_heartbeat": None}
+                )
+                entry.update(active=active, heartbeat=now, seen_at=seen_at)
+                if entry["stored_active"] != active:
+                    changes.append((tunnel_id, active, seen_at, now))
+                elif active and now - (entry["stored_heartbeat"] or 0) >= self.timeout / 2:
+                    # Keep the shared clock fresh enough that the sweep never
+                    # expires a live tunnel (or revive one it already did)
+                    refreshes.append((tunnel_id, seen_at, now))
+                accepted.append(tunnel_id)
+
+        if changes or refreshes:
+            self._write(changes, refreshes)
+            with self._lock:
+                for tunnel_id, active, _, _ in changes:
+                    self._entries[tunnel_id].update(stored_active=active, stored_heartbeat=now)
+                for tunnel_id, _, _ in refreshes:
+                    self._entries[tunnel_id]["stored_heartbeat"] = now
+
+        return {
+            "accepted": accepted,
+            "rejected": rejected,
+            "changed": len(changes),
+            "heartbeat_interval": HEARTBEAT_INTERVAL,
+        }
+
+    def observe(self, tunnel_id: int, user_id: int, active: bool, heartbeat: float) -> None:
+        """Track a status (and last_heartbeat) already written elsewhere (the status endpoints)"""
+        self._ensure_loaded()
+        with self._lock:
+            self._owners[tunnel_id] = user_id
+            self._entries[tunnel_id] = {
+                "active": active, "heartbeat": heartbeat, "seen_at": _utc_now(),
+                "stored_active": active, "stored_heartbeat": heartbeat,
+            }
+
+    def forget(self, tunnel_id: int) -> None:
+        """Drop a deleted tunnel"""
+        with self._lock:
+            self._entries.pop(tunnel_id, None)
+            self._owners.pop(tunnel_id, None)
+
+    def get(self, tunnel_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(tunnel_id)
+            return dict(entry) if entry else None
+
+    def flush_last_seen(self) -> int:
+        """Write last_heartbeat and last_connected for active tunnels heard from since the last flush; returns count"""
+        with self._lock:
+            pending = [
+                (tunnel_id, entry["seen_at"], entry["heartbeat"]) for tunnel_id, entry in self._entries.items()
+                if entry["active"] and entry["heartbeat"] != entry["stored_heartbeat"]
+            ]
+        if not pending:
+            return 0
+
+        self._write([], pending)
+        with self._lock:
+            for tunnel_id, _, heartbeat in pending:
+                if tunnel_id in self._entries:
+                    self._entries[tunnel_id]["stored_heartbeat"] = heartbeat
+        return len(pending)
+
+    def sweep(self, since: float = 0.0) -> int:
+        """
+        Mark tunnels inactive once their stored last_heartbeat is older than
+        the timeout; returns count. Run by the leader worker only.
+
+        Heartbeats older than `since` (when this worker became leader) count
+        as received at `since`, so tunnels whose clients reported while the
+        server was down get one timeout to report again.
+        """
+        self.flush_last_seen()
+        cutoff = time.time() - self.timeout
+        if cutoff <= since:
+            return 0
+
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE tunnels SET is_active = 0
+            WHERE is_active = 1 AND IFNULL(last_heartbeat, 0) < ?
+            RETURNING id
+        """, (cutoff,))
+        stale = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        conn.close()
+
+        if stale:
+            with self._lock:
+                for tunnel_id in stale:
+                    if tunnel_id in self._entries:
+                        self._entries[tunnel_id].update(active=False, stored_active=False)
+            logger.info(f"Marked {len(stale)} tunnels inactive after missed heartbeats")
+        return len(stale)
+
+
+# Singleton store shared by the routes and the lifespan flush task
+heartbeat_store = HeartbeatStore()
@@ -0,0 +1,144 @@
+"""
+Leader election between worker processes through a lease row in SQLite
+
+When uvicorn runs several workers, each has its own lifespan. Scheduled jobs
+that poll frps or prune tables must run in exactly one of them, so workers
+compete for a row in leader_leases: the holder renews it every third of
+LEADER_LEASE_SECONDS, and anyone may take it over once it has expired. A
+leader that can't renew in time stops its jobs before its lease runs out,
+so two leaders never overlap (a job still running in a thread then holds
+its own claim until it returns; see services/scheduler.py). A clean shutdown releases the lease so the
+next worker takes over at its next attempt.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, LEADER_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class LeaderElector:
+    """Holds (or waits for) one named lease and runs jobs only while holding it"""
+
+    def __init__(
+        self,
+        name: str = "scheduler",
+        lease_seconds: float = LEADER_LEASE_SECONDS,
+        holder: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.renew_interval = lease_seconds / 3
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._clock = clock
+        self._valid_until = 0.0  # our own view of when the lease we hold runs out
+
+    @property
+    def is_leader(self) -> bool:
+        return self._clock() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        """
+        Take or renew the lease if it is ours or has expired; returns True if held.
+
+        One UPSERT does the check and the write, so two workers can't both win.
+        """
+        now = self._clock()
+        expires_at = now + self.lease_seconds
+        conn = sqlite3.connect(DB_FILE, timeout=self.renew_interval)
+        try:
+            cursor = conn.execute("""
+                INSERT INTO leader_leases (name, holder, acquired_at, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder,
+                    expires_at = excluded.expires_at,
+                    acquired_at = CASE WHEN leader_leases.holder = excluded.holder
+                                       THEN leader_leases.acquired_at ELSE excluded.acquired_at END
+                WHERE leader_leases.holder = excluded.holder OR leader_leases.expires_at <= excluded.acquired_at
+            """, (self.name, self.holder, now, expires_at))
+            conn.commit()
+            acquired = cursor.rowcount == 1
+        finally:
+            conn.close()
+
+        # Leave a renewal interval of margin so we stop before anyone can take over
+        self._valid_until = expires_at - self.renew_interval if acquired else 0.0
+        return acquired
+
+    def release(self) -> None:
+        """Give up the lease (if held) so another worker can take over right away"""
+        self._valid_until = 0.0
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            conn.execute("DELETE FROM leader_leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def state(self) -> Dict[str, Any]:
+        """This worker's role and the current lease holder"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        row = conn.execute(
+            "SELECT holder, acquired_at, expires_at FROM leader_leases WHERE name = ?", (self.name,)
+        ).fetchone()
+        conn.close()
+        return {
+            "name": self.name,
+            "worker": self.holder,
+            "is_leader": self.is_leader,
+            "leader": row[0] if row and row[2] > self._clock() else None,
+            "leader_since": row[1] if row and row[2] > self._clock() else None,
+        }
+
+    async def run(self, jobs: Dict[str, Job]) -> None:
+        """
+        Campaign for the lease forever, running `jobs` (name -> coroutine
+        function) while leader and cancelling them when leadership is lost.
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.try_acquire)
+                except Exception as e:
+                    logger.error(f"Leader lease renewal failed: {e}")
+
+                if self.is_leader and not tasks:
+                    logger.info(f"Elected {self.name} leader ({self.holder}); starting {', '.join(jobs)}")
+                    tasks = {name: asyncio.create_task(job(), name=name) for name, job in jobs.items()}
+                elif not self.is_leader and tasks:
+                    logger.warning(f"Lost {self.name} leadership; stopping scheduled jobs")
+                    await _cancel(tasks)
+                    tasks = {}
+
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            await _cancel(tasks)
+            await asyncio.to_thread(self.release)
+
+
+async def _cancel(tasks: Dict[str, asyncio.Task]) -> None:
+    for task in tasks.values():
+        task.cancel()
+    for task in tasks.values():
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Scheduled job {task.get_name()} failed: {e}")
+
+
+# This worker's elector for the scheduled background jobs
+leader_elector = LeaderElector()
@@ -6,7 +6,7 @@ import sqlite3
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 
-from ..config import DB_FILE
+from ..config import DB_BUSY_TIMEOUT, DB_FILE
 from .frps_api import get_frps_client
 
 logger = logging.getLogger(__name__)
@@ -25,7 +25,7 @@ def collect_tunnel_metrics() -> bool:
         logger.debug("No proxy stats available from frps")
         return False
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -72,7 +72,7 @@ def get_tunnel_stats(tunnel_id: int, hours: int = 24) -> Dict[str, Any]:
     - traffic_in_total, traffic_out_total: total bytes in period
     - latest_metric_at: timestamp of most recent metric
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -124,7 +124,7 @@ def get_tunnel_stats(tunnel_id: int, hours: int = 24) -> Dict[str, Any]:
 
 def get_all_tunnels_stats() -> List[Dict[str, Any]]:
     """Get latest stats for all tunnels"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -188,7 +188,7 @@ def get_request_metrics(
     Returns:
         Dict with metrics list, total count, limit, and offset
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -284,7 +284,7 @@ def get_metrics_summary(
     Returns:
         Dict with summary statistics including percentiles
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -373,7 +373,7 @@ def get_tunnels_with_request_metrics() -> List[Dict[str, Any]]:
 
     Returns list of tunnels with metrics in the format expected by the client.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -464,7 +464,7 @@ def store_request_metrics(metrics: List[Dict[str, Any]], user_id: int) -> int:
     Returns:
         Number of metrics stored
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -512,7 +512,7 @@ def get_metrics_overview() -> Dict[str, Any]:
     client = get_frps_client()
     server_info = client.get_server_info()
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -549,7 +549,7 @@ def cleanup_old_metrics(days: int = 7) -> int:
     Clean up metrics older than specified days.
     Returns number of records deleted.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
 
     cutoff = (datetime.now() - timedelta(days=days)).isoformat()
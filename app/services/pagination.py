@@ -0,0 +1,108 @@
+"""
+Keyset pagination helpers and a streaming JSON encoder for list endpoints
+"""
+import base64
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..responses import dumps
+
+# Largest page a list endpoint hands out when a limit is requested
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Encode a keyset position (sort column value, id) as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Decode a cursor from encode_cursor; raises ValueError if malformed"""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_sort(sort: Optional[str], allowed: Sequence[str], default: str) -> Tuple[str, bool]:
+    """
+    Parse "column" / "-column" into (column, descending).
+
+    Raises ValueError for columns not in `allowed`.
+    """
+    sort = sort or default
+    descending = sort.startswith("-")
+    column = sort.lstrip("-")
+    if column not in allowed:
+        raise ValueError(f"Invalid sort; use one of: {', '.join(allowed)} (prefix - for descending)")
+    return column, descending
+
+
+def prefix_range(column: str, prefix: str) -> Tuple[str, List[str]]:
+    """
+    WHERE clause matching `prefix` as a range, so an index on `column` is used
+    (LIKE 'x%' can't use a BINARY-collated index).
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return f"{column} >= ? AND {column} < ?", [prefix, upper]
+
+
+def keyset_clause(column: str, id_column: str, descending: bool, cursor: str) -> Tuple[str, List[Any]]:
+    """WHERE clause selecting rows after the cursor position in (column, id) order"""
+    sort_value, row_id = decode_cursor(cursor)
+    op = "<" if descending else ">"
+    return f"({column}, {id_column}) {op} (?, ?)", [sort_value, row_id]
+
+
+def clamp_limit(limit: Optional[int]) -> Optional[int]:
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE; None means no limit"""
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(rows: Iterable[Dict[str, Any]], limit: Optional[int], sort_key: str, page: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield up to `limit` rows from a query fetched with LIMIT limit + 1.
+
+    Once exhausted, page["next_cursor"] holds the cursor for the next page,
+    or None on the last page.
+    """
+    page["next_cursor"] = None
+    last = None
+    for n, row in enumerate(rows):
+        if limit is not None and n == limit:
+            page["next_cursor"] = encode_cursor(last[sort_key], last["id"])
+            return
+        last = row
+        yield row
+
+
+def stream_json(
+    list_key: str, items: Iterable[Any], trailer: Dict[str, Any], chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """
+    Encode {list_key: [...items], **trailer} incrementally.
+
+    Items are serialized one at a time as they are produced and yielded in
+    chunks of about `chunk_size` bytes (one send per chunk rather than per
+    item); `trailer` is read only after the items are exhausted, so it may
+    be filled in by the item generator (e.g. next_cursor).
+    """
+    chunk = [b"{" + dumps(list_key) + b":["]
+    size = 0
+    first = True
+    for item in items:
+        encoded = dumps(item) if first else b"," + dumps(item)
+        first = False
+        chunk.append(encoded)
+        size += len(encoded)
+        if size >= chunk_size:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(b"]")
+    for key, value in trailer.items():
+        chunk.append(b"," + dumps(key) + b":" + dumps(value))
+    chunk.append(b"}")
+    yield b"".join(chunk)
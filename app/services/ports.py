@@ -0,0 +1,196 @@
+"""
+Remote port allocation for TCP/SSH tunnels
+
+Free ports in the allowed range are kept in a list plus a port -> position
+index, so allocating, reserving and releasing a port are all O(1). The pool
+is rebuilt from the tunnels table at startup; the unique index on
+tunnels.remote_port is what finally enforces one tunnel per port.
+
+Each worker has its own pool, so ports are handed out at random to keep
+workers from racing for the same one. When a port turns out to be taken,
+or the pool runs dry (possibly because other workers freed the ports), the
+pool is rebuilt inside the caller's write transaction, where no other
+worker can change the tunnels table, and the port is taken from that.
+"""
+import logging
+import random
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, TUNNEL_PORT_RANGE
+from .frps_config import get_frps_settings, parse_port_ranges
+
+logger = logging.getLogger(__name__)
+
+# Used when neither TUNNEL_PORT_RANGE nor frps allowPorts restricts ports
+DEFAULT_PORT_RANGES = [(1024, 65535)]
+
+def get_port_ranges() -> List[Tuple[int, int]]:
+    """Allowed remote port ranges: TUNNEL_PORT_RANGE, then frps allowPorts, then the default"""
+    if TUNNEL_PORT_RANGE:
+        return parse_port_ranges(TUNNEL_PORT_RANGE)
+    return get_frps_settings()["allow_ports"] or DEFAULT_PORT_RANGES
+
+
+def get_server_ports() -> Set[int]:
+    """Ports frps listens on itself, which can never be handed to a tunnel"""
+    settings = get_frps_settings()
+    ports = {settings["bind_port"], settings["vhost_http_port"], settings["vhost_https_port"]}
+    return {port for port in ports if port}
+
+
+def is_port_conflict(error: sqlite3.IntegrityError) -> bool:
+    """True if an IntegrityError came from the remote_port unique index"""
+    return "remote_port" in str(error)
+
+
+class PortAllocator:
+    """In-memory free-port pool for the allowed remote port ranges"""
+
+    def __init__(self, ranges: Optional[List[Tuple[int, int]]] = None):
+        self._configured_ranges = ranges
+        self.ranges: List[Tuple[int, int]] = []
+        self._free: List[int] = []
+        self._index: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def rebuild(self, cursor: Optional[sqlite3.Cursor] = None) -> int:
+        """
+        Reload ranges and mark every port already used by a tunnel; returns
+        free count. Pass the caller's cursor to count its uncommitted writes.
+        """
+        ranges = self._configured_ranges or get_port_ranges()
+        server_ports = get_server_ports()
+
+        conn = None if cursor else sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = cursor or conn.cursor()
+        cursor.execute("SELECT remote_port FROM tunnels WHERE remote_port IS NOT NULL")
+        used = {row[0] for row in cursor.fetchall()} | server_ports
+        if conn:
+            conn.close()
+
+        free: List[int] = []
+        index: Dict[int, int] = {}
+        for start, end in sorted(ranges):
+            for port in range(start, end + 1):
+                if port not in used and port not in index:
+                    index[port] = len(free)
+                    free.append(port)
+
+        with self._lock:
+            self.ranges = sorted(ranges)
+            self._free = free
+            self._index = index
+            self._loaded = True
+        return len(free)
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild()
+
+    def in_range(self, port: int) -> bool:
+        """Check a port falls inside the allowed ranges"""
+        self._ensure_loaded()
+        return any(start <= port <= end for start, end in self.ranges)
+
+    def _take(self, port: int) -> bool:
+        position = self._index.pop(port, None)
+        if position is None:
+            return False
+        last = self._free.pop()
+        if last != port:
+            self._free[position] = last
+            self._index[last] = position
+        return True
+
+    def allocate(self) -> Optional[int]:
+        """Take a random free port (None if the pool is exhausted)"""
+        self._ensure_loaded()
+        with self._lock:
+            if not self._free:
+                return None
+            port = self._free[random.randrange(len(self._free))]
+            self._take(port)
+            return port
+
+    def reserve(self, port: int) -> bool:
+        """Mark a specific port as used; False if it was not free"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._take(port)
+
+    def release(self, port: Optional[int]) -> None:
+        """Return a port to the pool (ignored if out of range or already free)"""
+        if port is None:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            if port in self._index or not any(start <= port <= end for start, end in self.ranges):
+                return
+            self._index[port] = len(self._free)
+            self._free.append(port)
+
+    def stats(self) -> Dict[str, Any]:
+        """Allowed ranges plus total and free port counts"""
+        self._ensure_loaded()
+        with self._lock:
+            capacity = sum(end - start + 1 for start, end in self.ranges)
+            return {"ranges": self.ranges, "capacity": capacity, "free": len(self._free)}
+
+
+# Singleton pool rebuilt by the app lifespan
+port_allocator = PortAllocator()
+
+
+def claim_port(cursor: sqlite3.Cursor, execute: Callable[[int], None], requested: Optional[int] = None) -> int:
+    """
+    Run `execute(port)` (an INSERT/UPDATE in the caller's write transaction on `cursor`) with a remote port.
+
+    A requested port must be free in the pool; otherwise a port comes from
+    the free pool. If the pool disagrees (another worker took or freed the
+    port), or is empty, it is rebuilt through `cursor`, which no other
+    writer can change while the caller holds the write lock, and the port
+    taken from that. Returns the port written. Raises ValueError if the
+    port is taken (or is one frps listens on) or none is free; other
+    IntegrityErrors propagate to the caller.
+    """
+    if requested is not None:
+        if not port_allocator.reserve(requested):
+            port_allocator.rebuild(cursor)
+            if not port_allocator.reserve(requested):
+                raise ValueError(f"Remote port {requested} is already in use.")
+        try:
+            execute(requested)
+        except sqlite3.IntegrityError as e:
+            if is_port_conflict(e):
+                raise ValueError(f"Remote port {requested} is already in use.")
+            port_allocator.release(requested)
+            raise
+        return requested
+
+    port = port_allocator.allocate()
+    if port is not None:
+        try:
+            execute(port)
+            return port
+        except sqlite3.IntegrityError as e:
+            if not is_port_conflict(e):
+                port_allocator.release(port)
+                raise
+            logger.info(f"Remote port {port} was claimed by another worker, resyncing the port pool")
+
+    # Our pool is stale: other workers took or freed ports
+    port_allocator.rebuild(cursor)
+    port = port_allocator.allocate()
+    if port is None:
+        raise ValueError("No free remote ports left in the allowed range.")
+    try:
+        execute(port)
+    except sqlite3.IntegrityError as e:
+        port_allocator.release(port)
+        if is_port_conflict(e):
+            raise ValueError("Remote port was claimed concurrently, please retry.")
+        raise
+    return port
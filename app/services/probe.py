@@ -0,0 +1,132 @@
+"""
+Non-blocking SSH/TCP reachability probes with a short-TTL result cache
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import PROBE_TIMEOUT, PROBE_CONCURRENCY, PROBE_CACHE_TTL
+
+# Longest we wait for an SSH banner once connected (within the overall deadline)
+BANNER_TIMEOUT = 2.0
+
+
+async def probe_tcp(
+    host: str,
+    port: int,
+    timeout: float = PROBE_TIMEOUT,
+    read_banner: bool = False
+) -> Dict[str, Any]:
+    """
+    Connect to host:port and optionally read an SSH banner, all within `timeout` seconds.
+
+    Returns dict with reachable, is_ssh, ssh_banner, latency_ms and error.
+    """
+    result: Dict[str, Any] = {
+        "reachable": False,
+        "is_ssh": False,
+        "ssh_banner": None,
+        "latency_ms": None,
+        "error": None,
+    }
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    start = time.perf_counter()
+
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+        return result
+    except OSError as e:
+        result["error"] = e.strerror or str(e)
+        return result
+
+    result["reachable"] = True
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    try:
+        if read_banner:
+            remaining = min(BANNER_TIMEOUT, deadline - loop.time())
+            if remaining > 0:
+                try:
+                    data = await asyncio.wait_for(reader.read(256), remaining)
+                except (asyncio.TimeoutError, OSError):
+                    data = b""
+                banner = data.decode("utf-8", errors="replace").strip()
+                if banner.startswith("SSH-"):
+                    result["is_ssh"] = True
+                    result["ssh_banner"] = banner
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    return result
+
+
+class ProbeCache:
+    """Probe results keyed by (host, port, read_banner), valid for `ttl` seconds"""
+
+    def __init__(self, ttl: float = PROBE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int, bool], Tuple[float, Dict[str, Any]]] = {}
+
+    def get(self, key: Tuple[str, int, bool]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        return result
+
+    def put(self, key: Tuple[str, int, bool], result: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        # Drop expired entries opportunistically so the map stays small
+        if len(self._entries) > 1024:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+        self._entries[key] = (now + self.ttl, result)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+probe_cache = ProbeCache()
+
+
+async def probe_cached(
+    host: str,
+    port: int,
+    read_banner: bool = False,
+    refresh: bool = False,
+    timeout: float = PROBE_TIMEOUT
+) -> Dict[str, Any]:
+    """Probe host:port, reusing a cached result younger than PROBE_CACHE_TTL"""
+    key = (host, port, read_banner)
+    if not refresh:
+        cached = probe_cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    result = await probe_tcp(host, port, timeout=timeout, read_banner=read_banner)
+    probe_cache.put(key, result)
+    return {**result, "cached": False}
+
+
+async def probe_many(
+    targets: Iterable[Tuple[str, int, bool]],
+    concurrency: int = PROBE_CONCURRENCY,
+    refresh: bool = False
+) -> List[Dict[str, Any]]:
+    """Probe (host, port, read_banner) targets concurrently, at most `concurrency` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(host: str, port: int, read_banner: bool) -> Dict[str, Any]:
+        async with semaphore:
+            return await probe_cached(host, port, read_banner=read_banner, refresh=refresh)
+
+    return await asyncio.gather(*(run(*target) for target in targets))
@@ -0,0 +1,258 @@
+"""
+Login throttling - token buckets per email and per client IP with exponential lockout
+
+Bucket and lockout state lives in SQLite (login_throttle), so every worker
+process draws from the same budget: spreading attempts over many
+connections, and so over workers, gains an attacker nothing, and the
+counters describe the whole deployment.
+"""
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..config import (
+    DB_BUSY_TIMEOUT,
+    DB_FILE,
+    LOGIN_RATE_BURST,
+    LOGIN_RATE_PER_MINUTE,
+    LOGIN_IP_RATE_BURST,
+    LOGIN_IP_RATE_PER_MINUTE,
+    LOGIN_LOCKOUT_THRESHOLD,
+    LOGIN_IP_LOCKOUT_THRESHOLD,
+    LOGIN_FAILURE_DECAY_SECONDS,
+    LOGIN_LOCKOUT_BASE_SECONDS,
+    LOGIN_LOCKOUT_MAX_SECONDS,
+    LOGIN_LIMITER_MAX_KEYS,
+)
+
+COUNTER_NAMES = ("allowed", "rejected_rate_limited", "rejected_locked_out", "lockouts", "evictions")
+
+
+class _KeyState:
+    """Bucket and failure state for a single email or IP"""
+
+    __slots__ = ("tokens", "updated", "failures", "failures_at", "locked_until", "new")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.failures = 0.0
+        self.failures_at = now
+        self.locked_until = 0.0
+        self.new = True
+
+
+class LoginRateLimiter:
+    """
+    Login limiter shared by all workers through the login_throttle table.
+
+    Every attempt must take a token from both the email bucket and the IP
+    bucket, so rejection happens before any user lookup or bcrypt work.
+    Repeated failures lock the key out for base * 2^n seconds (capped);
+    IPs, which may be shared by many users, have a higher threshold.
+    Failure counts leak away (one per failure_decay seconds) and a
+    successful login forgives one failure of its IP, so old typos don't
+    add up to a lockout. The key space is bounded to max_keys rows, least
+    recently used evicted first. Each call is one short write transaction;
+    the clock is wall time, which all workers share.
+    """
+
+    def __init__(
+        self,
+        burst: int = LOGIN_RATE_BURST,
+        per_minute: float = LOGIN_RATE_PER_MINUTE,
+        ip_burst: int = LOGIN_IP_RATE_BURST,
+        ip_per_minute: float = LOGIN_IP_RATE_PER_MINUTE,
+        lockout_threshold: int = LOGIN_LOCKOUT_THRESHOLD,
+        ip_lockout_threshold: int = LOGIN_IP_LOCKOUT_THRESHOLD,
+        failure_decay: float = LOGIN_FAILURE_DECAY_SECONDS,
+        lockout_base: float = LOGIN_LOCKOUT_BASE_SECONDS,
+        lockout_max: float = LOGIN_LOCKOUT_MAX_SECONDS,
+        max_keys: int = LOGIN_LIMITER_MAX_KEYS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._limits = {
+            "email": (burst, per_minute / 60.0),
+            "ip": (ip_burst, ip_per_minute / 60.0),
+        }
+        self.lockout_threshold = lockout_threshold
+        self._thresholds = {"email": lockout_threshold, "ip": ip_lockout_threshold}
+        self.failure_decay = failure_decay
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.max_keys = max_keys
+        self._clock = clock
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _states(self, cursor: sqlite3.Cursor, keys: List[Tuple[str, str]], now: float) -> List[_KeyState]:
+        """Load (or create) each key's state, refilling its bucket"""
+        states = []
+        for kind, value in keys:
+            burst, rate = self._limits[kind]
+            cursor.execute("""
+                SELECT tokens, updated, failures, failures_at, locked_until FROM login_throttle
+                WHERE kind = ? AND value = ?
+            """, (kind, value))
+            row = cursor.fetchone()
+            state = _KeyState(float(burst), now)
+            if row:
+                state.tokens, state.updated, state.failures, state.failures_at, state.locked_until = row
+                state.tokens = min(burst, state.tokens + max(0.0, now - state.updated) * rate)
+                state.updated = now
+                state.new = False
+            states.append(state)
+        return states
+
+    def _save(self, cursor: sqlite3.Cursor, keys: List[Tuple[str, str]], states: List[_KeyState]) -> None:
+        cursor.executemany("""
+            INSERT INTO login_throttle (kind, value, tokens, updated, failures, failures_at, locked_until)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(kind, value) DO UPDATE SET
+                tokens = excluded.tokens, updated = excluded.updated, failures = excluded.failures,
+                failures_at = excluded.failures_at, locked_until = excluded.locked_until
+        """, [
+            (kind, value, s.tokens, s.updated, s.failures, s.failures_at, s.locked_until)
+            for (kind, value), s in zip(keys, states)
+        ])
+        if any(s.new for s in states):
+            self._evict(cursor)
+
+    def _evict(self, cursor: sqlite3.Cursor) -> None:
+        """Drop the least recently used keys beyond max_keys"""
+        cursor.execute("SELECT COUNT(*) FROM login_throttle")
+        excess = cursor.fetchone()[0] - self.max_keys
+        if excess > 0:
+            cursor.execute("""
+                DELETE FROM login_throttle WHERE (kind, value) IN (
+                    SELECT kind, value FROM login_throttle ORDER BY updated LIMIT ?
+                )
+            """, (excess,))
+            self._count(cursor, "evictions", excess)
+
+    def _count(self, cursor: sqlite3.Cursor, name: str, n: int = 1) -> None:
+        cursor.execute(f"UPDATE login_throttle_counters SET {name} = {name} + ? WHERE id = 1", (n,))
+
+    def _keys_for(self, email: str, ip: str) -> List[Tuple[str, str]]:
+        keys = [("email", email.strip().lower())]
+        if ip:
+            keys.append(("ip", ip))
+        return keys
+
+    def check(self, email: str, ip: str) -> Optional[float]:
+        """
+        Consume one attempt for email and IP.
+        Returns None if allowed, otherwise seconds until a retry may succeed.
+        """
+        keys = self._keys_for(email, ip)
+        with self._transaction() as cursor:
+            now = self._clock()
+            states = self._states(cursor, keys, now)
+
+            locked = [s.locked_until - now for s in states if s.locked_until > now]
+            empty = [(kind, s) for (kind, _), s in zip(keys, states) if s.tokens < 1]
+            if locked:
+                self._count(cursor, "rejected_locked_out")
+                retry_after = max(locked)
+            elif empty:
+                self._count(cursor, "rejected_rate_limited")
+                retry_after = max((1 - s.tokens) / self._limits[kind][1] for kind, s in empty)
+            else:
+                for s in states:
+                    s.tokens -= 1
+                self._count(cursor, "allowed")
+                retry_after = None
+            self._save(cursor, keys, states)
+        return retry_after
+
+    def _decay_failures(self, state: _KeyState, now: float) -> None:
+        if self.failure_decay > 0:
+            state.failures = max(0.0, state.failures - (now - state.failures_at) / self.failure_decay)
+        state.failures_at = now
+
+    def record_failure(self, email: str, ip: str) -> None:
+        """Count a failed attempt and lock out keys past their threshold"""
+        keys = self._keys_for(email, ip)
+        with self._transaction() as cursor:
+            now = self._clock()
+            states = self._states(cursor, keys, now)
+            for (kind, _), state in zip(keys, states):
+                self._decay_failures(state, now)
+                state.failures += 1
+                over = math.ceil(state.failures) - self._thresholds[kind]
+                if over >= 0:
+                    state.locked_until = now + min(self.lockout_max, self.lockout_base * (2 ** over))
+                    self._count(cursor, "lockouts")
+            self._save(cursor, keys, states)
+
+    def record_success(self, email: str, ip: str) -> None:
+        """Clear failure history for the email and forgive one failure of the IP"""
+        with self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM login_throttle WHERE kind = 'email' AND value = ?", (email.strip().lower(),)
+            )
+            if ip:
+                now = self._clock()
+                cursor.execute(
+                    "SELECT failures, failures_at FROM login_throttle WHERE kind = 'ip' AND value = ?", (ip,)
+                )
+                row = cursor.fetchone()
+                if row:
+                    state = _KeyState(0.0, now)
+                    state.failures, state.failures_at = row
+                    self._decay_failures(state, now)
+                    cursor.execute(
+                        "UPDATE login_throttle SET failures = ?, failures_at = ? WHERE kind = 'ip' AND value = ?",
+                        (max(0.0, state.failures - 1), state.failures_at, ip)
+                    )
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for rejected attempts and key-space usage, across all workers"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(COUNTER_NAMES)} FROM login_throttle_counters WHERE id = 1")
+            row = cursor.fetchone() or (0,) * len(COUNTER_NAMES)
+            cursor.execute(
+                "SELECT COUNT(*), IFNULL(SUM(locked_until > ?), 0) FROM login_throttle", (self._clock(),)
+            )
+            tracked, locked = cursor.fetchone()
+        finally:
+            conn.close()
+        return {
+            **dict(zip(COUNTER_NAMES, row)),
+            "tracked_keys": tracked,
+            "locked_keys": locked,
+            "max_keys": self.max_keys,
+        }
+
+    def reset(self) -> None:
+        """Forget all keys and counters"""
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM login_throttle")
+            cursor.execute(
+                f"UPDATE login_throttle_counters SET {', '.join(f'{name} = 0' for name in COUNTER_NAMES)} WHERE id = 1"
+            )
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(seconds)))
+
+
+# Singleton instance shared by the login route (its state is shared by all workers)
+login_limiter = LoginRateLimiter()
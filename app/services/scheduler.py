@@ -0,0 +1,399 @@
+"""
+Background job scheduler - interval and cron jobs with persisted run history
+
+Jobs are registered with an interval (seconds) or a five-field cron spec.
+Last-run times and run metrics are kept in job_runs, so a restart resumes
+the existing schedule instead of starting every clock over. Blocking jobs
+run in a worker thread, a job never overlaps a still-running previous run,
+and each run is delayed by a small random jitter. The scheduler runs in the
+elected leader worker only (see services/leader.py). A thread can't be
+interrupted, so every run also holds a claim on its job_runs row until it
+has really finished: a new leader skips a job whose run is still going in
+the worker that lost leadership.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import random
+import secrets
+import socket
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, LEADER_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),  # 0 and 7 are both Sunday
+)
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    """Values matched by one cron field: *, n, a-b, */s, a-b/s and comma lists"""
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid cron step in '{field}'")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if not low <= start <= end <= high:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSpec:
+    """
+    Five-field cron expression (minute hour day month weekday), local time.
+
+    As in cron, when both day and weekday are restricted a time matches if
+    either does.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec needs 5 fields, got '{expression}'")
+        self.expression = expression
+        parsed = {name: _parse_cron_field(f, low, high) for f, (name, low, high) in zip(fields, _CRON_FIELDS)}
+        self.minutes = parsed["minute"]
+        self.hours = parsed["hour"]
+        self.days = parsed["day"]
+        self.months = parsed["month"]
+        self.weekdays = {day % 7 for day in parsed["weekday"]}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        weekday = (dt.weekday() + 1) % 7  # cron counts from Sunday
+        if self._any_day or self._any_weekday:
+            return dt.day in self.days and weekday in self.weekdays
+        return dt.day in self.days or weekday in self.weekdays
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after `dt`"""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron spec '{self.expression}' never matches")
+
+
+class ScheduledJob:
+    """One registered job and its in-memory schedule state"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        every: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        initial_delay: float = 0.0,
+    ):
+        if (every is None) == (cron is None):
+            raise ValueError("A job needs exactly one of every= or cron=")
+        if every is not None and every <= 0:
+            raise ValueError("Job interval must be positive")
+        self.name = name
+        self.func = func
+        self.every = every
+        self.cron = CronSpec(cron) if cron else None
+        self.jitter = jitter
+        self.initial_delay = initial_delay
+        self.next_run: float = 0.0
+        self.is_async = inspect.iscoroutinefunction(func)
+
+    @property
+    def spec(self) -> str:
+        return self.cron.expression if self.cron else f"every {self.every:g}s"
+
+    def next_after(self, timestamp: float) -> float:
+        """Scheduled time of the run following one at `timestamp` (before jitter)"""
+        if self.cron:
+            return self.cron.next_after(datetime.fromtimestamp(timestamp)).timestamp()
+        return timestamp + self.every
+
+    def first_run(self, last_started: Optional[float], now: float) -> float:
+        """When to run first after startup, resuming from the persisted last run"""
+        if last_started is None:
+            due = now + self.initial_delay
+        else:
+            # A run missed while we were down happens now (once), not never
+            due = max(self.next_after(last_started), now)
+        return due + random.uniform(0, self.jitter)
+
+
+class Scheduler:
+    """Registry of scheduled jobs plus the loop that runs them"""
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.time,
+        max_sleep: float = 1.0,
+        claim_seconds: float = LEADER_LEASE_SECONDS,
+        holder: Optional[str] = None,
+    ):
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._clock = clock
+        self.max_sleep = max_sleep
+        self.claim_seconds = claim_seconds
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+    def register(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        every: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        initial_delay: float = 0.0,
+    ) -> ScheduledJob:
+        """
+        Register a job to run every `every` seconds or on a cron spec.
+
+        `func` may be a plain function (run in a worker thread) or a
+        coroutine function. Jobs that have never run start after
+        `initial_delay` seconds.
+        """
+        if name in self._jobs:
+            raise ValueError(f"Job '{name}' is already registered")
+        job = ScheduledJob(name, func, every=every, cron=cron, jitter=jitter, initial_delay=initial_delay)
+        self._jobs[name] = job
+        return job
+
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        return list(self._jobs.values())
+
+    def load(self) -> None:
+        """Set each job's first run from its persisted history"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        rows = dict(conn.execute("SELECT name, last_started_at FROM job_runs").fetchall())
+        conn.close()
+        now = self._clock()
+        for job in self._jobs.values():
+            job.next_run = job.first_run(rows.get(job.name), now)
+        self._save_next_runs()
+
+    def _save_next_runs(self, jobs: Optional[List[ScheduledJob]] = None) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.executemany("""
+            INSERT INTO job_runs (name, next_run_at) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET next_run_at = excluded.next_run_at
+        """, [(job.name, job.next_run) for job in (jobs or self._jobs.values())])
+        conn.commit()
+        conn.close()
+
+    def _record_run(self, name: str, started: float, lag: float, duration: float, error: Optional[str]) -> None:
+        duration_ms, lag_ms = duration * 1000, max(0.0, lag) * 1000
+        failed = int(error is not None)
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.execute("""
+            UPDATE job_runs SET
+                last_started_at = ?,
+                last_finished_at = ?,
+                last_status = ?,
+                last_error = ?,
+                last_duration_ms = ?,
+                max_duration_ms = MAX(max_duration_ms, ?),
+                total_duration_ms = total_duration_ms + ?,
+                last_lag_ms = ?,
+                max_lag_ms = MAX(max_lag_ms, ?),
+                run_count = run_count + 1,
+                failure_count = failure_count + ?,
+                consecutive_failures = CASE WHEN ? THEN consecutive_failures + 1 ELSE 0 END,
+                running_until = CASE WHEN running_by = ? THEN NULL ELSE running_until END,
+                running_by = CASE WHEN running_by = ? THEN NULL ELSE running_by END
+            WHERE name = ?
+        """, (
+            started, started + duration, "failed" if failed else "ok", error, duration_ms, duration_ms,
+            duration_ms, lag_ms, lag_ms, failed, failed, self.holder, self.holder, name
+        ))
+        conn.commit()
+        conn.close()
+
+    def _claim(self, name: str) -> bool:
+        """
+        Take or extend this worker's claim on running `name`; False if another
+        worker's run holds an unexpired claim.
+        """
+        now = self._clock()
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            cursor = conn.execute("""
+                UPDATE job_runs SET running_by = ?, running_until = ?
+                WHERE name = ? AND (running_by IS NULL OR running_by = ? OR running_until <= ?)
+            """, (self.holder, now + self.claim_seconds, name, self.holder, now))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _release(self, name: str) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.execute(
+            "UPDATE job_runs SET running_by = NULL, running_until = NULL WHERE name = ? AND running_by = ?",
+            (name, self.holder),
+        )
+        conn.commit()
+        conn.close()
+
+    def _record_skip(self, name: str) -> None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.execute("UPDATE job_runs SET skipped_overlaps = skipped_overlaps + 1 WHERE name = ?", (name,))
+        conn.commit()
+        conn.close()
+
+    async def _hold_claim(self, name: str, run: asyncio.Future) -> None:
+        """Wait for `run` to finish, renewing the job's claim while it goes"""
+        while True:
+            done, _ = await asyncio.wait({run}, timeout=self.claim_seconds / 3)
+            if done:
+                return
+            try:
+                if not await asyncio.to_thread(self._claim, name):
+                    logger.warning(f"Scheduled job {name} outlived its claim; another worker may run it too")
+            except Exception as e:
+                logger.error(f"Could not renew claim on {name}: {e}")
+
+    async def _execute(self, job: ScheduledJob, scheduled: float) -> None:
+        if not await asyncio.to_thread(self._claim, job.name):
+            logger.warning(f"Scheduled job {job.name} is still running in another worker; skipping this run")
+            await asyncio.to_thread(self._record_skip, job.name)
+            return
+        started = self._clock()
+        error = None
+        run = asyncio.ensure_future(job.func() if job.is_async else asyncio.to_thread(job.func))
+        try:
+            await self._hold_claim(job.name, run)
+            run.result()
+        except asyncio.CancelledError:
+            # A coroutine stops at once; a thread runs to the end, and until it
+            # does the claim keeps a new leader from starting the job again
+            if job.is_async:
+                run.cancel()
+            await self._hold_claim(job.name, run)
+            await asyncio.to_thread(self._release, job.name)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        duration = self._clock() - started
+        try:
+            await asyncio.to_thread(self._record_run, job.name, started, started - scheduled, duration, error)
+        except Exception as e:
+            logger.error(f"Could not record run of {job.name}: {e}")
+
+    async def run_due(self) -> List[asyncio.Task]:
+        """Start every job whose time has come; returns the tasks started"""
+        now = self._clock()
+        started, rescheduled = [], []
+        for job in self._jobs.values():
+            if job.next_run > now:
+                continue
+            scheduled = job.next_run
+            job.next_run = job.next_after(max(scheduled, now)) + random.uniform(0, job.jitter)
+            rescheduled.append(job)
+            running = self._running.get(job.name)
+            if running is not None and not running.done():
+                logger.warning(f"Scheduled job {job.name} is still running; skipping this run")
+                await asyncio.to_thread(self._record_skip, job.name)
+                continue
+            task = asyncio.create_task(self._execute(job, scheduled), name=f"job:{job.name}")
+            self._running[job.name] = task
+            started.append(task)
+        if rescheduled:
+            await asyncio.to_thread(self._save_next_runs, rescheduled)
+        return started
+
+    async def run(self) -> None:
+        """
+        Scheduler loop; runs until cancelled. In-flight async jobs are
+        cancelled too, and jobs running in a thread are waited for.
+        """
+        await asyncio.to_thread(self.load)
+        try:
+            while True:
+                try:
+                    await self.run_due()
+                except Exception as e:
+                    logger.error(f"Scheduler error: {e}")
+                next_run = min((job.next_run for job in self._jobs.values()), default=None)
+                delay = self.max_sleep if next_run is None else next_run - self._clock()
+                await asyncio.sleep(max(0.05, min(self.max_sleep, delay)))
+        finally:
+            tasks = list(self._running.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._running.clear()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Registered jobs with their persisted run metrics.
+
+        Read from job_runs (including whether a run is in progress), so any
+        worker can answer, not just the leader.
+        """
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        rows = {row["name"]: dict(row) for row in conn.execute("SELECT * FROM job_runs").fetchall()}
+        conn.close()
+
+        now = self._clock()
+        result = []
+        for job in self._jobs.values():
+            row = rows.get(job.name, {})
+            run_count = row.get("run_count") or 0
+            result.append({
+                "name": job.name,
+                "schedule": job.spec,
+                "running": (row.get("running_until") or 0) > now,
+                "next_run_at": row.get("next_run_at"),
+                "overdue_seconds": max(0.0, now - row["next_run_at"]) if row.get("next_run_at") else 0.0,
+                "last_started_at": row.get("last_started_at"),
+                "last_finished_at": row.get("last_finished_at"),
+                "last_status": row.get("last_status"),
+                "last_error": row.get("last_error"),
+                "last_duration_ms": row.get("last_duration_ms"),
+                "avg_duration_ms": (row["total_duration_ms"] / run_count) if run_count else None,
+                "max_duration_ms": row.get("max_duration_ms"),
+                "last_lag_ms": row.get("last_lag_ms"),
+                "max_lag_ms": row.get("max_lag_ms"),
+                "run_count": run_count,
+                "failure_count": row.get("failure_count") or 0,
+                "consecutive_failures": row.get("consecutive_failures") or 0,
+                "skipped_overlaps": row.get("skipped_overlaps") or 0,
+            })
+        return result
+
+
+# Shared scheduler; jobs are registered by the app and run by the leader
+scheduler = Scheduler()
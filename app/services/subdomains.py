@@ -0,0 +1,203 @@
+"""
+Subdomain availability for HTTP/HTTPS tunnels
+
+Claimed subdomains are mirrored in memory (a set for membership plus a
+sorted list for prefix lookups) so availability checks never hit SQLite.
+Each worker keeps its mirror current by replaying the tunnel_changes
+journal, so names claimed or freed through another worker show up within
+REFRESH_INTERVAL. The unique index on tunnels.subdomain is what finally
+enforces ownership: a write that loses a race gets an IntegrityError,
+which the routes turn into a 409.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, SUBDOMAIN_RESERVED
+from .changes import current_version, get_changes
+
+logger = logging.getLogger(__name__)
+
+# Seconds between journal replays in each worker
+REFRESH_INTERVAL = 1
+
+# Names kept for the server itself and common infrastructure
+RESERVED_SUBDOMAINS = frozenset({
+    "admin", "api", "app", "auth", "blog", "cdn", "dashboard", "dev", "docs",
+    "frp", "frps", "ftp", "git", "help", "imap", "localhost", "mail", "mx",
+    "ns", "ns1", "ns2", "pop", "pop3", "root", "smtp", "ssh", "static",
+    "status", "support", "tunnel", "tunnels", "webmail", "www",
+}) | frozenset(SUBDOMAIN_RESERVED)
+
+# One DNS label: letters, digits and inner hyphens, at most 63 characters
+SUBDOMAIN_PATTERN = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
+
+
+def normalize_subdomain(name: str) -> str:
+    """Lowercase and trim a subdomain"""
+    return name.strip().lower()
+
+
+def subdomain_problem(name: str) -> Optional[str]:
+    """Why a normalized name can never be claimed ("invalid" or "reserved"), or None"""
+    if not SUBDOMAIN_PATTERN.match(name):
+        return "invalid"
+    if name in RESERVED_SUBDOMAINS:
+        return "reserved"
+    return None
+
+
+def is_subdomain_conflict(error: sqlite3.IntegrityError) -> bool:
+    """True if an IntegrityError came from the subdomain unique index"""
+    return "subdomain" in str(error)
+
+
+class SubdomainRegistry:
+    """In-memory index of claimed subdomains, following the tunnel change journal"""
+
+    def __init__(self):
+        self._names: set = set()
+        self._sorted: List[str] = []
+        self._by_tunnel: Dict[int, str] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        # One refresh at a time, so an older journal read never lands after a newer one
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+
+    def rebuild(self) -> int:
+        """Reload claimed subdomains from the tunnels table; returns the count"""
+        with self._refresh_lock:
+            return self._rebuild()
+
+    def _rebuild(self) -> int:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        cursor = conn.cursor()
+        # Version first: changes racing with the read are replayed by the next refresh
+        version = current_version(cursor)
+        cursor.execute("SELECT id, subdomain FROM tunnels WHERE subdomain IS NOT NULL")
+        by_tunnel = dict(cursor.fetchall())
+        conn.close()
+
+        with self._lock:
+            self._by_tunnel = by_tunnel
+            self._names = set(by_tunnel.values())
+            self._sorted = sorted(self._names)
+            self._version = version
+            self._loaded = True
+        return len(by_tunnel)
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.rebuild()
+
+    def refresh(self) -> int:
+        """Apply journal entries written since the last refresh, by any worker; returns tunnels touched"""
+        self._ensure_loaded()
+        with self._refresh_lock:
+            conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+            try:
+                cursor = conn.cursor()
+                changes = get_changes(cursor, self._version)
+                if changes["reset"]:
+                    conn.close()
+                    logger.info("Subdomain index fell behind the tunnel change journal, rebuilding")
+                    return self._rebuild()
+                current: Dict[int, Optional[str]] = {tunnel_id: None for tunnel_id in changes["deleted"]}
+                upserted = changes["upserted"]
+                for start in range(0, len(upserted), 500):
+                    chunk = upserted[start:start + 500]
+                    current.update({tunnel_id: None for tunnel_id in chunk})
+                    cursor.execute(
+                        f"SELECT id, subdomain FROM tunnels WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                    current.update(cursor.fetchall())
+            finally:
+                conn.close()
+
+            with self._lock:
+                # Drop every old name first, so a name moving between tunnels isn't lost
+                for tunnel_id in current:
+                    self._discard(self._by_tunnel.pop(tunnel_id, None))
+                for tunnel_id, name in current.items():
+                    if name:
+                        self._by_tunnel[tunnel_id] = name
+                        self._insert(name)
+                self._version = changes["version"]
+            return len(current)
+
+    async def follow(self) -> None:
+        """Background task: replay the journal every REFRESH_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Subdomain index refresh failed: {e}")
+
+    def _insert(self, name: str) -> None:
+        if name not in self._names:
+            self._names.add(name)
+            bisect.insort(self._sorted, name)
+
+    def _discard(self, name: Optional[str]) -> None:
+        if name in self._names:
+            self._names.discard(name)
+            del self._sorted[bisect.bisect_left(self._sorted, name)]
+
+    def is_taken(self, name: str) -> bool:
+        self._ensure_loaded()
+        return name in self._names
+
+    def with_prefix(self, prefix: str, limit: int = 10) -> List[str]:
+        """Claimed subdomains starting with `prefix`, in order"""
+        self._ensure_loaded()
+        with self._lock:
+            start = bisect.bisect_left(self._sorted, prefix)
+            matches = []
+            for name in self._sorted[start:start + limit]:
+                if not name.startswith(prefix):
+                    break
+                matches.append(name)
+            return matches
+
+    def check(self, name: str, suggestions: int = 3) -> Dict[str, Any]:
+        """
+        Check whether a subdomain can be claimed.
+
+        Returns dict with the normalized name, available, a reason
+        ("invalid", "reserved" or "taken") when unavailable, and
+        free alternatives for taken or reserved names.
+        """
+        name = normalize_subdomain(name)
+        reason = subdomain_problem(name)
+        if reason is None and self.is_taken(name):
+            reason = "taken"
+        result: Dict[str, Any] = {"name": name, "available": reason is None, "reason": reason, "suggestions": []}
+        if reason is None:
+            return result
+
+        if result["reason"] != "invalid":
+            result["suggestions"] = self.suggest(name, suggestions)
+        return result
+
+    def suggest(self, name: str, count: int = 3) -> List[str]:
+        """Free variants of `name` (name-2, name-3, ...)"""
+        base = name[:60]
+        taken = set(self.with_prefix(f"{base}-", limit=200))
+        suggestions = []
+        n = 2
+        while len(suggestions) < count and n < 100:
+            candidate = f"{base}-{n}"
+            if candidate not in taken and candidate not in RESERVED_SUBDOMAINS:
+                suggestions.append(candidate)
+            n += 1
+        return suggestions
+
+
+# Singleton index rebuilt by the app lifespan and refreshed in every worker
+subdomain_registry = SubdomainRegistry()
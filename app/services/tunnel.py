@@ -2,30 +2,19 @@
 Tunnel services - URL generation, config generation, quota checks
 """
 import os
-import socket
 import sqlite3
 from typing import Optional, Tuple, Dict, Any
-from ..config import DB_FILE, FRPS_CONFIG
 from ..models.schemas import TunnelCreate
+from .frps_config import get_frps_settings
 
 
 def get_server_domain() -> str:
-    """Get server domain from frps config or environment"""
+    """Get server domain from environment or the cached frps config"""
     domain = os.getenv("SERVER_DOMAIN", "")
     if domain:
         return domain
 
-    # Try to read from frps.ini
-    try:
-        if os.path.exists(FRPS_CONFIG):
-            with open(FRPS_CONFIG, 'r') as f:
-                for line in f:
-                    if 'subdomain_host' in line:
-                        return line.split('=')[1].strip()
-    except:
-        pass
-
-    return "localhost"
+    return get_frps_settings()["subdomain_host"] or "localhost"
 
 
 def get_public_url(
@@ -59,42 +48,20 @@ def get_ssh_connection_string(
     return f"ssh {ssh_user}@{domain} -p {remote_port}"
 
 
-def test_ssh_connection(domain: str, remote_port: int) -> Dict[str, Any]:
-    """Test if an SSH service is reachable on the given domain:port"""
-    result = {"reachable": False, "is_ssh": False, "ssh_banner": None}
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        sock.connect((domain, remote_port))
-        result["reachable"] = True
-        # Try to read SSH banner
-        banner = sock.recv(256).decode("utf-8", errors="replace").strip()
-        if banner.startswith("SSH-"):
-            result["is_ssh"] = True
-            result["ssh_banner"] = banner
-        sock.close()
-    except (socket.timeout, ConnectionRefusedError, OSError):
-        pass
-    return result
-
-
-def check_user_quota(user_id: int) -> Tuple[bool, int, int]:
+def check_user_quota(cursor: sqlite3.Cursor, user_id: int) -> Tuple[bool, int, int]:
     """
     Check if user can create more tunnels.
+
+    Reads the trigger-maintained users.tunnel_count, so call it inside the
+    transaction that inserts the tunnel (after BEGIN IMMEDIATE) to make the
+    check and the insert atomic. Users pending deletion can't create any.
     Returns (can_create, current_count, max_allowed)
     """
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT max_tunnels FROM users WHERE id = ?", (user_id,))
+    cursor.execute("SELECT tunnel_count, max_tunnels FROM users WHERE id = ? AND deleted_at IS NULL", (user_id,))
     result = cursor.fetchone()
-    max_tunnels = result[0] if result else 10
-
-    cursor.execute("SELECT COUNT(*) FROM tunnels WHERE user_id = ?", (user_id,))
-    current_count = cursor.fetchone()[0]
-
-    conn.close()
-
+    if not result:
+        return False, 0, 0
+    current_count, max_tunnels = result
     return current_count < max_tunnels, current_count, max_tunnels
 
 
@@ -110,7 +77,7 @@ def generate_frpc_config(
     if include_common:
         config_lines.append("[common]")
         config_lines.append(f"server_addr = {domain}")
-        config_lines.append("server_port = 7000")
+        config_lines.append(f"server_port = {get_frps_settings()['bind_port']}")
         if user_token:
             config_lines.append(f"token = {user_token}")
         config_lines.append("")
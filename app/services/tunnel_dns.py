@@ -0,0 +1,216 @@
+"""
+Per-tunnel DNS records - <subdomain>.TUNNEL_DOMAIN A records kept in step with tunnels
+
+Tunnel create/update/delete only record an intent (subdomain should exist /
+should not exist) in the tunnel_dns_intents table, written by triggers in
+the same transaction as the tunnel change. The leader worker reconciles due
+intents in batches against the cached zone view, so tunnel CRUD never waits
+on the DNS provider. Repeated intents for a subdomain collapse into the
+latest one, whichever worker wrote it; provider calls are paced by the
+reconciler's rate limit, and failures are retried with exponential backoff.
+All records are resynced when the worker starts and whenever the server's
+public IP changes.
+
+Records the worker creates are listed in tunnel_dns_managed, and only those
+are ever deleted: hand-made records under the tunnel domain are left alone.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ..config import DB_BUSY_TIMEOUT, DB_FILE, TUNNEL_DNS_BATCH_SIZE, TUNNEL_DNS_MAX_BACKOFF, TUNNEL_DNS_RECORDS
+from .dns import DnsReconciler, dns_reconciler, dns_setup, load_last_ip
+
+logger = logging.getLogger(__name__)
+
+
+def _current_ip() -> Optional[str]:
+    # The saved IP is shared by all workers, so it follows refreshes done by the leader
+    return load_last_ip() or dns_setup.state().get("ip")
+
+
+class TunnelDnsQueue:
+    """Persistent, coalescing queue of per-tunnel DNS intents plus the worker that applies them"""
+
+    def __init__(
+        self,
+        reconciler: Optional[DnsReconciler] = None,
+        enabled: bool = TUNNEL_DNS_RECORDS,
+        batch_size: int = TUNNEL_DNS_BATCH_SIZE,
+        max_backoff: float = TUNNEL_DNS_MAX_BACKOFF,
+        retry_base: float = 2.0,
+        poll_interval: float = 5,
+        ip_source: Callable[[], Optional[str]] = _current_ip,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.reconciler = reconciler or dns_reconciler
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self._ip_source = ip_source
+        self._clock = clock
+        self._synced_ip: Optional[str] = None
+        # Counted by the worker that drains the queue (the leader)
+        self._counters = {
+            "applied": 0,
+            "retries": 0,
+        }
+
+    def hostname(self, subdomain: str) -> str:
+        return f"{subdomain}.{self.reconciler.domain}"
+
+    def enqueue(self, subdomain: str, present: bool) -> None:
+        """Record that `subdomain`'s record should (or should not) exist, replacing any pending intent"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            conn.execute("""
+                INSERT INTO tunnel_dns_intents (subdomain, present) VALUES (?, ?)
+                ON CONFLICT(subdomain) DO UPDATE SET
+                    present = excluded.present, attempts = 0, due_at = 0, generation = generation + 1
+            """, (subdomain, int(present)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        """Drop every pending intent (nothing drains them while per-tunnel records are off)"""
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            conn.execute("DELETE FROM tunnel_dns_intents")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            pending = conn.execute("SELECT COUNT(*) FROM tunnel_dns_intents").fetchone()[0]
+        finally:
+            conn.close()
+        return {"enabled": self.enabled, "pending": pending, **self._counters}
+
+    def resync(self) -> int:
+        """
+        Queue every tunnel subdomain, plus removal of records this queue
+        created that no tunnel claims any more; returns how many were queued.
+        """
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        rows = conn.execute("SELECT DISTINCT subdomain FROM tunnels WHERE subdomain IS NOT NULL").fetchall()
+        managed = {row[0] for row in conn.execute("SELECT subdomain FROM tunnel_dns_managed")}
+        conn.close()
+        wanted = {row[0] for row in rows}
+
+        self.reconciler.records(refresh=True)  # diff the resync against a fresh zone view
+        stale = managed - wanted
+        for subdomain in wanted:
+            self.enqueue(subdomain, True)
+        for subdomain in stale:
+            self.enqueue(subdomain, False)
+        return len(wanted) + len(stale)
+
+    def process_due(self, ip: str) -> int:
+        """
+        Reconcile one batch of due intents (blocking); returns the batch size.
+
+        Subdomains whose changes failed are retried after retry_base * 2^n
+        seconds (capped at max_backoff); an intent replaced while its batch
+        was in flight is left for the next batch. Removals of records this
+        queue did not create are dropped without touching the zone.
+        """
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            batch = conn.execute("""
+                SELECT subdomain, present, generation, attempts FROM tunnel_dns_intents
+                WHERE due_at <= ? ORDER BY due_at LIMIT ?
+            """, (self._clock(), self.batch_size)).fetchall()
+            managed = {
+                row[0] for row in conn.execute(
+                    f"SELECT subdomain FROM tunnel_dns_managed WHERE subdomain IN ({','.join('?' * len(batch))})",
+                    [subdomain for subdomain, _, _, _ in batch]
+                )
+            } if batch else set()
+        finally:
+            conn.close()
+        if not batch:
+            return 0
+
+        summary = self.reconciler.apply({
+            (self.hostname(subdomain), "A"): ip if present else None
+            for subdomain, present, _, _ in batch if present or subdomain in managed
+        })
+        failed = {hostname for hostname, _ in summary["failed"]}
+
+        now = self._clock()
+        done, retries, created, removed = [], [], [], []
+        for subdomain, present, generation, attempts in batch:
+            if self.hostname(subdomain) in failed:
+                due_at = now + min(self.max_backoff, self.retry_base * 2 ** attempts)
+                retries.append((due_at, subdomain, generation))
+            else:
+                done.append((subdomain, generation))
+                (created if present else removed).append((subdomain,))
+
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            # The generation check skips intents replaced meanwhile
+            conn.executemany(
+                "DELETE FROM tunnel_dns_intents WHERE subdomain = ? AND generation = ?", done
+            )
+            conn.executemany("""
+                UPDATE tunnel_dns_intents SET attempts = attempts + 1, due_at = ?
+                WHERE subdomain = ? AND generation = ?
+            """, retries)
+            conn.executemany("INSERT OR IGNORE INTO tunnel_dns_managed (subdomain) VALUES (?)", created)
+            conn.executemany("DELETE FROM tunnel_dns_managed WHERE subdomain = ?", removed)
+            conn.commit()
+        finally:
+            conn.close()
+        self._counters["applied"] += len(done)
+        self._counters["retries"] += len(retries)
+        if failed:
+            logger.warning(f"Tunnel DNS changes failed for {len(failed)} hostname(s), will retry")
+        return len(batch)
+
+    def step(self) -> float:
+        """Resync if the IP changed, then drain due intents; returns seconds until the next run"""
+        ip = self._ip_source()
+        if not ip:
+            return min(self.poll_interval, 5)
+        if ip != self._synced_ip:
+            queued = self.resync()
+            self._synced_ip = ip
+            logger.info(f"Resyncing {queued} tunnel DNS record(s) to {ip}")
+        while self.process_due(ip):
+            pass
+
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
+        try:
+            next_due = conn.execute("SELECT MIN(due_at) FROM tunnel_dns_intents").fetchone()[0]
+        finally:
+            conn.close()
+        if next_due is None:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, next_due - self._clock()))
+
+    async def run(self) -> None:
+        """Leader job: apply intents as they are written and retry failures when due"""
+        if not self.enabled:
+            return
+        # A new leader resyncs everything, in case intents were cleared while records were off
+        self._synced_ip = None
+        while True:
+            delay = self.poll_interval
+            try:
+                if await asyncio.to_thread(self.reconciler.configured):
+                    delay = await asyncio.to_thread(self.step)
+            except Exception as e:
+                logger.error(f"Tunnel DNS worker error: {e}")
+            await asyncio.sleep(delay)
+
+
+# Singleton queue, fed by triggers on the tunnels table and run by the leader worker
+tunnel_dns = TunnelDnsQueue()
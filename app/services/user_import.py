@@ -0,0 +1,159 @@
+"""
+Bulk user import - CSV/JSON parsing and bcrypt hashing in a process pool
+
+bcrypt is deliberately slow, so hashing dominates an import. Passwords are
+hashed in chunks across a pool of worker processes (by default this server
+worker's share of the CPUs) while the request reports progress as chunks
+finish.
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import bcrypt
+
+from ..config import USER_IMPORT_WORKERS, WEB_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Columns read from an import file; anything else is ignored
+IMPORT_FIELDS = ("email", "password", "max_tunnels")
+
+# Imports this small are hashed on a thread instead of starting the pool
+INLINE_HASH_LIMIT = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def parse_import(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """
+    Parse an import file into raw row dicts.
+
+    JSON bodies are a list of objects or {"users": [...]}; anything else is
+    read as CSV with a header row (email, password, max_tunnels). Empty CSV
+    cells are treated as missing. Raises ValueError if the body can't be parsed.
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Import file must be UTF-8")
+
+    if "json" in content_type:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("users")
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError('JSON import must be a list of users or {"users": [...]}')
+        return data
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "email" not in [f.strip().lower() for f in reader.fieldnames]:
+        raise ValueError("CSV import needs a header row with an email column")
+    rows = []
+    for record in reader:
+        row = {}
+        for key, value in record.items():
+            key = (key or "").strip().lower()
+            if key in IMPORT_FIELDS and value is not None and value.strip():
+                row[key] = value.strip()
+        rows.append(row)
+    return rows
+
+
+def generate_tokens(count: int) -> List[str]:
+    """Tunnel tokens for `count` users from a single urandom read"""
+    raw = secrets.token_bytes(32 * count)
+    return [raw[i:i + 32].hex() for i in range(0, len(raw), 32)]
+
+
+def generate_password() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def _hash_chunk(passwords: List[str], rounds: int) -> List[bytes]:
+    """Hash a chunk of passwords (runs in a worker process)"""
+    return [bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)) for password in passwords]
+
+
+def pool_size() -> int:
+    """
+    USER_IMPORT_WORKERS, or the CPUs divided among the server workers.
+
+    The launcher exports its resolved worker count as WEB_CONCURRENCY, so
+    concurrent imports in every worker use about one process per CPU in total.
+    """
+    if USER_IMPORT_WORKERS:
+        return USER_IMPORT_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY))
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Shared worker pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the server process already runs threads
+            _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Started password hashing pool with {pool_size()} workers")
+        return _pool
+
+
+def shutdown_hash_pool() -> None:
+    """Stop the worker pool (app shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def hash_passwords(passwords: List[str], rounds: int, hashes: List[Optional[bytes]]) -> AsyncIterator[int]:
+    """
+    Hash `passwords` into `hashes` (same order), yielding the number done after each chunk.
+
+    Chunks are sized so every worker gets several, which keeps progress
+    updates flowing and evens out stragglers.
+    """
+    hashes[:] = [None] * len(passwords)
+    if not passwords:
+        return
+
+    if len(passwords) <= INLINE_HASH_LIMIT:
+        hashes[:] = await asyncio.to_thread(_hash_chunk, passwords, rounds)
+        yield len(passwords)
+        return
+
+    pool = get_hash_pool()
+    loop = asyncio.get_running_loop()
+    chunk_size = max(1, math.ceil(len(passwords) / (pool_size() * 4)))
+    pending = {}
+    for start in range(0, len(passwords), chunk_size):
+        future = loop.run_in_executor(pool, _hash_chunk, passwords[start:start + chunk_size], rounds)
+        pending[future] = start
+
+    done_count = 0
+    try:
+        while pending:
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                start = pending.pop(future)
+                chunk = future.result()
+                hashes[start:start + len(chunk)] = chunk
+                done_count += len(chunk)
+            yield done_count
+    finally:
+        for future in pending:
+            future.cancel()
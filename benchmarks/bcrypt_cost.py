@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Report bcrypt hash/verify time per cost factor on this machine.
+
+Run with: python benchmarks/bcrypt_cost.py [min_rounds] [max_rounds]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import BCRYPT_TARGET_MS
+from app.services.auth import benchmark_bcrypt_costs, calibrate_bcrypt_rounds
+
+
+def main():
+    min_rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    max_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+
+    print(f"{'cost':>4}  {'hash ms':>10}  {'verify ms':>10}")
+    for result in benchmark_bcrypt_costs(min_rounds, max_rounds):
+        print(f"{result['rounds']:>4}  {result['hash_ms']:>10.1f}  {result['verify_ms']:>10.1f}")
+
+    print(f"\nCalibrated cost for BCRYPT_TARGET_MS={BCRYPT_TARGET_MS}: {calibrate_bcrypt_rounds()}")
+
+
+if __name__ == "__main__":
+    main()
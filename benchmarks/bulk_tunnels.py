@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare per-item tunnel endpoints with the bulk endpoints.
+
+Runs against a throwaway database through the ASGI app in-process, so the
+numbers are request handling plus SQLite cost without network overhead.
+
+Run with: python benchmarks/bulk_tunnels.py [count ...]   (default: 100 1000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+fd, DB_PATH = tempfile.mkstemp(suffix=".db")
+os.close(fd)
+os.environ["DB_PATH"] = DB_PATH
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-key-not-for-production")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HEALTH_CHECK_ENABLED", "false")
+os.environ.setdefault("TUNNEL_PORT_RANGE", "20000-29999")
+
+import sqlite3  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import DB_FILE  # noqa: E402
+from app.services.activity import activity_writer  # noqa: E402
+from app.services.auth import create_access_token, hash_password  # noqa: E402
+
+
+def make_user(max_tunnels: int) -> dict:
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    email = f"bench-{time.monotonic_ns()}@example.com"
+    cursor.execute("""
+        INSERT INTO users (email, password_hash, token, max_tunnels)
+        VALUES (?, ?, ?, ?)
+    """, (email, hash_password("benchmark"), email, max_tunnels))
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    activity_writer.flush()
+    return time.perf_counter() - start
+
+
+def run(client: TestClient, count: int) -> None:
+    headers = make_user(count)
+    batch = [{"name": f"t{n}", "type": "tcp", "local_port": 22} for n in range(count)]
+
+    # Per-item path
+    ids = []
+    create = timed(lambda: ids.extend(
+        client.post("/api/tunnels", json=body, headers=headers).json()["id"] for body in batch
+    ))
+    update = timed(lambda: [
+        client.put(f"/api/tunnels/{tunnel_id}", json={"local_port": 2222}, headers=headers) for tunnel_id in ids
+    ])
+    status = timed(lambda: [
+        client.put(f"/api/tunnels/{tunnel_id}/status", json={"is_active": True}, headers=headers) for tunnel_id in ids
+    ])
+    delete = timed(lambda: [client.delete(f"/api/tunnels/{tunnel_id}", headers=headers) for tunnel_id in ids])
+    per_item = (create, update, status, delete)
+
+    # Bulk path
+    ids = []
+    create = timed(lambda: ids.extend(
+        r["id"] for r in client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=headers).json()["results"]
+    ))
+    update = timed(lambda: client.put(
+        "/api/tunnels/bulk", json={"tunnels": [{"id": i, "local_port": 2222} for i in ids]}, headers=headers
+    ))
+    status = timed(lambda: client.put("/api/tunnels/bulk/status", json={"ids": ids, "is_active": True}, headers=headers))
+    delete = timed(lambda: client.post("/api/tunnels/bulk/delete", json={"ids": ids}, headers=headers))
+    bulk = (create, update, status, delete)
+
+    print(f"\n{count} tunnels")
+    print(f"{'operation':>10}  {'per-item s':>10}  {'bulk s':>8}  {'speedup':>8}")
+    for name, slow, fast in zip(("create", "update", "status", "delete"), per_item, bulk):
+        print(f"{name:>10}  {slow:>10.3f}  {fast:>8.3f}  {slow / fast:>7.1f}x")
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000]
+    try:
+        with TestClient(create_app()) as client:
+            for count in counts:
+                run(client, count)
+    finally:
+        os.unlink(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
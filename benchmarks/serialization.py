@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Compare JSON serialization time and bytes on the wire for the large list
+endpoints, before (jsonable_encoder + stdlib json, uncompressed) and after
+(orjson rendering, chunked streaming, gzip/brotli compression).
+
+Runs against a throwaway database through the ASGI app in-process.
+
+Run with: python benchmarks/serialization.py [rows]   (default: 1000)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+fd, DB_PATH = tempfile.mkstemp(suffix=".db")
+os.close(fd)
+os.environ["DB_PATH"] = DB_PATH
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-key-not-for-production")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HEALTH_CHECK_ENABLED", "false")
+os.environ.setdefault("TUNNEL_PORT_RANGE", "20000-29999")
+
+import sqlite3  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import DB_FILE  # noqa: E402
+from app.responses import ENCODINGS, FastJSONResponse, compress, orjson  # noqa: E402
+from app.services.auth import create_access_token, hash_password  # noqa: E402
+from app.services.metrics import get_request_metrics  # noqa: E402
+from app.services.pagination import stream_json  # noqa: E402
+
+REPEAT = 20
+
+
+def make_admin(max_tunnels: int) -> dict:
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    email = f"bench-{time.monotonic_ns()}@example.com"
+    cursor.execute("""
+        INSERT INTO users (email, password_hash, token, is_admin, max_tunnels)
+        VALUES (?, ?, ?, 1, ?)
+    """, (email, hash_password("benchmark"), email, max_tunnels))
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+def seed_metrics(rows: int) -> None:
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany("""
+        INSERT INTO request_metrics
+            (tunnel_id, tunnel_name, request_path, request_method, status_code, response_time_ms,
+             bytes_sent, bytes_received, client_ip)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (n % 20, f"tunnel-{n % 20}", f"/api/items/{n}?page={n % 7}", ("GET", "POST")[n % 2],
+         (200, 201, 404, 500)[n % 4], n % 900, n * 13 % 65536, n * 7 % 4096, f"203.0.113.{n % 250}")
+        for n in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def timed_ms(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def legacy_stream_json(list_key, items, trailer):
+    """stream_json as it was: stdlib json, one chunk per item"""
+    yield f'{{{json.dumps(list_key)}:['.encode()
+    first = True
+    for item in items:
+        yield (b"" if first else b",") + json.dumps(item, default=str).encode()
+        first = False
+    yield b"]"
+    for key, value in trailer.items():
+        yield f",{json.dumps(key)}:{json.dumps(value, default=str)}".encode()
+    yield b"}"
+
+
+def report(title: str, before_ms: float, after_ms: float, body: bytes) -> None:
+    print(f"\n{title}")
+    print(f"  render ms   before {before_ms:8.2f}   after {after_ms:8.2f}   ({before_ms / after_ms:.1f}x)")
+    sizes = [f"identity {len(body):>8} B"]
+    for encoding in ENCODINGS:
+        sizes.append(f"{encoding} {len(compress(body, encoding)):>7} B")
+    print("  on the wire " + "   ".join(sizes))
+
+
+def wire(client: TestClient, url: str, headers: dict, encoding: str) -> tuple:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = client.get(url, headers={**headers, "Accept-Encoding": encoding})
+    elapsed = (time.perf_counter() - start) / REPEAT * 1000
+    return elapsed, response.num_bytes_downloaded
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"JSON renderer: {'orjson' if orjson else 'stdlib json'}; compression: {', '.join(ENCODINGS)}")
+    try:
+        with TestClient(create_app()) as client:
+            headers = make_admin(rows)
+            seed_metrics(rows)
+            batch = [{"name": f"t{n}", "type": "tcp", "local_port": 22} for n in range(rows)]
+            client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=headers)
+
+            metrics = get_request_metrics(limit=rows)
+            report(
+                f"/api/metrics?limit={rows} ({len(metrics['metrics'])} rows)",
+                timed_ms(lambda: JSONResponse(jsonable_encoder(metrics))),
+                timed_ms(lambda: FastJSONResponse(metrics)),
+                FastJSONResponse(metrics).body,
+            )
+
+            tunnels = client.get("/api/tunnels", headers=headers).json()["tunnels"]
+            report(
+                f"/api/tunnels ({len(tunnels)} tunnels)",
+                timed_ms(lambda: b"".join(legacy_stream_json("tunnels", tunnels, {}))),
+                timed_ms(lambda: b"".join(stream_json("tunnels", tunnels, {}))),
+                b"".join(stream_json("tunnels", tunnels, {})),
+            )
+
+            print(f"\nEnd to end (mean of {REPEAT} requests)")
+            print(f"{'endpoint':>24}  {'encoding':>9}  {'ms':>8}  {'bytes':>9}")
+            for url in (f"/api/metrics?limit={rows}", "/api/tunnels", "/"):
+                for encoding in ("identity",) + ENCODINGS:
+                    elapsed, size = wire(client, url, headers, encoding)
+                    print(f"{url:>24}  {encoding:>9}  {elapsed:>8.2f}  {size:>9}")
+    finally:
+        os.unlink(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Compare request throughput of server configurations on this machine.
+
+Each configuration is started with the production launcher on a temporary
+database and driven with keep-alive GET /api/health requests from several
+client threads. uvloop/httptools rows are skipped when not installed.
+
+Run with: python benchmarks/server_throughput.py [seconds] [clients]
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from app.server import detect_http, detect_loop, worker_count
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def drive(port: int, seconds: float, clients: int) -> dict:
+    """Keep-alive load from `clients` threads; returns request count and latencies"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", "/api/health")
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise OSError(response.status)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def run_config(workers: int, loop: str, http: str, seconds: float, clients: int, db_dir: str) -> dict:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DB_PATH=os.path.join(db_dir, f"bench-{port}.db"),
+        HEALTH_CHECK_ENABLED="false",
+    )
+    code = (
+        "from app.server import serve; "
+        f"serve(host='127.0.0.1', port={port}, workers={workers}, loop='{loop}', http='{http}', log_level='warning', access_log=False)"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        drive(port, 1, clients)  # warm up every worker
+        return drive(port, seconds, clients)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    cpus = worker_count(0)
+
+    configs = [(1, "asyncio", "h11")]
+    if detect_loop() == "uvloop" and detect_http() == "httptools":
+        configs.append((1, "uvloop", "httptools"))
+    if cpus > 1:
+        configs.append((cpus, detect_loop(), detect_http()))
+
+    print(f"{seconds:g}s per configuration, {clients} keep-alive clients, {cpus} CPU(s)\n")
+    print(f"{'workers':>7}  {'loop':>8}  {'http':>10}  {'req/s':>9}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}")
+    with tempfile.TemporaryDirectory() as db_dir:
+        for workers, loop, http in configs:
+            result = run_config(workers, loop, http, seconds, clients, db_dir)
+            print(
+                f"{workers:>7}  {loop:>8}  {http:>10}  {result['requests'] / seconds:>9.0f}  "
+                f"{result['p50_ms']:>8.2f}  {result['p99_ms']:>8.2f}  {result['errors']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Compare creating users one POST /api/users call at a time with one
+POST /api/users/import of the same users.
+
+Runs against a throwaway database through the ASGI app in-process. bcrypt
+cost is BCRYPT_ROUNDS (default 10 here) so hashing dominates, as it does in
+production; the import spreads it over USER_IMPORT_WORKERS processes.
+
+Run with: python benchmarks/user_import.py [count]   (default: 1000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+fd, DB_PATH = tempfile.mkstemp(suffix=".db")
+os.close(fd)
+os.environ["DB_PATH"] = DB_PATH
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-key-not-for-production")
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+os.environ.setdefault("HEALTH_CHECK_ENABLED", "false")
+
+import json  # noqa: E402
+import sqlite3  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import DB_FILE  # noqa: E402
+from app.services.activity import activity_writer  # noqa: E402
+from app.services.auth import create_access_token, get_bcrypt_rounds, hash_password  # noqa: E402
+from app.services.user_import import pool_size  # noqa: E402
+
+
+def make_admin() -> dict:
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO users (email, password_hash, token, is_admin)
+        VALUES ('bench-admin@example.com', ?, 'bench-admin', 1)
+    """, (hash_password("benchmark"),))
+    admin_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(admin_id)})}"}
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    activity_writer.flush()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    try:
+        with TestClient(create_app()) as client:
+            headers = make_admin()
+
+            def one_by_one():
+                for n in range(count):
+                    client.post(
+                        "/api/users",
+                        json={"email": f"single-{n}@example.com", "password": f"pw-{n}"},
+                        headers=headers
+                    )
+
+            csv_body = "email,password\n" + "\n".join(f"bulk-{n}@example.com,pw-{n}" for n in range(count))
+            events = []
+
+            def bulk():
+                response = client.post(
+                    "/api/users/import", content=csv_body.encode(),
+                    headers={**headers, "Content-Type": "text/csv"}
+                )
+                events.extend(json.loads(line) for line in response.text.splitlines())
+
+            slow = timed(one_by_one)
+            fast = timed(bulk)
+            assert events[-1]["created"] == count, events[-1]
+
+            print(f"\n{count} users, bcrypt cost {get_bcrypt_rounds()}, {pool_size()} hashing workers")
+            print(f"{'per-user POST':>16}  {slow:>8.2f} s  {count / slow:>8.1f} users/s")
+            print(f"{'import':>16}  {fast:>8.2f} s  {count / fast:>8.1f} users/s")
+            print(f"{'speedup':>16}  {slow / fast:>8.1f}x")
+    finally:
+        os.unlink(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
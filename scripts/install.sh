@@ -73,8 +73,10 @@ pidfile="/run/${RC_SVCNAME}.pid"
 output_log="/var/log/tunnel-server.log"
 error_log="/var/log/tunnel-server.log"
 
-# Retry stopping: SIGTERM, wait 5s, SIGTERM, wait 5s, SIGKILL
-retry="TERM/5/TERM/5/KILL/5"
+# Retry stopping: SIGTERM, wait 40s (graceful worker drain), SIGKILL
+retry="TERM/40/KILL/5"
+
+extra_started_commands="reload"
 
 depend() {
     need net
@@ -108,6 +110,13 @@ stop() {
     rm -f "$pidfile"
     eend 0
 }
+
+reload() {
+    ebegin "Reloading ${name} workers"
+    # SIGHUP to the launcher: new workers start before the old ones drain
+    pkill -HUP -f "^python3 main.py"
+    eend $?
+}
 EOF
 
 chmod +x /etc/init.d/tunnel-server
@@ -1,6 +1,7 @@
 #!/bin/sh
 # Phase 2: Start tunnel-server with 1Password secrets
 # This script is called by the OpenRC service or can be run manually
+# main.py supervises WEB_CONCURRENCY workers; send it SIGHUP to reload them
 
 set -e
 
@@ -1,30 +1,31 @@
 """
 Pytest fixtures for Tunnel Server tests
 """
+import json
 import os
 import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
 from fastapi.testclient import TestClient
 
-# Set test database before importing app
-_test_db_file = None
+# Set test database before importing app (test modules import app at collection time)
+fd, _test_db_file = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DB_PATH'] = _test_db_file
+os.environ['JWT_SECRET'] = 'test-secret-key-for-testing'
+os.environ['BCRYPT_ROUNDS'] = '4'  # minimum cost keeps hashing fast in tests
 
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_test_env():
     """Set up test environment variables"""
-    global _test_db_file
-    # Create temp file for test database
-    fd, _test_db_file = tempfile.mkstemp(suffix='.db')
-    os.close(fd)
-    os.environ['DB_PATH'] = _test_db_file
-    os.environ['JWT_SECRET'] = 'test-secret-key-for-testing'
-
     yield
 
     # Cleanup
-    if os.path.exists(_test_db_file):
-        os.unlink(_test_db_file)
+    for path in (_test_db_file, f"{_test_db_file}-wal", f"{_test_db_file}-shm"):
+        if os.path.exists(path):
+            os.unlink(path)
 
 
 @pytest.fixture
@@ -37,6 +38,47 @@ def client(setup_test_env):
         yield client
 
 
+@pytest.fixture(autouse=True)
+def reset_login_limiter():
+    """Give every test a fresh login throttle"""
+    from app.database import init_db
+    from app.services.rate_limit import login_limiter
+    init_db()  # the throttle lives in the database
+    login_limiter.reset()
+    yield
+    login_limiter.reset()
+
+
+@pytest.fixture
+def make_user(client):
+    """Factory that inserts a user directly and returns its credentials and auth headers"""
+    import sqlite3
+    import secrets
+    from app.config import DB_FILE
+    from app.services.auth import create_access_token, hash_password
+
+    def _make_user(password="correct-horse", is_admin=False, max_tunnels=10, rounds=None):
+        email = f"user-{secrets.token_hex(6)}@example.com"
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (email, password_hash, token, is_admin, max_tunnels)
+            VALUES (?, ?, ?, ?, ?)
+        """, (email, hash_password(password, rounds=rounds), secrets.token_hex(32), int(is_admin), max_tunnels))
+        user_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        token = create_access_token({"sub": str(user_id)})
+        return {
+            "id": user_id,
+            "email": email,
+            "password": password,
+            "headers": {"Authorization": f"Bearer {token}"},
+        }
+
+    return _make_user
+
+
 @pytest.fixture
 def admin_token(client):
     """Get admin JWT token for authenticated requests"""
@@ -65,3 +107,77 @@ def auth_headers(admin_token):
     if admin_token is None:
         pytest.skip("No admin token available")
     return {"Authorization": f"Bearer {admin_token}"}
+
+
+class FakeNetlify:
+    """In-memory DNS zone served over HTTP, recording every request"""
+
+    def __init__(self):
+        self.records = {}
+        self.requests = []
+        self.fail_next = 0  # respond 503 to this many upcoming requests
+        self._next_id = 1
+
+    def add(self, hostname, value, record_type="A"):
+        record_id = f"rec-{self._next_id}"
+        self._next_id += 1
+        self.records[record_id] = {"id": record_id, "hostname": hostname, "type": record_type, "value": value}
+        return record_id
+
+    def count(self, method):
+        return sum(1 for m, _ in self.requests if m == method)
+
+
+@pytest.fixture
+def netlify(monkeypatch):
+    """Local stand-in for the Netlify DNS API; the dns service is pointed at it"""
+    from app.services import dns
+
+    fake = FakeNetlify()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=None):
+            payload = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _handle(self, method):
+            fake.requests.append((method, self.path))
+            if fake.fail_next:
+                fake.fail_next -= 1
+                return self._send(503, {"message": "unavailable"})
+            parts = self.path.strip("/").split("/")  # api/v1/dns_zones/<zone>/dns_records[/<id>]
+            if parts[-1] == "dns_zones":
+                return self._send(200, [{"id": "zone-1", "name": "example.com"}])
+            if method == "GET":
+                return self._send(200, list(fake.records.values()))
+            if method == "POST":
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                record_id = fake.add(body["hostname"], body["value"], body["type"])
+                return self._send(201, fake.records[record_id])
+            if fake.records.pop(parts[-1], None) is None:
+                return self._send(404, {"message": "not found"})
+            return self._send(204)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(dns, "NETLIFY_API_BASE", f"http://127.0.0.1:{server.server_port}/api/v1")
+    yield fake
+    server.shutdown()
+    server.server_close()
@@ -40,3 +40,25 @@ def test_dashboard_loads(client):
     response = client.get("/")
     assert response.status_code == 200
     assert "Tunnel Server" in response.text
+
+
+def test_login_rehashes_password_with_lower_cost(client, make_user, monkeypatch):
+    """Test a successful login upgrades a hash made with a lower bcrypt cost"""
+    import sqlite3
+    import app.services.auth as auth_service
+    from app.config import DB_FILE
+    from app.services.auth import get_bcrypt_rounds, get_hash_rounds
+
+    user = make_user(rounds=get_bcrypt_rounds())
+    monkeypatch.setattr(auth_service, "_bcrypt_rounds", get_bcrypt_rounds() + 1)
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+    assert response.status_code == 200
+
+    conn = sqlite3.connect(DB_FILE)
+    stored = conn.execute("SELECT password_hash FROM users WHERE id = ?", (user["id"],)).fetchone()[0]
+    conn.close()
+    assert get_hash_rounds(stored) == get_bcrypt_rounds()
+
+    # The rehashed password still works
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+    assert response.status_code == 200
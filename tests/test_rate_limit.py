@@ -0,0 +1,180 @@
+"""
+Login throttling tests
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app.services.rate_limit import LoginRateLimiter, login_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_rejected():
+    """Test attempts beyond the burst are rejected with a retry delay"""
+    clock = FakeClock()
+    limiter = LoginRateLimiter(burst=3, per_minute=60, ip_burst=100, ip_per_minute=100, clock=clock)
+
+    for _ in range(3):
+        assert limiter.check("a@example.com", "1.2.3.4") is None
+
+    retry = limiter.check("a@example.com", "1.2.3.4")
+    assert retry == pytest.approx(1.0)
+    assert limiter.stats()["rejected_rate_limited"] == 1
+
+    clock.now += 1
+    assert limiter.check("a@example.com", "1.2.3.4") is None
+
+
+def test_ip_bucket_limits_many_emails():
+    """Test one IP cycling through emails is limited by the IP bucket"""
+    limiter = LoginRateLimiter(burst=5, per_minute=5, ip_burst=4, ip_per_minute=4, clock=FakeClock())
+
+    results = [limiter.check(f"user{i}@example.com", "9.9.9.9") for i in range(10)]
+    assert results[:4] == [None] * 4
+    assert all(r is not None for r in results[4:])
+
+
+def test_exponential_lockout():
+    """Test repeated failures lock the key out for doubling periods"""
+    clock = FakeClock()
+    limiter = LoginRateLimiter(
+        burst=100, per_minute=6000, ip_burst=100, ip_per_minute=6000,
+        lockout_threshold=2, lockout_base=10, lockout_max=35, clock=clock
+    )
+
+    limiter.record_failure("a@example.com", "")
+    assert limiter.check("a@example.com", "") is None
+    limiter.record_failure("a@example.com", "")
+    assert limiter.check("a@example.com", "") == pytest.approx(10)
+
+    clock.now += 10
+    limiter.record_failure("a@example.com", "")
+    assert limiter.check("a@example.com", "") == pytest.approx(20)
+
+    clock.now += 20
+    limiter.record_failure("a@example.com", "")
+    assert limiter.check("a@example.com", "") == pytest.approx(35)  # capped
+    assert limiter.stats()["rejected_locked_out"] == 3
+
+    limiter.record_success("a@example.com", "")
+    assert limiter.check("a@example.com", "") is None
+
+
+def test_shared_ip_failures_decay_and_are_forgiven():
+    """Test occasional typos behind one IP never add up to an IP lockout"""
+    clock = FakeClock()
+    limiter = LoginRateLimiter(
+        burst=100, per_minute=6000, ip_burst=100, ip_per_minute=6000,
+        lockout_threshold=5, ip_lockout_threshold=8, failure_decay=60, clock=clock
+    )
+
+    # Many users behind one NAT each make a typo now and then
+    for i in range(30):
+        limiter.record_failure(f"user{i}@example.com", "198.51.100.1")
+        clock.now += 20
+        if i % 2:
+            limiter.record_success(f"user{i}@example.com", "198.51.100.1")
+    assert limiter.check("someone@example.com", "198.51.100.1") is None
+
+    # A burst of failures from the IP still locks it out, then decays
+    for i in range(8):
+        limiter.record_failure(f"spray{i}@example.com", "198.51.100.1")
+    assert limiter.check("someone@example.com", "198.51.100.1") is not None
+    clock.now += 3600
+    assert limiter.check("someone@example.com", "198.51.100.1") is None
+    limiter.record_failure("someone@example.com", "198.51.100.1")
+    assert limiter.check("someone@example.com", "198.51.100.1") is None
+
+
+def test_workers_share_one_budget():
+    """Test limiters in different worker processes draw from the same buckets and lockouts"""
+    clock = FakeClock()
+    workers = [
+        LoginRateLimiter(burst=4, per_minute=1, ip_burst=100, ip_per_minute=100, lockout_threshold=3, clock=clock)
+        for _ in range(4)
+    ]
+
+    results = [workers[i % 4].check("spread@example.com", "1.2.3.4") for i in range(8)]
+    assert results[:4] == [None] * 4
+    assert all(r is not None for r in results[4:])
+
+    for worker in workers[:3]:
+        worker.record_failure("locked@example.com", "")
+    assert workers[3].check("locked@example.com", "") is not None
+    assert workers[0].stats()["lockouts"] == 1
+
+
+def test_key_space_is_lru_bounded():
+    """Test the tracked key space never exceeds max_keys"""
+    limiter = LoginRateLimiter(max_keys=50, clock=FakeClock())
+    for i in range(500):
+        limiter.check(f"user{i}@example.com", "")
+
+    stats = limiter.stats()
+    assert stats["tracked_keys"] == 50
+    assert stats["evictions"] == 450
+
+
+def test_login_returns_429_with_retry_after(client, make_user):
+    """Test the login route throttles repeated failures"""
+    user = make_user()
+    statuses = []
+    for _ in range(8):
+        response = client.post("/api/auth/login", json={"email": user["email"], "password": "wrong"})
+        statuses.append(response.status_code)
+
+    assert statuses[:5] == [401] * 5
+    assert statuses[5:] == [429] * 3
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_credential_stuffing_burst_stays_responsive(client, make_user, monkeypatch):
+    """Load test: a credential-stuffing burst is rejected before bcrypt and the server stays responsive"""
+    import app.routes.auth as auth_routes
+    import app.services.auth as auth_service
+
+    victims = [make_user() for _ in range(5)]
+    checkpw_calls = []
+    real_checkpw = auth_service.bcrypt.checkpw
+
+    def counting_checkpw(password, hashed):
+        checkpw_calls.append(1)
+        return real_checkpw(password, hashed)
+
+    monkeypatch.setattr(auth_service.bcrypt, "checkpw", counting_checkpw)
+    # The test transport has no peer address; pretend every attempt comes from one host
+    monkeypatch.setattr(auth_routes, "get_client_ip", lambda request: "203.0.113.7")
+
+    def attempt(i):
+        victim = victims[i % len(victims)]
+        return client.post(
+            "/api/auth/login",
+            json={"email": victim["email"], "password": f"guess-{i}"}
+        ).status_code
+
+    burst_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        burst = pool.map(attempt, range(500))
+
+        # A legitimate request during the burst is still served promptly
+        start = time.perf_counter()
+        assert client.get("/").status_code == 200
+        assert time.perf_counter() - start < 2.0
+
+        statuses = list(burst)
+    elapsed = time.perf_counter() - burst_start
+
+    # Only the per-IP burst (plus refill while it ran) reaches bcrypt; the rest is rejected up front
+    limits = login_limiter.stats()
+    assert len(checkpw_calls) <= 20 + math.ceil(elapsed * 20 / 60)
+    assert statuses.count(429) >= 500 - len(checkpw_calls)
+    assert set(statuses) <= {401, 429}
+    assert limits["rejected_rate_limited"] + limits["rejected_locked_out"] == statuses.count(429)
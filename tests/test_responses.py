@@ -0,0 +1,71 @@
+"""
+Response encoding tests - JSON rendering, compression and the precompressed dashboard
+"""
+import json
+import secrets
+import sqlite3
+from datetime import date
+
+from app.config import DB_FILE
+from app.responses import choose_encoding, dumps
+from app.services.pagination import stream_json
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert choose_encoding("br;q=0.5, gzip", ("br", "gzip")) == "br"
+    assert choose_encoding("br;q=0, gzip;q=0", ("br", "gzip")) is None
+    assert choose_encoding("", ("gzip",)) is None
+
+
+def test_stream_json_chunks_into_valid_json():
+    trailer = {}
+
+    def items():
+        yield from ({"id": n, "name": f"t{n}"} for n in range(50))
+        trailer["next_cursor"] = "abc"
+
+    chunks = list(stream_json("tunnels", items(), trailer, chunk_size=100))
+    assert len(chunks) > 1
+    body = json.loads(b"".join(chunks))
+    assert len(body["tunnels"]) == 50 and body["next_cursor"] == "abc"
+    assert json.loads(b"".join(stream_json("tunnels", iter(()), {}))) == {"tunnels": []}
+    assert dumps({"when": date(2026, 1, 2)}) == b'{"when":"2026-01-02"}'
+
+
+def test_large_json_is_compressed_small_is_not(client, make_user):
+    user = make_user()
+    name = f"metrics-{secrets.token_hex(4)}"
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany("""
+        INSERT INTO request_metrics (tunnel_id, tunnel_name, request_path, request_method, status_code, response_time_ms)
+        VALUES (1, ?, ?, 'GET', 200, ?)
+    """, [(name, f"/path/{n}", n) for n in range(300)])
+    conn.commit()
+    conn.close()
+
+    url = f"/api/metrics?tunnel_name={name}&limit=1000"
+    plain = client.get(url, headers={**user["headers"], "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    compressed = client.get(url, headers={**user["headers"], "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 4
+    assert compressed.json() == plain.json()
+    assert len(plain.json()["metrics"]) == 300
+
+    health = client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in health.headers
+
+
+def test_dashboard_is_precompressed_with_etag(client):
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/html")
+    raw = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert response.text == raw.text
+
+    cached = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
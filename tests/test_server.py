@@ -0,0 +1,100 @@
+"""
+Production launcher tests
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from app import server
+from app.config import SECRET_KEY
+from app.services.auth import create_access_token
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_settings_fall_back_without_uvloop_or_httptools(monkeypatch):
+    monkeypatch.setattr(server, "find_spec", lambda name: None)
+    settings = server.server_settings(port=9000)
+    assert (settings["loop"], settings["http"], settings["port"]) == ("asyncio", "h11", 9000)
+    assert settings["app"] == "main:app"
+
+    monkeypatch.setattr(server, "find_spec", lambda name: object())
+    assert (server.detect_loop(), server.detect_http()) == ("uvloop", "httptools")
+
+    monkeypatch.setattr(server.os, "cpu_count", lambda: 6)
+    assert server.worker_count(0) == 6
+    assert server.worker_count(2) == 2
+
+
+def test_generated_jwt_secret_is_shared_with_workers(monkeypatch):
+    monkeypatch.delenv("JWT_SECRET", raising=False)
+    server.share_jwt_secret()
+    from app.config import SECRET_KEY
+    assert os.environ["JWT_SECRET"] == SECRET_KEY
+
+    # Workers re-import the config from the exported environment
+    probe = "from app.config import SECRET_KEY; print(SECRET_KEY)"
+    keys = {
+        subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        for _ in range(2)
+    }
+    assert keys == {SECRET_KEY}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sighup_reload_keeps_serving(tmp_path):
+    port = _free_port()
+    env = dict(
+        os.environ, DB_PATH=str(tmp_path / "server.db"), SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(port), WEB_CONCURRENCY="1", HEALTH_CHECK_ENABLED="false", JWT_SECRET=SECRET_KEY
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    # The first user of a fresh database is the default admin
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/api/health/details",
+        headers={"Authorization": f"Bearer {create_access_token({'sub': '1'})}"},
+    )
+
+    def health():
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                _, before = health()
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "server did not start"
+                time.sleep(0.1)
+
+        proc.send_signal(signal.SIGHUP)
+        statuses = []
+        deadline = time.monotonic() + 30
+        while True:
+            status, data = health()
+            statuses.append(status)
+            if data["leader"]["worker"] != before["leader"]["worker"]:
+                break
+            assert time.monotonic() < deadline, "reload did not finish"
+            time.sleep(0.05)
+
+        # Every request during the reload was served; a new worker now answers
+        assert set(statuses) == {200}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=60) == 0
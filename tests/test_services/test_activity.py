@@ -0,0 +1,171 @@
+"""
+Activity log writer unit tests
+"""
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.activity import (
+    ActivityLogWriter,
+    activity_writer,
+    archive_old_activity,
+    log_activity,
+    query_activity,
+)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _count(action: str) -> int:
+    conn = sqlite3.connect(DB_FILE)
+    count = conn.execute("SELECT COUNT(*) FROM activity_logs WHERE action = ?", (action,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def _event(action: str):
+    return (None, action, "details", "10.0.0.1", "2024-01-01 00:00:00")
+
+
+def test_writer_batches_events():
+    """Test queued events are written in multi-row batches"""
+    writer = ActivityLogWriter(batch_size=50, flush_interval=0.05)
+    for _ in range(120):
+        assert writer.enqueue(_event("batched_event")) is True
+    writer.start()
+    writer.flush()
+
+    stats = writer.stats()
+    assert _count("batched_event") == 120
+    assert stats["written"] == 120
+    assert stats["batches"] == 3
+    writer.stop()
+
+
+def test_writer_drops_when_full():
+    """Test a full queue drops events instead of blocking"""
+    writer = ActivityLogWriter(max_queue=3)
+    results = [writer.enqueue(_event("dropped_event")) for _ in range(5)]
+
+    assert results == [True, True, True, False, False]
+    stats = writer.stats()
+    assert stats["dropped"] == 2
+    assert stats["max_queue_depth"] == 3
+
+
+def test_writer_flushes_on_stop():
+    """Test stopping the writer writes everything still queued"""
+    writer = ActivityLogWriter(flush_interval=60)
+    writer.start()
+    for _ in range(10):
+        writer.enqueue(_event("stop_flush_event"))
+    writer.stop()
+
+    assert _count("stop_flush_event") == 10
+    assert writer.running is False
+
+
+def test_log_activity_without_writer_is_synchronous():
+    """Test log_activity falls back to a direct insert when the writer is stopped"""
+    assert activity_writer.running is False
+    log_activity(None, "sync_event", "written inline", "127.0.0.1")
+    assert _count("sync_event") == 1
+
+
+def test_client_ip_is_recorded(client, make_user, monkeypatch):
+    """Test mutating routes record the client IP"""
+    import app.dependencies as dependencies
+
+    monkeypatch.setattr(dependencies, "TRUST_PROXY_HEADERS", True)
+    user = make_user()
+    response = client.post(
+        "/api/ssh-keys",
+        json={"name": "laptop", "public_key": "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIGZha2Uta2V5LWZvci10ZXN0cw== me"},
+        headers={**user["headers"], "X-Forwarded-For": "198.51.100.23, 10.0.0.1"}
+    )
+    assert response.status_code == 200
+    activity_writer.flush()
+
+    conn = sqlite3.connect(DB_FILE)
+    ip = conn.execute(
+        "SELECT ip_address FROM activity_logs WHERE user_id = ? AND action = 'ssh_key_added'",
+        (user["id"],)
+    ).fetchone()[0]
+    conn.close()
+    assert ip == "198.51.100.23"
+
+
+def _insert_logs(action: str, rows):
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany("""
+        INSERT INTO activity_logs (user_id, action, details, ip_address, created_at)
+        VALUES (?, ?, ?, '', ?)
+    """, [(user_id, action, details, created_at) for user_id, details, created_at in rows])
+    conn.commit()
+    conn.close()
+
+
+def test_query_activity_keyset_pagination():
+    """Test pages follow next_cursor without gaps or repeats"""
+    # Several rows share a timestamp so the id tie-breaker matters
+    _insert_logs("page_event", [(None, f"event {i}", f"2024-02-01 00:00:{i // 3:02d}") for i in range(25)])
+
+    seen = []
+    cursor = None
+    while True:
+        page = query_activity(limit=10, cursor=cursor, action="page_event")
+        seen.extend(log["details"] for log in page["logs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    assert seen[0] == "event 24"
+
+
+def test_query_activity_filters_and_search():
+    """Test user, time range and full-text filters"""
+    _insert_logs("filter_event", [
+        (7001, "Created tunnel 'alpha-web' (http)", "2024-03-01 10:00:00"),
+        (7001, "Created tunnel 'beta-ssh' (ssh)", "2024-03-02 10:00:00"),
+        (7002, "Created tunnel 'alpha-db' (tcp)", "2024-03-03 10:00:00"),
+    ])
+
+    by_user = query_activity(action="filter_event", user_id=7001)["logs"]
+    assert [log["details"] for log in by_user] == [
+        "Created tunnel 'beta-ssh' (ssh)",
+        "Created tunnel 'alpha-web' (http)",
+    ]
+
+    in_range = query_activity(action="filter_event", since="2024-03-02 00:00:00", until="2024-03-03 00:00:00")["logs"]
+    assert [log["user_id"] for log in in_range] == [7001]
+
+    found = query_activity(action="filter_event", search="alpha")["logs"]
+    assert {log["details"] for log in found} == {
+        "Created tunnel 'alpha-web' (http)",
+        "Created tunnel 'alpha-db' (tcp)",
+    }
+
+
+def test_query_activity_rejects_bad_cursor():
+    """Test malformed cursors raise ValueError"""
+    with pytest.raises(ValueError):
+        query_activity(cursor="not-a-cursor")
+
+
+def test_archive_old_activity():
+    """Test old rows move to the archive table in batches"""
+    _insert_logs("archive_event", [(None, f"old {i}", "2000-01-01 00:00:00") for i in range(7)])
+    _insert_logs("archive_event", [(None, "recent", "2999-01-01 00:00:00")])
+
+    assert archive_old_activity(days=30, batch_size=3) >= 7
+    assert [log["details"] for log in query_activity(action="archive_event")["logs"]] == ["recent"]
+
+    conn = sqlite3.connect(DB_FILE)
+    archived = conn.execute("SELECT COUNT(*) FROM activity_logs_archive WHERE action = 'archive_event'").fetchone()[0]
+    conn.close()
+    assert archived == 7
@@ -6,6 +6,11 @@ from app.services.auth import (
     create_access_token,
     hash_password,
     verify_password,
+    calibrate_bcrypt_rounds,
+    get_bcrypt_rounds,
+    get_hash_rounds,
+    needs_rehash,
+    benchmark_bcrypt_costs,
 )
 
 
@@ -51,3 +56,63 @@ def test_create_access_token_different_data():
     token2 = create_access_token({"sub": "456"})
 
     assert token1 != token2
+
+
+def test_hash_password_stores_cost():
+    """Test the cost factor is recorded in each hash"""
+    assert get_hash_rounds(hash_password("pw", rounds=5)) == 5
+    assert get_hash_rounds(hash_password("pw")) == get_bcrypt_rounds()
+    assert get_hash_rounds(b"not-a-bcrypt-hash") is None
+
+
+def test_needs_rehash(monkeypatch):
+    """Test only hashes with a lower cost are flagged for rehashing"""
+    import app.services.auth as auth_service
+
+    monkeypatch.setattr(auth_service, "_bcrypt_rounds", 5)
+    assert needs_rehash(hash_password("pw", rounds=5)) is False
+    assert needs_rehash(hash_password("pw", rounds=6)) is False
+    assert needs_rehash(hash_password("pw", rounds=4)) is True
+
+
+def test_calibrated_cost_is_shared(monkeypatch):
+    """Test the first calibration is stored and reused instead of re-measured"""
+    import sqlite3
+    import app.services.auth as auth_service
+    from app.config import DB_FILE
+    from app.database import init_db
+
+    init_db()
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("DELETE FROM server_settings WHERE key = 'bcrypt_rounds'")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(auth_service, "BCRYPT_ROUNDS", None)
+    monkeypatch.setattr(auth_service, "_bcrypt_rounds", None)
+
+    monkeypatch.setattr(auth_service, "time_bcrypt_hash", lambda rounds, samples=3: 30.0)
+    first = auth_service.configure_bcrypt_rounds()
+    # Another worker (or a restart) measuring a different speed still agrees
+    monkeypatch.setattr(auth_service, "time_bcrypt_hash", lambda rounds, samples=3: 5.0)
+    assert auth_service.configure_bcrypt_rounds() == first
+
+    # A new target recalibrates
+    monkeypatch.setattr(auth_service, "BCRYPT_TARGET_MS", 1000)
+    assert auth_service.configure_bcrypt_rounds() != first
+
+
+def test_calibrate_bcrypt_rounds_extrapolates(monkeypatch):
+    """Test calibration picks the highest cost under the target time"""
+    import app.services.auth as auth_service
+
+    monkeypatch.setattr(auth_service, "time_bcrypt_hash", lambda rounds, samples=3: 10.0)
+    assert calibrate_bcrypt_rounds(target_ms=85, min_rounds=8, max_rounds=14) == 11
+    assert calibrate_bcrypt_rounds(target_ms=10_000, min_rounds=8, max_rounds=14) == 14
+    assert calibrate_bcrypt_rounds(target_ms=5, min_rounds=8, max_rounds=14) == 8
+
+
+def test_benchmark_bcrypt_costs():
+    """Test benchmark reports timings per cost factor"""
+    results = benchmark_bcrypt_costs(min_rounds=4, max_rounds=5)
+    assert [r["rounds"] for r in results] == [4, 5]
+    assert all(r["hash_ms"] > 0 and r["verify_ms"] > 0 for r in results)
@@ -0,0 +1,77 @@
+"""
+Tunnel change journal unit tests
+"""
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.changes import current_version, get_changes, prune_tunnel_changes
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _execute(sql: str, params=()):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    conn.commit()
+    lastrowid = cursor.lastrowid
+    conn.close()
+    return lastrowid
+
+
+def _changes(since: int, user_id=None):
+    conn = sqlite3.connect(DB_FILE)
+    result = get_changes(conn.cursor(), since, user_id)
+    conn.close()
+    return result
+
+
+def _version() -> int:
+    conn = sqlite3.connect(DB_FILE)
+    version = current_version(conn.cursor())
+    conn.close()
+    return version
+
+
+def test_journal_collapses_to_latest_op(make_user):
+    """Test triggers journal tunnel writes and deltas keep only the last op per tunnel"""
+    user, other = make_user(), make_user()
+    start = _version()
+
+    kept = _execute("INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, 'kept', 'tcp', 22)", (user["id"],))
+    gone = _execute("INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, 'gone', 'tcp', 22)", (user["id"],))
+    _execute("UPDATE tunnels SET local_port = 2222 WHERE id = ?", (kept,))
+    _execute("UPDATE tunnels SET last_connected = CURRENT_TIMESTAMP WHERE id = ?", (kept,))
+    _execute("DELETE FROM tunnels WHERE id = ?", (gone,))
+    assert _version() == start + 4  # the last_connected write isn't journaled
+
+    changes = _changes(start, user["id"])
+    assert changes["reset"] is False
+    assert changes["upserted"] == [kept]
+    assert changes["deleted"] == [gone]
+    assert _changes(start, other["id"])["upserted"] == []
+
+    # Handing a tunnel to another user is a delete for the old owner
+    moved_from = _version()
+    _execute("UPDATE tunnels SET user_id = ? WHERE id = ?", (other["id"], kept))
+    assert _changes(moved_from, user["id"])["deleted"] == [kept]
+    assert _changes(moved_from, other["id"])["upserted"] == [kept]
+
+
+def test_pruned_or_future_versions_reset(make_user):
+    """Test a version older than the kept journal, or newer than the database, asks for a resync"""
+    user = make_user()
+    _execute("INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, 'old', 'tcp', 22)", (user["id"],))
+    before = _version()
+    _execute("INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, 'new', 'tcp', 22)", (user["id"],))
+
+    _execute("UPDATE tunnel_changes SET changed_at = '2000-01-01 00:00:00' WHERE version <= ?", (before,))
+    assert prune_tunnel_changes(hours=1) >= 1
+
+    assert _changes(before - 1)["reset"] is True
+    assert _changes(before)["reset"] is False
+    assert _changes(_version() + 10)["reset"] is True
@@ -0,0 +1,113 @@
+"""
+Stats counter unit tests
+"""
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.counters import get_counters, reconcile_counters
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+    reconcile_counters()
+
+
+def _execute(sql, params=()):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    conn.commit()
+    lastrowid = cursor.lastrowid
+    conn.close()
+    return lastrowid
+
+
+def _add_user(email, is_active=1):
+    return _execute(
+        "INSERT INTO users (email, password_hash, token, is_active) VALUES (?, 'x', ?, ?)",
+        (email, f"token-{email}", is_active)
+    )
+
+
+def _delta(before, after):
+    return {k: after[k] - before[k] for k in before if after[k] != before[k]}
+
+
+def test_user_counters_follow_writes():
+    """Test triggers keep user counters in step with inserts, updates and deletes"""
+    before = get_counters()
+    user_id = _add_user("counted@example.com")
+    _add_user("inactive@example.com", is_active=0)
+    assert _delta(before, get_counters()) == {"users_total": 2, "users_active": 1}
+
+    _execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
+    assert _delta(before, get_counters()) == {"users_total": 2}
+
+    _execute("DELETE FROM users WHERE email IN ('counted@example.com', 'inactive@example.com')")
+    assert _delta(before, get_counters()) == {}
+
+
+def test_user_counters_skip_users_pending_deletion():
+    """Test a soft-deleted user stops counting right away, and the later hard delete doesn't count twice"""
+    user_id = _add_user("pending-delete@example.com")
+    before = get_counters()
+
+    _execute("UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = ?", (user_id,))
+    assert _delta(before, get_counters()) == {"users_total": -1, "users_active": -1}
+
+    _execute("DELETE FROM users WHERE id = ?", (user_id,))
+    assert _delta(before, get_counters()) == {"users_total": -1, "users_active": -1}
+    assert reconcile_counters()["drift"] == {}
+
+
+def test_tunnel_counters_follow_writes():
+    """Test triggers keep total, active and per-type tunnel counters"""
+    user_id = _add_user("tunnel-owner@example.com")
+    before = get_counters()
+
+    tunnel_id = _execute(
+        "INSERT INTO tunnels (user_id, name, type, local_port, subdomain) VALUES (?, 'web', 'http', 3000, 'web')",
+        (user_id,)
+    )
+    _execute(
+        "INSERT INTO tunnels (user_id, name, type, local_port, remote_port) VALUES (?, 'db', 'tcp', 5432, 15432)",
+        (user_id,)
+    )
+    assert _delta(before, get_counters()) == {"tunnels_total": 2, "tunnels_http": 1, "tunnels_tcp": 1}
+
+    _execute("UPDATE tunnels SET is_active = 1, type = 'https' WHERE id = ?", (tunnel_id,))
+    assert _delta(before, get_counters()) == {
+        "tunnels_total": 2, "tunnels_active": 1, "tunnels_https": 1, "tunnels_tcp": 1
+    }
+
+    _execute("DELETE FROM tunnels WHERE user_id = ?", (user_id,))
+    assert _delta(before, get_counters()) == {}
+
+
+def test_reconcile_repairs_drift():
+    """Test the consistency checker reports and fixes drifted counters"""
+    actual = get_counters()
+    _execute("UPDATE stats_counters SET users_total = users_total + 42, tunnels_ssh = -1 WHERE id = 1")
+
+    result = reconcile_counters()
+    assert result["drift"] == {
+        "users_total": (actual["users_total"] + 42, actual["users_total"]),
+        "tunnels_ssh": (-1, actual["tunnels_ssh"]),
+    }
+    assert get_counters() == actual
+    assert reconcile_counters()["drift"] == {}
+
+
+def test_stats_endpoint_reads_counters(client, make_user):
+    """Test /api/stats serves the maintained counters"""
+    admin = make_user(is_admin=True)
+    response = client.get("/api/stats", headers=admin["headers"])
+    assert response.status_code == 200
+
+    counters = get_counters()
+    data = response.json()
+    assert data["users"] == {"total": counters["users_total"], "active": counters["users_active"]}
+    assert data["tunnels"]["total"] == counters["tunnels_total"]
+    assert set(data["tunnels"]["by_type"]) == {"http", "https", "tcp", "ssh"}
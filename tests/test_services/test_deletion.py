@@ -0,0 +1,142 @@
+"""
+Background deletion job tests
+"""
+import sqlite3
+import time
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.deletion import DeletionWorker, deletion_worker, enqueue_deletion, get_job
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _seed_owned_rows(user_id: int, tunnels: int = 3, rows_per_tunnel: int = 4):
+    """Tunnels plus metrics, health, an SSH key and activity for one user; returns tunnel ids"""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    ids = []
+    for n in range(tunnels):
+        # Active, as only active tunnels keep health rows (the checker prunes the rest)
+        cursor.execute(
+            "INSERT INTO tunnels (user_id, name, type, local_port, is_active) VALUES (?, ?, 'tcp', 22, 1)",
+            (user_id, f"del-{n}")
+        )
+        tunnel_id = cursor.lastrowid
+        ids.append(tunnel_id)
+        cursor.execute("INSERT INTO tunnel_health (tunnel_id, status) VALUES (?, 'up')", (tunnel_id,))
+        for _ in range(rows_per_tunnel):
+            cursor.execute("INSERT INTO tunnel_metrics (tunnel_id, tunnel_name) VALUES (?, 'x')", (tunnel_id,))
+            cursor.execute("INSERT INTO request_metrics (tunnel_id, tunnel_name) VALUES (?, 'x')", (tunnel_id,))
+    cursor.execute(
+        "INSERT INTO ssh_keys (user_id, name, public_key, fingerprint) VALUES (?, 'k', 'ssh-ed25519 AAAA', 'fp')",
+        (user_id,)
+    )
+    cursor.execute("INSERT INTO activity_logs (user_id, action) VALUES (?, 'login')", (user_id,))
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def _remaining(user_id: int, tunnel_ids):
+    conn = sqlite3.connect(DB_FILE)
+    marks = ",".join("?" * len(tunnel_ids))
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE tunnel_id IN ({marks})", tunnel_ids).fetchone()[0]
+        for table in ("tunnel_health", "tunnel_metrics", "request_metrics")
+    }
+    for table in ("tunnels", "ssh_keys", "activity_logs"):
+        counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (user_id,)).fetchone()[0]
+    counts["users"] = conn.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    conn.close()
+    return counts
+
+
+def _wait_for_job(client, job_id: int, headers) -> dict:
+    for _ in range(100):
+        job = client.get(f"/api/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_user_deletion_hides_user_at_once(client, make_user):
+    """Test a deleted user is hidden immediately and cleaned up by the app's worker"""
+    admin, user = make_user(is_admin=True), make_user()
+    tunnel_ids = _seed_owned_rows(user["id"])
+
+    response = client.delete(f"/api/users/{user['id']}", headers=admin["headers"])
+    assert response.status_code == 200
+    listed = client.get(f"/api/users?email={user['email']}", headers=admin["headers"]).json()["users"]
+    assert listed == []
+    assert client.delete(f"/api/users/{user['id']}", headers=admin["headers"]).status_code == 400
+
+    job = _wait_for_job(client, response.json()["job_id"], admin["headers"])
+    assert job["status"] == "done"
+    assert all(count == 0 for count in _remaining(user["id"], tunnel_ids).values())
+
+
+def test_deleted_user_email_is_free_at_once(client, make_user, monkeypatch):
+    """Test the email of a user pending deletion can be given to a new user before the job runs"""
+    monkeypatch.setattr(deletion_worker, "_next_job_id", lambda: None)  # keep the job pending
+    admin, user = make_user(is_admin=True), make_user()
+
+    assert client.delete(f"/api/users/{user['id']}", headers=admin["headers"]).status_code == 200
+    response = client.post(
+        "/api/users",
+        json={"email": user["email"], "password": "another-password", "max_tunnels": 5},
+        headers=admin["headers"]
+    )
+    assert response.status_code == 200
+
+    conn = sqlite3.connect(DB_FILE)
+    email = conn.execute("SELECT email FROM users WHERE id = ?", (user["id"],)).fetchone()[0]
+    conn.close()
+    assert email == f"deleted-{user['id']}@deleted.invalid"
+
+
+def test_user_deletion_runs_in_batches(make_user):
+    """Test a user job walks every step in small batches and records progress"""
+    user = make_user()
+    tunnel_ids = _seed_owned_rows(user["id"])
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("UPDATE users SET deleted_at = CURRENT_TIMESTAMP, is_active = 0 WHERE id = ?", (user["id"],))
+    job_id = enqueue_deletion(conn.cursor(), "user", target_id=user["id"])
+    conn.commit()
+    conn.close()
+
+    worker = DeletionWorker(batch_size=2)
+    batches = 1
+    while worker.run_batch(job_id):
+        batches += 1
+        if batches == 3:
+            assert get_job(job_id)["status"] == "running"
+
+    job = get_job(job_id)
+    assert job["status"] == "done" and job["step"] is None
+    assert job["tunnel_count"] == 3
+    assert job["progress"]["request_metrics"] == 12
+    assert job["rows_deleted"] == sum(job["progress"].values())
+    assert batches >= 12  # 6 request_metrics batches alone at 2 rows each
+    assert all(count == 0 for count in _remaining(user["id"], tunnel_ids).values())
+
+
+def test_tunnel_deletion_job_endpoint(client, make_user):
+    """Test deleting a tunnel queues cleanup of its metrics, visible through /api/jobs"""
+    user, other = make_user(), make_user()
+    tunnel_ids = _seed_owned_rows(user["id"], tunnels=1)
+
+    response = client.delete(f"/api/tunnels/{tunnel_ids[0]}", headers=user["headers"])
+    job_id = response.json()["job_id"]
+    job = _wait_for_job(client, job_id, user["headers"])
+    assert job["status"] == "done"
+    assert job["progress"] == {"tunnel_health": 1, "tunnel_metrics": 4, "request_metrics": 4}
+    remaining = _remaining(user["id"], tunnel_ids)
+    assert remaining["request_metrics"] == 0 and remaining["ssh_keys"] == 1
+
+    assert client.get(f"/api/jobs/{job_id}", headers=other["headers"]).status_code == 403
+    assert client.get("/api/jobs", headers=user["headers"]).status_code == 403
@@ -0,0 +1,162 @@
+"""
+Netlify DNS reconciler tests against a local fake Netlify API (see conftest)
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import dns
+from app.services.dns import DnsReconciler, DnsSetup, create_session, get_public_ip, load_last_ip, save_last_ip
+
+
+def _reconciler(**kwargs):
+    kwargs.setdefault("session", create_session(backoff_factor=0))
+    kwargs.setdefault("rate", 0)
+    return DnsReconciler(token="test-token", zone_id=None, domain="tunnel.example.com", **kwargs)
+
+
+def test_apply_writes_only_the_diff(netlify):
+    netlify.add("tunnel.example.com", "1.2.3.4")
+    netlify.add("*.tunnel.example.com", "9.9.9.9")
+    netlify.add("*.tunnel.example.com", "9.9.9.9")  # duplicate
+    netlify.add("other.example.com", "5.5.5.5")
+    reconciler = _reconciler()
+
+    desired = {("tunnel.example.com", "A"): "1.2.3.4", ("*.tunnel.example.com", "A"): "1.2.3.4"}
+    summary = reconciler.apply(desired)
+
+    assert summary == {"created": 1, "deleted": 2, "unchanged": 1, "failed": [], "ok": True}
+    assert netlify.count("GET") == 2  # zone lookup + one zone fetch
+    values = sorted((r["hostname"], r["value"]) for r in netlify.records.values())
+    assert values == [
+        ("*.tunnel.example.com", "1.2.3.4"),
+        ("other.example.com", "5.5.5.5"),
+        ("tunnel.example.com", "1.2.3.4"),
+    ]
+
+    # The cache was updated in place, so a second run is a no-op with no requests
+    before = len(netlify.requests)
+    assert reconciler.apply(desired) == {"created": 0, "deleted": 0, "unchanged": 2, "failed": [], "ok": True}
+    assert len(netlify.requests) == before
+
+
+def test_cache_refreshes_after_ttl(netlify):
+    reconciler = _reconciler(cache_ttl=0)
+    reconciler.records()
+    netlify.add("tunnel.example.com", "1.2.3.4")
+    assert reconciler.records()[("tunnel.example.com", "A")][0]["value"] == "1.2.3.4"
+
+    cached = _reconciler(cache_ttl=300)
+    cached.records()
+    netlify.add("new.example.com", "1.2.3.4")
+    assert ("new.example.com", "A") not in cached.records()
+    assert ("new.example.com", "A") in cached.records(refresh=True)
+
+
+def test_transient_errors_are_retried(netlify):
+    reconciler = _reconciler()
+    reconciler.zone_id()
+    netlify.fail_next = 2
+    assert reconciler.apply({("tunnel.example.com", "A"): "1.2.3.4"})["created"] == 1
+    assert netlify.count("GET") == 4  # zone lookup, two 503s, then the zone fetch
+
+
+def test_failed_create_invalidates_cache(netlify):
+    reconciler = _reconciler()
+    reconciler.records()
+    netlify.fail_next = 1  # POST is not retried on a 503
+    summary = reconciler.apply({("tunnel.example.com", "A"): "1.2.3.4"})
+    assert summary["ok"] is False
+    assert summary["failed"] == [("tunnel.example.com", "A")]
+    assert reconciler._records is None
+
+
+@pytest.fixture
+def ip_providers():
+    """Two public-IP providers: /slow answers after 3 seconds, /fast at once"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/slow":
+                time.sleep(3)
+            body = b"198.51.100.1" if self.path == "/slow" else b"203.0.113.7\n"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    yield f"{base}/slow", f"{base}/fast"
+    server.shutdown()
+    server.server_close()
+
+
+def test_public_ip_takes_first_answer(ip_providers):
+    slow, fast = ip_providers
+    start = time.monotonic()
+    assert get_public_ip([slow, fast]) == "203.0.113.7"
+    assert time.monotonic() - start < 2
+
+
+def test_setup_reuses_saved_ip_then_follows_detected(netlify, tmp_path, monkeypatch):
+    ip_file = str(tmp_path / "public_ip")
+    save_last_ip("1.2.3.4", ip_file)
+    netlify.add("tunnel.example.com", "1.2.3.4")
+    netlify.add("*.tunnel.example.com", "1.2.3.4")
+    setup = DnsSetup(_reconciler(), ip_file=ip_file)
+    assert setup.state()["status"] == "pending"
+
+    monkeypatch.setattr(dns, "get_public_ip", lambda: "1.2.3.4")
+    assert setup.run_once() is True
+    state = setup.state()
+    assert (state["status"], state["ip"], state["ip_source"]) == ("ready", "1.2.3.4", "saved")
+    assert netlify.count("POST") == 0 and netlify.count("DELETE") == 0
+
+    monkeypatch.setattr(dns, "get_public_ip", lambda: "5.6.7.8")
+    assert setup.run_once() is True
+    assert setup.state()["ip_source"] == "detected"
+    assert load_last_ip(ip_file) == "5.6.7.8"
+    assert {r["value"] for r in netlify.records.values()} == {"5.6.7.8"}
+
+
+def test_setup_without_ip_fails(netlify, tmp_path, monkeypatch):
+    monkeypatch.setattr(dns, "get_public_ip", lambda: None)
+    setup = DnsSetup(_reconciler(), ip_file=str(tmp_path / "public_ip"))
+    assert setup.run_once() is False
+    assert setup.state()["status"] == "failed"
+    assert not setup.ready
+
+
+def test_setup_state_is_shared_between_workers(netlify, tmp_path, monkeypatch):
+    from app.database import init_db
+    init_db()
+    monkeypatch.setattr(dns, "get_public_ip", lambda: "1.2.3.4")
+    key = f"dns_setup_test_{tmp_path.name}"
+    leader = DnsSetup(_reconciler(), ip_file=str(tmp_path / "public_ip"), settings_key=key)
+    follower = DnsSetup(_reconciler(), ip_file=str(tmp_path / "public_ip"), settings_key=key)
+    assert follower.state()["status"] == "pending"
+
+    assert leader.run_once() is True
+    assert follower.ready
+    assert follower.state()["ip"] == "1.2.3.4"
+
+
+def test_health_reports_dns_readiness(client, make_user):
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert set(response.json()) == {"status", "ready"}
+
+    # DNS and worker details are for admins only
+    assert client.get("/api/health/details", headers=make_user()["headers"]).status_code == 403
+    response = client.get("/api/health/details", headers=make_user(is_admin=True)["headers"])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    assert data["dns"]["status"] in ("pending", "running", "disabled")
+    assert data["leader"]["worker"]
@@ -0,0 +1,112 @@
+"""
+frps config parser unit tests
+"""
+import os
+import pytest
+from app.services.frps_config import FrpsConfigCache, parse_frps_config, parse_port_ranges
+
+
+TOML_CONFIG = """
+bindPort = 7001
+vhostHTTPPort = 8080
+vhostHTTPSPort = 8443
+subDomainHost = "tunnel.example.com"
+allowPorts = [
+  { start = 10000, end = 10100 },
+  { single = 2222 },
+]
+
+[auth]
+token = "secret"
+"""
+
+INI_CONFIG = """
+[common]
+bind_port = 7002
+vhost_http_port = 80
+subdomain_host = legacy.example.com
+allow_ports = 2000-3000,3001, 3003
+"""
+
+
+def test_parse_toml():
+    """Test frps.toml settings are normalized"""
+    settings = parse_frps_config(TOML_CONFIG, "/etc/frp/frps.toml")
+    assert settings == {
+        "subdomain_host": "tunnel.example.com",
+        "bind_port": 7001,
+        "vhost_http_port": 8080,
+        "vhost_https_port": 8443,
+        "allow_ports": [(10000, 10100), (2222, 2222)],
+    }
+
+
+def test_parse_ini():
+    """Test legacy frps.ini settings are normalized with defaults filled in"""
+    settings = parse_frps_config(INI_CONFIG, "/etc/frp/frps.ini")
+    assert settings == {
+        "subdomain_host": "legacy.example.com",
+        "bind_port": 7002,
+        "vhost_http_port": 80,
+        "vhost_https_port": None,
+        "allow_ports": [(2000, 3000), (3001, 3001), (3003, 3003)],
+    }
+
+
+def test_parse_detects_format_without_extension():
+    """Test unknown extensions try TOML then INI"""
+    assert parse_frps_config(TOML_CONFIG, "frps.conf")["bind_port"] == 7001
+    assert parse_frps_config(INI_CONFIG, "frps.conf")["bind_port"] == 7002
+
+
+def test_parse_port_ranges_empty():
+    assert parse_port_ranges("") == []
+
+
+def test_cache_reloads_only_on_change(tmp_path, monkeypatch):
+    """Test the cache re-parses only when the file's stat signature changes"""
+    import app.services.frps_config as frps_config
+
+    path = tmp_path / "frps.toml"
+    path.write_text(TOML_CONFIG)
+    cache = FrpsConfigCache(str(path), check_interval=0)
+
+    parses = []
+    real_parse = frps_config.parse_frps_config
+    monkeypatch.setattr(frps_config, "parse_frps_config", lambda *a: parses.append(1) or real_parse(*a))
+
+    assert cache.get()["subdomain_host"] == "tunnel.example.com"
+    cache.get()
+    cache.get()
+    assert len(parses) == 1
+
+    path.write_text(TOML_CONFIG.replace("tunnel.example.com", "changed.example.com"))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get()["subdomain_host"] == "changed.example.com"
+    assert len(parses) == 2
+
+
+def test_cache_throttles_stat_calls(tmp_path, monkeypatch):
+    """Test no file I/O happens within the check interval"""
+    import app.services.frps_config as frps_config
+
+    path = tmp_path / "frps.toml"
+    path.write_text(TOML_CONFIG)
+    cache = FrpsConfigCache(str(path), check_interval=3600)
+    cache.get()
+
+    def fail_stat(*args, **kwargs):
+        raise AssertionError("stat() called within check interval")
+
+    monkeypatch.setattr(frps_config.os, "stat", fail_stat)
+    for _ in range(100):
+        assert cache.get()["bind_port"] == 7001
+
+
+def test_cache_missing_file_uses_defaults(tmp_path):
+    """Test a missing config yields frps defaults"""
+    cache = FrpsConfigCache(str(tmp_path / "missing.toml"), check_interval=0)
+    settings = cache.get()
+    assert settings["subdomain_host"] is None
+    assert settings["bind_port"] == 7000
@@ -0,0 +1,188 @@
+"""
+Tunnel health checker unit tests
+"""
+import asyncio
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+import app.services.health as health
+from app.services.health import HealthChecker, probe_http
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _insert_tunnels(user_id: int, count: int, tunnel_type: str = "tcp", first_port: int = 41000):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    ids = []
+    for i in range(count):
+        cursor.execute("""
+            INSERT INTO tunnels (user_id, name, type, local_port, remote_port, is_active)
+            VALUES (?, ?, ?, 22, ?, 1)
+        """, (user_id, f"health-{tunnel_type}-{i}", tunnel_type, first_port + i))
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def test_next_delay_backs_off_and_caps():
+    """Test failing tunnels back off exponentially up to the cap, with jitter"""
+    checker = HealthChecker(interval=10, max_backoff=100, jitter=0.1)
+    for _ in range(50):
+        assert 9 <= checker.next_delay(0) <= 11
+        assert 36 <= checker.next_delay(2) <= 44
+        assert 90 <= checker.next_delay(8) <= 110
+
+
+def test_probe_http_reads_status():
+    """Test the HEAD probe reports the server's status code"""
+    async def scenario():
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            result = await probe_http(f"http://127.0.0.1:{port}", timeout=2)
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["status_code"] == 502
+    assert result["error"] is None
+    assert health._is_http_up(502) is False
+    assert health._is_http_up(200) is True
+
+
+def test_checker_limits_concurrency_and_persists(make_user, monkeypatch):
+    """Test checks respect the global limit, track failures and land in tunnel_health"""
+    user = make_user()
+    ids = _insert_tunnels(user["id"], 30)
+    in_flight = 0
+    peak = 0
+
+    async def fake_check(tunnel, domain, timeout):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"status": "down", "status_code": None, "latency_ms": None, "error": "refused"}
+
+    monkeypatch.setattr(health, "check_tunnel", fake_check)
+    checker = HealthChecker(interval=0.01, concurrency=4, max_backoff=0.02)
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(checker.concurrency)
+        for _ in range(2):
+            checker.refresh_targets(health.time.monotonic())
+            await asyncio.sleep(0.05)
+            await asyncio.gather(*await checker.run_due(semaphore))
+
+    asyncio.run(scenario())
+    assert peak == 4
+    assert checker.flush_writes() >= len(ids)
+    for tunnel_id in ids:
+        assert checker.get_status(tunnel_id)["consecutive_failures"] == 2
+
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute(
+        f"SELECT status, consecutive_failures FROM tunnel_health WHERE tunnel_id IN ({','.join('?' * len(ids))})",
+        ids
+    ).fetchall()
+    conn.execute(f"DELETE FROM tunnels WHERE id IN ({','.join('?' * len(ids))})", ids)
+    conn.commit()
+    conn.close()
+    assert rows == [("down", 2)] * len(ids)
+
+    # Removed tunnels are pruned from the map and the table
+    checker.refresh_targets(health.time.monotonic())
+    assert all(checker.get_status(tunnel_id) is None for tunnel_id in ids)
+
+
+def test_run_loop_keeps_shared_state_off_threads(make_user, monkeypatch):
+    """Test only database work is handed to threads; the heap and maps change on the loop"""
+    user = make_user()
+    ids = _insert_tunnels(user["id"], 3)
+    checker = HealthChecker(interval=0.05)
+    threaded = []
+    real_to_thread = asyncio.to_thread
+
+    async def recording_to_thread(func, *args, **kwargs):
+        if getattr(func, "__self__", None) is checker:
+            threaded.append(func.__name__)
+        return await real_to_thread(func, *args, **kwargs)
+
+    async def fake_check(tunnel, domain, timeout):
+        return {"status": "up", "status_code": None, "latency_ms": 1.0, "error": None}
+
+    monkeypatch.setattr(health.asyncio, "to_thread", recording_to_thread)
+    monkeypatch.setattr(health, "check_tunnel", fake_check)
+
+    async def scenario():
+        task = asyncio.create_task(checker.run())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute(f"DELETE FROM tunnels WHERE id IN ({','.join('?' * len(ids))})", ids)
+    conn.commit()
+    conn.close()
+
+    assert "load_targets" in threaded
+    assert set(threaded) <= {"read_persisted", "load_targets", "write_records"}
+    assert all(checker.get_status(tunnel_id)["status"] == "up" for tunnel_id in ids)
+
+
+def test_list_tunnels_includes_health(client, make_user, monkeypatch):
+    """Test list_tunnels merges the in-memory health status"""
+    user = make_user()
+    tunnel_id = _insert_tunnels(user["id"], 1, "ssh")[0]
+    status = {"status": "up", "status_code": None, "latency_ms": 1.5, "error": None,
+              "consecutive_failures": 0, "checked_at": "2024-01-01 00:00:00"}
+    # Patched lookup: the leader's checker may reload or prune its map meanwhile
+    monkeypatch.setattr(health.health_checker, "get_status", {tunnel_id: status}.get)
+
+    response = client.get("/api/tunnels", headers=user["headers"])
+    assert response.status_code == 200
+    assert response.json()["tunnels"][0]["health"] == status
+
+
+def test_follower_reads_leader_statuses(make_user, monkeypatch):
+    """Test a worker that isn't running checks serves the statuses the leader persisted"""
+    user = make_user()
+    ids = _insert_tunnels(user["id"], 2, first_port=42000)
+    leader, follower = HealthChecker(), HealthChecker()
+    leader.apply_targets(leader.load_targets(), health.time.monotonic())
+    for tunnel_id in ids:
+        leader._pending_writes[tunnel_id] = {
+            "status": "up", "status_code": None, "latency_ms": 2.0, "error": None,
+            "consecutive_failures": 0, "checked_at": "2024-01-01 00:00:00",
+        }
+    leader.flush_writes()
+    monkeypatch.setattr(health, "FLUSH_INTERVAL", 0.01)
+
+    async def scenario():
+        task = asyncio.create_task(follower.follow())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute(f"DELETE FROM tunnels WHERE id IN ({','.join('?' * len(ids))})", ids)
+    conn.commit()
+    conn.close()
+
+    assert all(follower.get_status(tunnel_id)["latency_ms"] == 2.0 for tunnel_id in ids)
@@ -0,0 +1,172 @@
+"""
+Tunnel heartbeat store unit tests
+"""
+import sqlite3
+import time
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.heartbeat import HeartbeatStore
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _insert_tunnels(user_id: int, count: int):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    ids = []
+    for n in range(count):
+        cursor.execute(
+            "INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, ?, 'tcp', 22)",
+            (user_id, f"hb-{n}")
+        )
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def _tunnel_state(tunnel_id: int):
+    conn = sqlite3.connect(DB_FILE)
+    row = conn.execute("SELECT is_active, last_connected FROM tunnels WHERE id = ?", (tunnel_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def test_record_writes_only_changes(make_user):
+    """Test repeated heartbeats with the same state don't touch the database"""
+    user, other = make_user(), make_user()
+    ids = _insert_tunnels(user["id"], 3)
+    store = HeartbeatStore()
+
+    first = store.record(user["id"], [(tunnel_id, True) for tunnel_id in ids])
+    assert first["changed"] == 3
+    assert first["accepted"] == ids
+    assert all(_tunnel_state(tunnel_id)[0] == 1 for tunnel_id in ids)
+
+    assert store.record(user["id"], [(tunnel_id, True) for tunnel_id in ids])["changed"] == 0
+
+    flipped = store.record(user["id"], [(ids[0], False), (ids[1], True)])
+    assert flipped["changed"] == 1
+    assert _tunnel_state(ids[0])[0] == 0
+
+    rejected = store.record(other["id"], [(ids[2], False), (999999, True)])
+    assert [r["id"] for r in rejected["rejected"]] == [ids[2], 999999]
+    assert _tunnel_state(ids[2])[0] == 1
+
+
+def test_sweep_marks_silent_tunnels_inactive(make_user):
+    """Test tunnels that stop reporting go inactive after the timeout"""
+    user = make_user()
+    quiet, chatty = _insert_tunnels(user["id"], 2)
+    store = HeartbeatStore(timeout=0.05)
+    store.record(user["id"], [(quiet, True), (chatty, True)])
+
+    time.sleep(0.08)
+    store.record(user["id"], [(chatty, True)])
+
+    assert store.sweep() >= 1  # also expires active tunnels left by other tests
+    assert _tunnel_state(quiet)[0] == 0
+    assert _tunnel_state(chatty)[0] == 1
+    assert store.sweep() == 0
+
+
+def test_sweep_uses_shared_heartbeat_times(make_user):
+    """Test a leader's sweep sees reports other workers received, and a swept tunnel revives"""
+    user = make_user()
+    tunnel_id = _insert_tunnels(user["id"], 1)[0]
+    worker, leader = HeartbeatStore(timeout=0.2), HeartbeatStore(timeout=0.2)
+
+    worker.record(user["id"], [(tunnel_id, True)])
+    time.sleep(0.12)
+    worker.record(user["id"], [(tunnel_id, True)])  # refreshed: half the timeout has passed
+    time.sleep(0.12)
+    leader.sweep()
+    assert _tunnel_state(tunnel_id)[0] == 1
+
+    # Silent past the timeout: expired, though the worker still remembers it as active
+    time.sleep(0.25)
+    leader.sweep()
+    assert _tunnel_state(tunnel_id)[0] == 0
+    worker.record(user["id"], [(tunnel_id, True)])
+    assert _tunnel_state(tunnel_id)[0] == 1
+
+    # Heartbeats from before the sweep started count as received when it started
+    time.sleep(0.25)
+    assert leader.sweep(since=time.time()) == 0
+    assert _tunnel_state(tunnel_id)[0] == 1
+
+
+def test_older_report_does_not_override_newer(make_user):
+    """Test a worker flushing a stale "active" doesn't undo a later "inactive" from another worker"""
+    user = make_user()
+    tunnel_id = _insert_tunnels(user["id"], 1)[0]
+    first, second = HeartbeatStore(), HeartbeatStore()
+
+    first.record(user["id"], [(tunnel_id, True)])
+    time.sleep(1.1)
+    first.record(user["id"], [(tunnel_id, True)])  # pending in the first worker
+    second.record(user["id"], [(tunnel_id, False)])
+    assert first.flush_last_seen() == 1
+    assert _tunnel_state(tunnel_id)[0] == 0
+
+
+def test_flush_last_seen(make_user):
+    """Test the periodic flush writes last_connected once per new heartbeat"""
+    user = make_user()
+    tunnel_id = _insert_tunnels(user["id"], 1)[0]
+    store = HeartbeatStore()
+    store.record(user["id"], [(tunnel_id, True)])
+    assert store.flush_last_seen() == 0  # the state change already wrote it
+
+    time.sleep(1.1)  # last_connected has one-second resolution
+    store.record(user["id"], [(tunnel_id, True)])
+    assert store.flush_last_seen() == 1
+    assert _tunnel_state(tunnel_id)[1] == store.get(tunnel_id)["seen_at"]
+    assert store.flush_last_seen() == 0
+
+
+def test_heartbeat_endpoint(client, make_user):
+    """Test the endpoint accepts a client's whole tunnel set in one call"""
+    user = make_user()
+    ids = _insert_tunnels(user["id"], 2)
+
+    response = client.post(
+        "/api/tunnels/heartbeat",
+        json={"tunnels": [{"id": ids[0]}, {"id": ids[1], "is_active": False}]},
+        headers=user["headers"]
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["accepted"] == ids
+    assert body["rejected"] == []
+    assert body["heartbeat_interval"] > 0
+    assert _tunnel_state(ids[0])[0] == 1
+    assert _tunnel_state(ids[1])[0] == 0
+
+
+def test_changes_from_other_workers_reach_the_owner_cache(make_user):
+    """Test a tunnel deleted or reassigned through another worker stops being accepted"""
+    user, other = make_user(), make_user()
+    moved, deleted = _insert_tunnels(user["id"], 2)
+    store = HeartbeatStore()
+    assert store.record(user["id"], [(moved, True), (deleted, True)])["accepted"] == [moved, deleted]
+
+    # Another worker's writes; this store only learns of them from the journal
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("UPDATE tunnels SET user_id = ? WHERE id = ?", (other["id"], moved))
+    conn.execute("DELETE FROM tunnels WHERE id = ?", (deleted,))
+    conn.commit()
+    conn.close()
+
+    assert store.refresh() >= 2
+    result = store.record(user["id"], [(moved, True), (deleted, True)])
+    assert result["accepted"] == []
+    assert [r["error"] for r in result["rejected"]] == [
+        "You don't have permission to update this tunnel", "Tunnel not found"
+    ]
+    assert store.get(moved) is None
+    assert store.record(other["id"], [(moved, False)])["accepted"] == [moved]
@@ -0,0 +1,94 @@
+"""
+Leader lease election tests
+"""
+import asyncio
+
+import pytest
+
+from app.database import init_db
+from app.services.leader import LeaderElector
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _electors(clock, name="test-lease"):
+    return (
+        LeaderElector(name=name, lease_seconds=9, holder="worker-a", clock=clock),
+        LeaderElector(name=name, lease_seconds=9, holder="worker-b", clock=clock),
+    )
+
+
+def test_only_one_worker_holds_the_lease():
+    clock = FakeClock()
+    a, b = _electors(clock)
+    assert a.try_acquire() is True
+    assert b.try_acquire() is False
+    assert a.is_leader and not b.is_leader
+    assert b.state()["leader"] == "worker-a"
+
+    # Renewals keep it; a released lease goes to the next worker at once
+    clock.now += 3
+    assert a.try_acquire() is True
+    assert b.try_acquire() is False
+    a.release()
+    assert b.try_acquire() is True
+    a.release()  # releasing someone else's lease is a no-op
+    assert b.state()["leader"] == "worker-b"
+    b.release()
+
+
+def test_dead_leader_is_replaced_after_expiry():
+    clock = FakeClock()
+    a, b = _electors(clock, name="test-expiry")
+    assert a.try_acquire() is True
+
+    # a stops renewing: it stands down before the lease expires...
+    clock.now += 6
+    assert not a.is_leader
+    assert b.try_acquire() is False
+
+    # ...and b takes over once it has
+    clock.now += 3
+    assert b.try_acquire() is True
+    assert a.try_acquire() is False
+    b.release()
+
+
+def test_run_starts_jobs_only_in_the_leader():
+    started = []
+
+    async def job():
+        started.append(True)
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        a = LeaderElector(name="test-run", lease_seconds=0.3, holder="worker-a")
+        b = LeaderElector(name="test-run", lease_seconds=0.3, holder="worker-b")
+        task_a = asyncio.create_task(a.run({"job": job}))
+        await asyncio.sleep(0.05)
+        task_b = asyncio.create_task(b.run({"job": job}))
+        await asyncio.sleep(0.3)
+        assert started == [True]
+        assert a.is_leader and not b.is_leader
+
+        # The leader shuts down and releases; the other worker takes over
+        task_a.cancel()
+        await asyncio.gather(task_a, return_exceptions=True)
+        await asyncio.sleep(0.3)
+        assert b.is_leader
+        assert started == [True, True]
+        task_b.cancel()
+        await asyncio.gather(task_b, return_exceptions=True)
+
+    asyncio.run(scenario())
@@ -0,0 +1,192 @@
+"""
+Remote port allocator unit tests
+"""
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+import app.routes.tunnels as tunnel_routes
+import app.services.ports as ports
+from app.services.ports import PortAllocator, claim_port
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    """Swap in a three-port pool for the routes and claim_port"""
+    allocator = PortAllocator([(45100, 45102)])
+    monkeypatch.setattr(ports, "port_allocator", allocator)
+    monkeypatch.setattr(tunnel_routes, "port_allocator", allocator)
+    return allocator
+
+
+def _insert_tunnel(user_id: int, name: str, remote_port: int):
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute(
+        "INSERT INTO tunnels (user_id, name, type, local_port, remote_port) VALUES (?, ?, 'tcp', 22, ?)",
+        (user_id, name, remote_port)
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_allocator_skips_used_ports(make_user):
+    """Test the pool is rebuilt without ports already in the tunnels table"""
+    user = make_user()
+    _insert_tunnel(user["id"], "existing", 45001)
+    allocator = PortAllocator([(45000, 45003)])
+
+    assert allocator.rebuild() == 3
+    assert {allocator.allocate() for _ in range(3)} == {45000, 45002, 45003}
+    assert allocator.allocate() is None
+
+    allocator.release(45002)
+    allocator.release(50000)  # outside the range, ignored
+    assert allocator.stats() == {"ranges": [(45000, 45003)], "capacity": 4, "free": 1}
+    assert allocator.reserve(45002) is True
+    assert allocator.reserve(45002) is False
+
+
+def test_claim_port_retries_on_concurrent_claim(make_user, small_pool, monkeypatch):
+    """Test a port committed by another process is skipped, not reused"""
+    user = make_user()
+    small_pool.rebuild()
+    _insert_tunnel(user["id"], "other-worker", 45100)  # pool still thinks 45100 is free
+
+    monkeypatch.setattr(ports.random, "randrange", lambda n: 0)  # hand out the stale 45100 first
+
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    def insert(port):
+        cursor.execute(
+            "INSERT INTO tunnels (user_id, name, type, local_port, remote_port) VALUES (?, 'mine', 'tcp', 22, ?)",
+            (user["id"], port)
+        )
+
+    cursor.execute("BEGIN IMMEDIATE")
+    assert claim_port(cursor, insert) in (45101, 45102)
+    conn.commit()
+    conn.close()
+    assert small_pool.stats()["free"] == 1
+
+
+def test_claim_port_finds_ports_freed_elsewhere(make_user, monkeypatch):
+    """Test an empty pool is resynced from the tunnels table instead of failing"""
+    allocator = PortAllocator([(45110, 45112)])
+    monkeypatch.setattr(ports, "port_allocator", allocator)
+    user = make_user()
+    for port in (45110, 45111, 45112):
+        _insert_tunnel(user["id"], f"t{port}", port)
+    allocator.rebuild()
+    assert allocator.stats()["free"] == 0
+
+    # Another worker deletes a tunnel; this worker's pool never hears of it
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("DELETE FROM tunnels WHERE remote_port = 45111")
+    conn.commit()
+    cursor = conn.cursor()
+
+    def insert(port):
+        cursor.execute(
+            "INSERT INTO tunnels (user_id, name, type, local_port, remote_port) VALUES (?, 'mine', 'tcp', 22, ?)",
+            (user["id"], port)
+        )
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        assert claim_port(cursor, insert) == 45111
+        with pytest.raises(ValueError):
+            claim_port(cursor, insert)  # the port just written in this transaction counts as used
+        conn.commit()
+        assert allocator.stats()["free"] == 0
+    finally:
+        conn.rollback()
+        conn.execute("DELETE FROM tunnels WHERE remote_port BETWEEN 45110 AND 45112")
+        conn.commit()
+        conn.close()
+
+
+def test_create_tunnel_auto_allocates_port(client, make_user, small_pool):
+    """Test tcp/ssh tunnels without remote_port get one, and conflicts are rejected"""
+    small_pool.rebuild()
+    user = make_user()
+
+    response = client.post(
+        "/api/tunnels",
+        json={"name": "db", "type": "tcp", "local_port": 5432},
+        headers=user["headers"]
+    )
+    assert response.status_code == 200
+    port = response.json()["remote_port"]
+    assert 45100 <= port <= 45102
+    assert f"remote_port = {port}" in response.json()["frpc_config"]
+
+    taken = client.post(
+        "/api/tunnels",
+        json={"name": "db2", "type": "tcp", "local_port": 5432, "remote_port": port},
+        headers=user["headers"]
+    )
+    assert taken.status_code == 409
+
+    outside = client.post(
+        "/api/tunnels",
+        json={"name": "db3", "type": "tcp", "local_port": 5432, "remote_port": 45200},
+        headers=user["headers"]
+    )
+    assert outside.status_code == 400
+
+    # Deleting the tunnel returns its port to the pool
+    free_before = small_pool.stats()["free"]
+    assert client.delete(f"/api/tunnels/{response.json()['id']}", headers=user["headers"]).status_code == 200
+    assert small_pool.stats()["free"] == free_before + 1
+
+
+def test_server_ports_are_never_handed_out(client, make_user, monkeypatch):
+    """Test the frps bind port is rejected on create, on update and by claim_port itself"""
+    bind_port = ports.get_frps_settings()["bind_port"]
+    allocator = PortAllocator([(bind_port - 1, bind_port + 1)])
+    monkeypatch.setattr(ports, "port_allocator", allocator)
+    monkeypatch.setattr(tunnel_routes, "port_allocator", allocator)
+    user = make_user()
+
+    response = client.post(
+        "/api/tunnels",
+        json={"name": "frps", "type": "tcp", "local_port": 22, "remote_port": bind_port},
+        headers=user["headers"]
+    )
+    assert response.status_code == 400
+    assert "tunnel server itself" in response.json()["detail"]
+
+    created = client.post(
+        "/api/tunnels",
+        json={"name": "near-frps", "type": "tcp", "local_port": 22, "remote_port": bind_port + 1},
+        headers=user["headers"]
+    ).json()
+    try:
+        moved = client.put(
+            f"/api/tunnels/{created['id']}", json={"remote_port": bind_port}, headers=user["headers"]
+        )
+        assert moved.status_code == 400
+
+        # No tunnel holds the port, but the pool refuses it, so claim_port does too
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+
+        def insert(port):
+            cursor.execute(
+                "INSERT INTO tunnels (user_id, name, type, local_port, remote_port) VALUES (?, 'raw', 'tcp', 22, ?)",
+                (user["id"], port)
+            )
+
+        cursor.execute("BEGIN IMMEDIATE")
+        with pytest.raises(ValueError):
+            claim_port(cursor, insert, bind_port)
+        conn.rollback()
+        conn.close()
+    finally:
+        client.delete(f"/api/tunnels/{created['id']}", headers=user["headers"])
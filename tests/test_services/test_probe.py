@@ -0,0 +1,139 @@
+"""
+Reachability probe unit tests
+"""
+import asyncio
+import socket
+import time
+import pytest
+from app.services.probe import ProbeCache, probe_cached, probe_cache, probe_many, probe_tcp
+
+
+@pytest.fixture(autouse=True)
+def clear_probe_cache():
+    probe_cache.clear()
+    yield
+    probe_cache.clear()
+
+
+async def _serve(banner: bytes = b"", delay: float = 0.0):
+    """Start a local server that optionally waits, then sends a banner"""
+    state = {"active": 0, "max_active": 0, "connections": 0}
+
+    async def handle(reader, writer):
+        state["connections"] += 1
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            if banner:
+                writer.write(banner)
+                await writer.drain()
+            await asyncio.sleep(0.05)
+        finally:
+            state["active"] -= 1
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], state
+
+
+def _closed_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_probe_reads_ssh_banner():
+    """Test an SSH server is detected from its banner"""
+    async def run():
+        server, port, _ = await _serve(b"SSH-2.0-OpenSSH_9.6\r\n")
+        async with server:
+            return await probe_tcp("127.0.0.1", port, read_banner=True)
+
+    result = asyncio.run(run())
+    assert result["reachable"] is True
+    assert result["is_ssh"] is True
+    assert result["ssh_banner"] == "SSH-2.0-OpenSSH_9.6"
+    assert result["latency_ms"] is not None
+
+
+def test_probe_silent_server_respects_deadline():
+    """Test a server that never sends a banner is reachable but not SSH, within the deadline"""
+    async def run():
+        server, port, _ = await _serve(delay=10)
+        async with server:
+            start = time.perf_counter()
+            result = await probe_tcp("127.0.0.1", port, timeout=0.3, read_banner=True)
+            return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result["reachable"] is True
+    assert result["is_ssh"] is False
+    assert elapsed < 1.0
+
+
+def test_probe_refused():
+    """Test a closed port is reported unreachable"""
+    result = asyncio.run(probe_tcp("127.0.0.1", _closed_port()))
+    assert result["reachable"] is False
+    assert result["error"]
+
+
+def test_probe_many_caps_concurrency(monkeypatch):
+    """Test batch probes run concurrently but never exceed the cap"""
+    import app.services.probe as probe
+
+    state = {"active": 0, "max_active": 0, "calls": 0}
+
+    async def slow_probe(host, port, timeout=5, read_banner=False):
+        state["calls"] += 1
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        await asyncio.sleep(0.1)
+        state["active"] -= 1
+        return {"reachable": True, "port": port}
+
+    monkeypatch.setattr(probe, "probe_tcp", slow_probe)
+
+    start = time.perf_counter()
+    results = asyncio.run(probe_many([("127.0.0.1", port, False) for port in range(12)], concurrency=4))
+    elapsed = time.perf_counter() - start
+
+    assert [r["port"] for r in results] == list(range(12))
+    assert state["max_active"] == 4
+    assert state["calls"] == 12
+    assert elapsed < 12 * 0.1
+
+
+def test_probe_cached_reuses_recent_results():
+    """Test repeated probes within the TTL don't reconnect"""
+    async def run():
+        server, port, state = await _serve(b"SSH-2.0-test\r\n")
+        async with server:
+            first = await probe_cached("127.0.0.1", port, read_banner=True)
+            second = await probe_cached("127.0.0.1", port, read_banner=True)
+            forced = await probe_cached("127.0.0.1", port, read_banner=True, refresh=True)
+            return first, second, forced, state
+
+    first, second, forced, state = asyncio.run(run())
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["ssh_banner"] == first["ssh_banner"]
+    assert forced["cached"] is False
+    assert state["connections"] == 2
+
+
+def test_probe_cache_expires(monkeypatch):
+    """Test cache entries expire after the TTL"""
+    import app.services.probe as probe
+
+    now = [100.0]
+    monkeypatch.setattr(probe.time, "monotonic", lambda: now[0])
+    cache = ProbeCache(ttl=10)
+    cache.put(("h", 1, False), {"reachable": True})
+    assert cache.get(("h", 1, False)) == {"reachable": True}
+    now[0] += 10
+    assert cache.get(("h", 1, False)) is None
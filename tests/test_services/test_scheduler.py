@@ -0,0 +1,178 @@
+"""
+Background scheduler tests - cron parsing, run metrics, overlap and persistence
+"""
+import asyncio
+import secrets
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.database import init_db
+from app.services.scheduler import CronSpec, Scheduler
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _name(prefix: str) -> str:
+    return f"{prefix}-{secrets.token_hex(4)}"
+
+
+def _status(scheduler: Scheduler, name: str) -> dict:
+    return next(job for job in scheduler.status() if job["name"] == name)
+
+
+def test_cron_next_after():
+    assert CronSpec("30 3 * * *").next_after(datetime(2026, 1, 1, 4, 0)) == datetime(2026, 1, 2, 3, 30)
+    assert CronSpec("*/15 * * * *").next_after(datetime(2026, 1, 1, 10, 7, 42)) == datetime(2026, 1, 1, 10, 15)
+    assert CronSpec("*/15 * * * *").next_after(datetime(2026, 1, 1, 10, 15)) == datetime(2026, 1, 1, 10, 30)
+    # 2026-01-04 is a Sunday; weekday 7 means Sunday too
+    assert CronSpec("0 12 * * 7").next_after(datetime(2026, 1, 1)) == datetime(2026, 1, 4, 12, 0)
+    # Restricted day and weekday match on either (the 1st, or a Monday)
+    assert CronSpec("0 0 1 * 1").next_after(datetime(2026, 1, 1, 1, 0)) == datetime(2026, 1, 5, 0, 0)
+    assert CronSpec("0 0 29 2 *").next_after(datetime(2026, 1, 1)) == datetime(2028, 2, 29, 0, 0)
+    for bad in ("* * * *", "60 * * * *", "*/0 * * * *", "0 0 31 2 *"):
+        with pytest.raises(ValueError):
+            CronSpec(bad).next_after(datetime(2026, 1, 1))
+
+
+def test_runs_record_metrics_and_failures():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    ok_name, bad_name = _name("ok"), _name("bad")
+    calls = []
+
+    def boom():
+        raise RuntimeError("frps unreachable")
+
+    scheduler.register(ok_name, lambda: calls.append(1), every=60)
+    scheduler.register(bad_name, boom, every=60)
+
+    async def scenario():
+        scheduler.load()
+        clock.now += 2  # two seconds late
+        await asyncio.gather(*await scheduler.run_due())
+
+    asyncio.run(scenario())
+    assert calls == [1]
+    ok = _status(scheduler, ok_name)
+    assert (ok["run_count"], ok["last_status"], ok["failure_count"]) == (1, "ok", 0)
+    assert ok["last_lag_ms"] == pytest.approx(2000)
+    assert ok["next_run_at"] == pytest.approx(clock.now + 60)
+    bad = _status(scheduler, bad_name)
+    assert (bad["last_status"], bad["failure_count"], bad["consecutive_failures"]) == ("failed", 1, 1)
+    assert "frps unreachable" in bad["last_error"]
+
+
+def test_overlapping_runs_are_skipped():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    name = _name("slow")
+    runs = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            runs.append(1)
+            await release.wait()
+
+        scheduler.register(name, slow, every=10)
+        scheduler.load()
+        first = await scheduler.run_due()
+        await asyncio.sleep(0)
+        clock.now += 10
+        assert await scheduler.run_due() == []
+        release.set()
+        await asyncio.gather(*first)
+        clock.now += 10
+        await asyncio.gather(*await scheduler.run_due())
+
+    asyncio.run(scenario())
+    assert runs == [1, 1]
+    status = _status(scheduler, name)
+    assert (status["run_count"], status["skipped_overlaps"]) == (2, 1)
+
+
+def test_schedule_resumes_after_restart():
+    clock = FakeClock()
+    name = _name("daily")
+    first = Scheduler(clock=clock)
+    first.register(name, lambda: None, every=86400, initial_delay=30)
+    first.load()
+    assert first.jobs[0].next_run == clock.now + 30  # never run: waits initial_delay
+
+    async def run_once():
+        clock.now += 30
+        await asyncio.gather(*await first.run_due())
+
+    asyncio.run(run_once())
+    started = clock.now
+
+    # A restart an hour later keeps the daily schedule instead of resetting it
+    clock.now += 3600
+    second = Scheduler(clock=clock)
+    second.register(name, lambda: None, every=86400, initial_delay=30)
+    second.load()
+    assert second.jobs[0].next_run == started + 86400
+
+    # A run missed while down happens right away
+    clock.now = started + 3 * 86400
+    third = Scheduler(clock=clock)
+    third.register(name, lambda: None, every=86400)
+    third.load()
+    assert third.jobs[0].next_run == clock.now
+
+
+def test_new_leader_skips_job_still_running_in_a_thread():
+    clock = FakeClock()
+    name = _name("sweep")
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append("old")
+        release.wait(5)
+
+    old = Scheduler(clock=clock)
+    old.register(name, slow, every=10)
+    new = Scheduler(clock=clock)
+    new.register(name, lambda: runs.append("new"), every=10)
+
+    async def scenario():
+        old.load()
+        task = (await old.run_due())[0]
+        while not runs:
+            await asyncio.sleep(0.01)
+
+        # Losing leadership cancels the run, but the thread goes on, and so does the claim
+        task.cancel()
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        assert _status(new, name)["running"]
+
+        new.load()
+        await asyncio.gather(*await new.run_due())
+        assert runs == ["old"]
+
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not _status(new, name)["running"]
+        clock.now += 10
+        await asyncio.gather(*await new.run_due())
+
+    asyncio.run(scenario())
+    assert runs == ["old", "new"]
+    assert _status(new, name)["skipped_overlaps"] == 1
@@ -0,0 +1,135 @@
+"""
+Subdomain registry unit tests
+"""
+import sqlite3
+import pytest
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.subdomains import SubdomainRegistry
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+@pytest.fixture
+def claim(make_user):
+    """Insert http tunnels claiming subdomains, as another worker would; removed after the test"""
+    user = make_user()
+    claimed = []
+
+    def _claim(subdomain: str) -> None:
+        conn = sqlite3.connect(DB_FILE)
+        conn.execute(
+            "INSERT INTO tunnels (user_id, name, type, local_port, subdomain) VALUES (?, ?, 'http', 80, ?)",
+            (user["id"], subdomain, subdomain)
+        )
+        conn.commit()
+        conn.close()
+        claimed.append(subdomain)
+
+    yield _claim
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany("DELETE FROM tunnels WHERE name = ?", [(name,) for name in claimed])
+    conn.commit()
+    conn.close()
+
+
+def test_registry_check_reasons(claim):
+    """Test invalid, reserved and taken names are reported with suggestions"""
+    claim("shop")
+    claim("shop-2")
+    registry = SubdomainRegistry()
+    registry.rebuild()
+
+    assert registry.check("Fresh-Name ") == {"name": "fresh-name", "available": True, "reason": None, "suggestions": []}
+    assert registry.check("-bad-")["reason"] == "invalid"
+    assert registry.check("bad_name")["reason"] == "invalid"
+    assert registry.check("www")["reason"] == "reserved"
+
+    taken = registry.check("shop")
+    assert taken["reason"] == "taken"
+    assert taken["suggestions"] == ["shop-3", "shop-4", "shop-5"]
+
+
+def test_registry_follows_journal(claim, monkeypatch):
+    """Test claims, renames and deletes made by another worker reach the index, and checks stay in memory"""
+    registry = SubdomainRegistry()
+    registry.rebuild()
+    for name in ("zz-beta", "zz-alpha", "zz-gamma", "zzz"):
+        claim(name)
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("DELETE FROM tunnels WHERE subdomain = 'zz-beta'")
+    conn.execute("UPDATE tunnels SET subdomain = 'zz-delta' WHERE subdomain = 'zz-gamma'")
+    conn.commit()
+    conn.close()
+
+    assert registry.is_taken("zz-alpha") is False  # not refreshed yet
+    registry.refresh()
+
+    def no_sqlite(*args, **kwargs):
+        raise AssertionError("availability checks must not query SQLite")
+
+    monkeypatch.setattr(sqlite3, "connect", no_sqlite)
+    assert registry.with_prefix("zz-") == ["zz-alpha", "zz-delta"]
+    assert registry.check("zz-gamma")["available"] is True
+    assert registry.check("zz-delta")["reason"] == "taken"
+
+
+def test_registry_rebuilds_when_journal_was_pruned(claim):
+    """Test an index older than the retained journal reloads from the tunnels table"""
+    registry = SubdomainRegistry()
+    registry.rebuild()
+    claim("pruned-name")
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("DELETE FROM tunnel_changes")
+    conn.commit()
+    conn.close()
+
+    registry.refresh()
+    assert registry.is_taken("pruned-name") is True
+
+
+def test_subdomain_unique_across_users(client, make_user):
+    """Test a subdomain claimed by one user is unavailable to another"""
+    first, second = make_user(), make_user()
+    name = f"clash{first['id']}"
+
+    available = client.get(f"/api/tunnels/subdomains/available?name={name}", headers=second["headers"])
+    assert available.json()["available"] is True
+
+    created = client.post(
+        "/api/tunnels",
+        json={"name": "web", "type": "http", "local_port": 3000, "subdomain": name.upper()},
+        headers=first["headers"]
+    )
+    assert created.status_code == 200
+    assert created.json()["subdomain"] == name
+
+    taken = client.get(f"/api/tunnels/subdomains/available?name={name}", headers=second["headers"])
+    assert taken.json()["reason"] == "taken"
+
+    clash = client.post(
+        "/api/tunnels",
+        json={"name": "web", "type": "http", "local_port": 3000, "subdomain": name},
+        headers=second["headers"]
+    )
+    assert clash.status_code == 409
+
+    assert clash.json()["detail"] == f"Subdomain '{name}' is already taken."
+
+    # Renaming onto a taken subdomain is refused by the index too
+    other = client.post(
+        "/api/tunnels",
+        json={"name": "web", "type": "http", "local_port": 3000, "subdomain": f"{name}-other"},
+        headers=second["headers"]
+    )
+    assert other.status_code == 200
+    rename = client.put(f"/api/tunnels/{other.json()['id']}", json={"subdomain": name}, headers=second["headers"])
+    assert rename.status_code == 409
+
+    assert client.delete(f"/api/tunnels/{created.json()['id']}", headers=first["headers"]).status_code == 200
+    available = client.get(f"/api/tunnels/subdomains/available?name={name}", headers=second["headers"])
+    assert available.json()["available"] is True
+    assert client.delete(f"/api/tunnels/{other.json()['id']}", headers=second["headers"]).status_code == 200
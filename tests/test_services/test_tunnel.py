@@ -86,3 +86,74 @@ def test_generate_frpc_config_with_common():
     assert "server_addr = example.com" in config
     assert "server_port = 7000" in config
     assert "token = my-secret-token" in config
+
+
+def test_quota_holds_under_concurrent_creates(make_user):
+    """Test concurrent quota-check-and-insert transactions never exceed max_tunnels"""
+    import sqlite3
+    import threading
+    import time
+    from app.config import DB_FILE
+    from app.services.tunnel import check_user_quota
+
+    user = make_user(max_tunnels=3)
+    barrier = threading.Barrier(12)
+    created = []
+
+    def worker(n):
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        cursor = conn.cursor()
+        barrier.wait()
+        cursor.execute("BEGIN IMMEDIATE")
+        can_create, _, _ = check_user_quota(cursor, user["id"])
+        if can_create:
+            time.sleep(0.01)  # widen the window between check and insert
+            cursor.execute(
+                "INSERT INTO tunnels (user_id, name, type, local_port) VALUES (?, ?, 'tcp', 22)",
+                (user["id"], f"race-{n}")
+            )
+            created.append(n)
+        conn.commit()
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    conn = sqlite3.connect(DB_FILE)
+    count = conn.execute("SELECT COUNT(*) FROM tunnels WHERE user_id = ?", (user["id"],)).fetchone()[0]
+    tunnel_count = conn.execute("SELECT tunnel_count FROM users WHERE id = ?", (user["id"],)).fetchone()[0]
+    conn.close()
+    assert len(created) == count == tunnel_count == 3
+
+
+def test_create_tunnel_enforces_quota(client, make_user):
+    """Test the create endpoint rejects tunnels past max_tunnels and frees slots on delete"""
+    user = make_user(max_tunnels=2)
+    ids = []
+    for n in range(2):
+        response = client.post(
+            "/api/tunnels",
+            json={"name": f"q{n}", "type": "http", "local_port": 3000, "subdomain": f"quota{user['id']}x{n}"},
+            headers=user["headers"]
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+
+    over = client.post(
+        "/api/tunnels",
+        json={"name": "q2", "type": "http", "local_port": 3000, "subdomain": f"quota{user['id']}x2"},
+        headers=user["headers"]
+    )
+    assert over.status_code == 400
+    assert "2/2" in over.json()["detail"]
+
+    assert client.delete(f"/api/tunnels/{ids[0]}", headers=user["headers"]).status_code == 200
+    again = client.post(
+        "/api/tunnels",
+        json={"name": "q2", "type": "http", "local_port": 3000, "subdomain": f"quota{user['id']}x2"},
+        headers=user["headers"]
+    )
+    assert again.status_code == 200
@@ -0,0 +1,158 @@
+"""
+Per-tunnel DNS queue tests against the fake Netlify API (see conftest)
+"""
+import secrets
+import sqlite3
+
+import pytest
+
+from app.config import DB_FILE
+from app.database import init_db
+from app.services.dns import DnsReconciler, create_session
+from app.services.tunnel_dns import TunnelDnsQueue
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+    TunnelDnsQueue().clear()
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("DELETE FROM tunnel_dns_managed")
+    conn.commit()
+    conn.close()
+
+
+def _reconciler():
+    return DnsReconciler(
+        token="test-token", zone_id=None, domain="tunnel.example.com",
+        session=create_session(backoff_factor=0), rate=0
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _queue(**kwargs):
+    kwargs.setdefault("reconciler", _reconciler())
+    return TunnelDnsQueue(enabled=True, ip_source=lambda: "1.2.3.4", **kwargs)
+
+
+def _values(netlify):
+    return {r["hostname"]: r["value"] for r in netlify.records.values()}
+
+
+def _intents():
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute("SELECT subdomain, present, generation FROM tunnel_dns_intents").fetchall()
+    conn.close()
+    return {subdomain: (present, generation) for subdomain, present, generation in rows}
+
+
+def test_intents_coalesce_per_hostname(netlify):
+    queue = _queue()
+    queue.enqueue("app", True)
+    queue.enqueue("app", False)
+    queue.enqueue("app", True)
+    queue.enqueue("gone", False)
+    assert queue.stats()["pending"] == 2
+    assert _intents() == {"app": (1, 2), "gone": (0, 0)}
+
+    assert queue.process_due("1.2.3.4") == 2
+    assert queue.stats()["pending"] == 0
+    assert netlify.count("POST") == 1
+    assert netlify.count("DELETE") == 0  # nothing to remove for "gone"
+    assert _values(netlify) == {"app.tunnel.example.com": "1.2.3.4"}
+
+
+def test_failures_retry_with_backoff(netlify):
+    clock = FakeClock()
+    queue = _queue(clock=clock, retry_base=2, max_backoff=5)
+    queue.reconciler.records()
+    queue.enqueue("app", True)
+
+    netlify.fail_next = 1  # creates are not retried by the session
+    queue.process_due("1.2.3.4")
+    assert queue.stats()["retries"] == 1
+    assert queue.process_due("1.2.3.4") == 0  # not due yet
+
+    clock.now += 2
+    netlify.fail_next = 4  # the zone refetch fails even after the session retries
+    queue.process_due("1.2.3.4")
+    assert queue.stats()["retries"] == 2
+    clock.now += 3
+    assert queue.process_due("1.2.3.4") == 0  # backoff doubled to 4s
+
+    clock.now += 1
+    assert queue.process_due("1.2.3.4") == 1
+    assert queue.stats()["pending"] == 0
+    assert _values(netlify) == {"app.tunnel.example.com": "1.2.3.4"}
+
+
+def _managed():
+    conn = sqlite3.connect(DB_FILE)
+    rows = conn.execute("SELECT subdomain FROM tunnel_dns_managed").fetchall()
+    conn.close()
+    return {row[0] for row in rows}
+
+
+def test_resync_removes_only_records_it_created(client, netlify):
+    netlify.add("*.tunnel.example.com", "1.2.3.4")
+    netlify.add("hand-made.tunnel.example.com", "5.6.7.8")
+    netlify.add("mail.example.com", "9.9.9.9")
+    queue = _queue()
+    queue.enqueue("stale-name", True)
+    queue.process_due("1.2.3.4")
+    assert _managed() == {"stale-name"}
+
+    queue.resync()
+    intents = _intents()
+    assert intents["stale-name"][0] == 0
+    assert "hand-made" not in intents
+    assert "*" not in intents
+    assert not any(subdomain.endswith("example.com") for subdomain in intents)
+
+    while queue.process_due("1.2.3.4"):
+        pass
+    assert "stale-name" not in _managed()
+    values = _values(netlify)
+    assert "stale-name.tunnel.example.com" not in values
+    assert values["hand-made.tunnel.example.com"] == "5.6.7.8"
+
+
+def test_removal_skips_records_it_did_not_create(netlify):
+    netlify.add("hand-made.tunnel.example.com", "5.6.7.8")
+    queue = _queue()
+    queue.enqueue("hand-made", False)
+
+    assert queue.process_due("1.2.3.4") == 1
+    assert queue.stats()["pending"] == 0
+    assert netlify.count("DELETE") == 0
+    assert _values(netlify) == {"hand-made.tunnel.example.com": "5.6.7.8"}
+
+
+def test_tunnel_writes_record_intents(client, make_user, netlify):
+    user = make_user()
+    subdomain, renamed = f"dns-{secrets.token_hex(4)}", f"dns-{secrets.token_hex(4)}"
+
+    response = client.post(
+        "/api/tunnels",
+        json={"name": "web", "type": "http", "local_port": 3000, "subdomain": subdomain},
+        headers=user["headers"]
+    )
+    assert response.status_code == 200
+    assert _intents()[subdomain][0] == 1
+
+    tunnel_id = response.json()["id"]
+    response = client.put(f"/api/tunnels/{tunnel_id}", json={"subdomain": renamed}, headers=user["headers"])
+    assert response.status_code == 200
+    assert (_intents()[subdomain][0], _intents()[renamed][0]) == (0, 1)
+
+    # The delete replaces the pending intent in the same transaction
+    assert client.delete(f"/api/tunnels/{tunnel_id}", headers=user["headers"]).status_code == 200
+    assert _intents()[renamed] == (0, 1)
+    assert netlify.requests == []  # applied only by the leader's worker
@@ -0,0 +1,120 @@
+"""
+Bulk user import tests
+"""
+import json
+import pytest
+from app.database import init_db
+from app.services.auth import verify_password
+from app.services.user_import import generate_tokens, parse_import
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+
+
+def _events(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_pool_is_spawned_and_shares_cpus_with_server_workers(monkeypatch):
+    """Test the hashing pool splits the CPUs between server workers and is not forked"""
+    import app.services.user_import as user_import
+
+    monkeypatch.setattr(user_import.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(user_import, "USER_IMPORT_WORKERS", 0)
+    monkeypatch.setattr(user_import, "WEB_CONCURRENCY", 4)
+    assert user_import.pool_size() == 2
+    monkeypatch.setattr(user_import, "WEB_CONCURRENCY", 16)
+    assert user_import.pool_size() == 1
+    monkeypatch.setattr(user_import, "WEB_CONCURRENCY", 0)  # single process (plain uvicorn)
+    assert user_import.pool_size() == 8
+
+    user_import.shutdown_hash_pool()
+    monkeypatch.setattr(user_import, "USER_IMPORT_WORKERS", 1)
+    try:
+        pool = user_import.get_hash_pool()
+        assert pool._mp_context.get_start_method() == "spawn"
+        assert len(pool.submit(user_import._hash_chunk, ["pw"], 4).result(timeout=60)) == 1
+    finally:
+        user_import.shutdown_hash_pool()
+
+
+def test_parse_import_csv_and_json():
+    """Test CSV headers are matched loosely and JSON accepts both shapes"""
+    rows = parse_import(b"\xef\xbb\xbfEmail, Password ,max_tunnels,team\na@example.com,,5,x\n", "text/csv")
+    assert rows == [{"email": "a@example.com", "max_tunnels": "5"}]
+
+    users = [{"email": "b@example.com"}]
+    assert parse_import(json.dumps(users).encode(), "application/json") == users
+    assert parse_import(json.dumps({"users": users}).encode(), "application/json") == users
+
+    with pytest.raises(ValueError):
+        parse_import(b"name\nalice\n", "text/csv")
+    with pytest.raises(ValueError):
+        parse_import(b'{"users": 1}', "application/json")
+
+    tokens = generate_tokens(3)
+    assert len(set(tokens)) == 3 and all(len(t) == 64 for t in tokens)
+
+
+def test_import_users_streams_progress(client, make_user):
+    """Test an import hashes in the pool, reports progress and creates every user"""
+    admin = make_user(is_admin=True)
+    prefix = f"imp{admin['id']}"
+    lines = ["email,password,max_tunnels"] + [f"{prefix}-{n}@example.com,pw-{n},3" for n in range(6)]
+    lines.append(f"{prefix}-gen@example.com,,")
+
+    response = client.post(
+        "/api/users/import",
+        content="\n".join(lines).encode(),
+        headers={**admin["headers"], "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    events = _events(response)
+    assert events[-2]["event"] == "progress" and events[-2]["done"] == 7
+    done = events[-1]
+    assert done["created"] == 7 and done["failed"] == 0
+    generated = done["results"][-1]
+    assert len(generated["password"]) >= 12
+    assert "password" not in done["results"][0]
+
+    import sqlite3
+    from app.config import DB_FILE
+    conn = sqlite3.connect(DB_FILE)
+    password_hash, max_tunnels = conn.execute(
+        "SELECT password_hash, max_tunnels FROM users WHERE email = ?", (f"{prefix}-0@example.com",)
+    ).fetchone()
+    conn.close()
+    assert verify_password("pw-0", password_hash)
+    assert max_tunnels == 3
+    login = client.post("/api/auth/login", json={"email": generated["email"], "password": generated["password"]})
+    assert login.status_code == 200
+
+
+def test_import_users_validation_and_conflicts(client, make_user):
+    """Test invalid rows reject the file, existing emails are skipped or reject it when atomic"""
+    admin, existing = make_user(is_admin=True), make_user()
+    headers = admin["headers"]
+
+    invalid = client.post(
+        "/api/users/import?stream=false",
+        json=[{"email": "not-an-email"}, {"email": "ok@example.com"}, {"email": "ok@example.com"}],
+        headers=headers
+    )
+    assert invalid.status_code == 400
+    assert [r["ok"] for r in invalid.json()["detail"]["results"]] == [False, True, False]
+
+    fresh = f"fresh{admin['id']}@example.com"
+    batch = [{"email": existing["email"], "password": "x"}, {"email": fresh, "password": "x"}]
+    atomic = client.post("/api/users/import?stream=false&atomic=true", json=batch, headers=headers)
+    assert atomic.status_code == 409
+
+    partial = client.post("/api/users/import?stream=false", json=batch, headers=headers)
+    assert partial.status_code == 200
+    body = partial.json()
+    assert body["created"] == 1 and body["failed"] == 1
+    assert body["results"][0]["error"] == "Email already exists"
+
+    forbidden = client.post("/api/users/import", json=batch, headers=existing["headers"])
+    assert forbidden.status_code == 403
@@ -51,3 +51,220 @@ def test_create_tunnel_validation(client):
     # or 403 (if auth check comes first)
     response = client.post("/api/tunnels", json={})
     assert response.status_code in [403, 422]
+
+
+def test_probe_tunnels_reports_each_tcp_tunnel(client, make_user, monkeypatch):
+    """Test the batch probe covers the user's SSH/TCP tunnels only"""
+    import socket
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    closed_port = sock.getsockname()[1]
+    sock.close()
+
+    monkeypatch.setenv("SERVER_DOMAIN", "127.0.0.1")
+    user = make_user()
+    for body in (
+        {"name": "shell", "type": "ssh", "local_port": 22, "remote_port": closed_port, "ssh_user": "dev"},
+        {"name": "site", "type": "http", "local_port": 3000, "subdomain": f"site{user['id']}"},
+    ):
+        assert client.post("/api/tunnels", json=body, headers=user["headers"]).status_code == 200
+
+    response = client.get("/api/tunnels/probe", headers=user["headers"])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["name"] for r in results] == ["shell"]
+    assert results[0]["reachable"] is False
+
+
+def _activity_count(user_id, action):
+    import sqlite3
+    from app.config import DB_FILE
+    from app.services.activity import activity_writer
+
+    activity_writer.flush()
+    conn = sqlite3.connect(DB_FILE)
+    count = conn.execute(
+        "SELECT COUNT(*) FROM activity_logs WHERE user_id = ? AND action = ?", (user_id, action)
+    ).fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_bulk_create_tunnels(client, make_user):
+    """Test a batch is created in one request with per-item results and one activity record"""
+    user = make_user(max_tunnels=20)
+    batch = [{"name": f"bulk-{n}", "type": "tcp", "local_port": 8000 + n} for n in range(5)]
+
+    response = client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=user["headers"])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 5 and body["failed"] == 0
+    assert all(r["ok"] and r["remote_port"] for r in body["results"])
+    assert len({r["remote_port"] for r in body["results"]}) == 5
+    assert _activity_count(user["id"], "tunnels_bulk_created") == 1
+    assert _activity_count(user["id"], "tunnel_created") == 0
+
+    listed = client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"]
+    assert sorted(t["name"] for t in listed) == [f"bulk-{n}" for n in range(5)]
+
+
+def test_bulk_create_validates_whole_batch(client, make_user):
+    """Test one invalid item rejects the batch before anything is written"""
+    user = make_user()
+    batch = [
+        {"name": "ok", "type": "tcp", "local_port": 22},
+        {"name": "bad", "type": "udp", "local_port": 22},
+        {"name": "ok", "type": "tcp", "local_port": 23},
+    ]
+
+    response = client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=user["headers"])
+    assert response.status_code == 400
+    results = response.json()["detail"]["results"]
+    assert [r["ok"] for r in results] == [True, False, False]
+    assert "Duplicate tunnel name" in results[2]["error"]
+    assert client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"] == []
+
+
+def test_bulk_create_conflicts_skip_or_roll_back(client, make_user):
+    """Test conflicting items are skipped, or roll everything back when atomic"""
+    user = make_user()
+    client.post("/api/tunnels", json={"name": "taken", "type": "tcp", "local_port": 22}, headers=user["headers"])
+    batch = [{"name": "taken", "type": "tcp", "local_port": 22}, {"name": "fresh", "type": "tcp", "local_port": 22}]
+
+    atomic = client.post("/api/tunnels/bulk?atomic=true", json={"tunnels": batch}, headers=user["headers"])
+    assert atomic.status_code == 409
+    assert len(client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"]) == 1
+
+    partial = client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=user["headers"])
+    assert partial.status_code == 200
+    assert [r["ok"] for r in partial.json()["results"]] == [False, True]
+    assert "already exists" in partial.json()["results"][0]["error"]
+    assert len(client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"]) == 2
+
+
+def test_bulk_update_status_and_delete(client, make_user):
+    """Test bulk update, status and delete apply to every tunnel in the batch"""
+    user, other = make_user(), make_user()
+    batch = [{"name": f"b{n}", "type": "tcp", "local_port": 22} for n in range(3)]
+    ids = [r["id"] for r in client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=user["headers"]).json()["results"]]
+
+    updated = client.put(
+        "/api/tunnels/bulk",
+        json={"tunnels": [{"id": tunnel_id, "local_port": 2222} for tunnel_id in ids]},
+        headers=user["headers"]
+    )
+    assert updated.status_code == 200
+    assert updated.json()["updated"] == 3
+
+    status = client.put("/api/tunnels/bulk/status", json={"ids": ids, "is_active": True}, headers=user["headers"])
+    assert status.status_code == 200
+    listed = client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"]
+    assert all(t["local_port"] == 2222 and t["is_active"] == 1 for t in listed)
+
+    forbidden = client.post("/api/tunnels/bulk/delete", json={"ids": ids}, headers=other["headers"])
+    assert forbidden.status_code == 400
+
+    deleted = client.post("/api/tunnels/bulk/delete", json={"ids": ids + ids[:1]}, headers=user["headers"])
+    assert deleted.status_code == 200
+    assert deleted.json()["deleted"] == 3
+    assert client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"] == []
+    assert _activity_count(user["id"], "tunnels_bulk_deleted") == 1
+
+
+def test_frpc_bundle_etag_tracks_config_version(client, make_user):
+    """Test the bundle covers every tunnel and its ETag changes only when the config does"""
+    from app.services.frps_config import tomllib
+    user = make_user()
+    for name, port in (("web", 3000), ("db", 5432)):
+        client.post("/api/tunnels", json={"name": name, "type": "tcp", "local_port": port}, headers=user["headers"])
+
+    response = client.get("/api/tunnels/frpc.toml", headers=user["headers"])
+    assert response.status_code == 200
+    config = tomllib.loads(response.text)
+    assert [p["name"] for p in config["proxies"]] == ["web", "db"]
+    assert all(p["remotePort"] for p in config["proxies"])
+    etag = response.headers["etag"]
+
+    ini = client.get("/api/tunnels/frpc.ini", headers=user["headers"])
+    assert "[common]" in ini.text and "[db]" in ini.text
+    assert ini.headers["etag"] != etag
+    assert client.get("/api/tunnels/frpc.yaml", headers=user["headers"]).status_code == 404
+
+    cached = client.get("/api/tunnels/frpc.toml", headers={**user["headers"], "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    # Status changes don't touch the config; edits do
+    tunnel_id = client.get("/api/tunnels", headers=user["headers"]).json()["tunnels"][0]["id"]
+    client.put(f"/api/tunnels/{tunnel_id}/status", json={"is_active": True}, headers=user["headers"])
+    assert client.get("/api/tunnels/frpc.toml", headers={**user["headers"], "If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/tunnels/{tunnel_id}", json={"local_port": 8080}, headers=user["headers"])
+    changed = client.get("/api/tunnels/frpc.toml", headers={**user["headers"], "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert 8080 in [p["localPort"] for p in tomllib.loads(changed.text)["proxies"]]
+
+
+def test_list_tunnels_since_returns_delta(client, make_user):
+    """Test polling with since returns only changed and deleted tunnels"""
+    user = make_user()
+    first = client.post("/api/tunnels", json={"name": "a", "type": "tcp", "local_port": 22}, headers=user["headers"]).json()
+    second = client.post("/api/tunnels", json={"name": "b", "type": "tcp", "local_port": 22}, headers=user["headers"]).json()
+
+    full = client.get("/api/tunnels", headers=user["headers"]).json()
+    assert len(full["tunnels"]) == 2
+    version = full["version"]
+
+    idle = client.get(f"/api/tunnels?since={version}", headers=user["headers"]).json()
+    assert idle == {"tunnels": [], "version": idle["version"], "reset": False, "deleted": []}
+
+    client.put(f"/api/tunnels/{first['id']}", json={"local_port": 2222}, headers=user["headers"])
+    client.delete(f"/api/tunnels/{second['id']}", headers=user["headers"])
+
+    delta = client.get(f"/api/tunnels?since={version}&wait=5", headers=user["headers"]).json()
+    assert [t["local_port"] for t in delta["tunnels"]] == [2222]
+    assert delta["deleted"] == [second["id"]]
+    assert delta["version"] > version
+
+
+def test_list_tunnels_long_poll_times_out(client, make_user):
+    """Test a long-poll with nothing to report returns an empty delta after the wait"""
+    import time
+    user = make_user()
+    version = client.get("/api/tunnels", headers=user["headers"]).json()["version"]
+
+    start = time.monotonic()
+    response = client.get(f"/api/tunnels?since={version}&wait=0.6", headers=user["headers"])
+    assert time.monotonic() - start >= 0.5
+    assert response.json()["tunnels"] == []
+
+
+def test_list_tunnels_keyset_pages_and_filters(client, make_user):
+    """Test tunnel pages follow next_cursor without gaps and filters apply server-side"""
+    user = make_user(max_tunnels=20)
+    batch = [
+        {"name": f"page-{n:02d}", "type": "http", "local_port": 80, "subdomain": f"page{user['id']}-{n}"} if n % 3 == 0
+        else {"name": f"page-{n:02d}", "type": "tcp", "local_port": 22}
+        for n in range(7)
+    ]
+    assert client.post("/api/tunnels/bulk", json={"tunnels": batch}, headers=user["headers"]).status_code == 200
+
+    names, cursor = [], None
+    while True:
+        url = "/api/tunnels?limit=3&sort=name" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url, headers=user["headers"]).json()
+        assert len(page["tunnels"]) <= 3
+        names.extend(t["name"] for t in page["tunnels"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert names == [t["name"] for t in batch]
+
+    http = client.get("/api/tunnels?type=http&sort=-name", headers=user["headers"]).json()["tunnels"]
+    assert [t["name"] for t in http] == ["page-06", "page-03", "page-00"]
+    assert len(client.get("/api/tunnels?name=page-0", headers=user["headers"]).json()["tunnels"]) == 7
+    assert client.get("/api/tunnels?name=nope", headers=user["headers"]).json()["tunnels"] == []
+
+    assert client.get("/api/tunnels?sort=remote_port", headers=user["headers"]).status_code == 400
+    assert client.get("/api/tunnels?limit=2&cursor=garbage", headers=user["headers"]).status_code == 400
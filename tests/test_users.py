@@ -42,3 +42,63 @@ def test_regenerate_token_requires_admin(client):
     """Test regenerating token requires admin authentication"""
     response = client.post("/api/users/1/regenerate-token")
     assert response.status_code == 403
+
+
+def test_list_users_keyset_pages_and_filters(client, make_user):
+    """Test user pages follow next_cursor and the email prefix filter"""
+    admin = make_user(is_admin=True)
+    prefix = f"zpage{admin['id']}-"
+    for n in range(5):
+        make_user()  # noise outside the prefix
+    import sqlite3
+    from app.config import DB_FILE
+    conn = sqlite3.connect(DB_FILE)
+    conn.executemany(
+        "INSERT INTO users (email, password_hash, token, is_active) VALUES (?, 'x', ?, ?)",
+        [(f"{prefix}{n}@example.com", f"{prefix}{n}", n % 2) for n in range(5)]
+    )
+    conn.commit()
+    conn.close()
+
+    emails, cursor = [], None
+    while True:
+        url = f"/api/users?email={prefix}&sort=email&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url, headers=admin["headers"]).json()
+        emails.extend(u["email"] for u in page["users"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert emails == [f"{prefix}{n}@example.com" for n in range(5)]
+
+    active = client.get(f"/api/users?email={prefix}&is_active=true", headers=admin["headers"]).json()["users"]
+    assert sorted(u["email"] for u in active) == [f"{prefix}1@example.com", f"{prefix}3@example.com"]
+    assert all("active_tunnels" in u for u in active)
+
+
+def test_list_users_page_does_not_block_writers(client, make_user):
+    """Test a page still being sent holds no database lock"""
+    import asyncio
+    import json
+    import secrets
+    import sqlite3
+    from app.config import DB_FILE
+    from app.routes.users import list_users
+
+    admin = make_user(is_admin=True)
+    response = asyncio.run(list_users(admin_id=admin["id"], limit=2))
+
+    # The client hasn't read a byte yet; a writer must not wait for it
+    conn = sqlite3.connect(DB_FILE, timeout=5)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        "INSERT INTO users (email, password_hash, token) VALUES (?, 'x', ?)",
+        (f"writer-{secrets.token_hex(4)}@example.com", secrets.token_hex(16))
+    )
+    conn.commit()
+    conn.close()
+
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    body = asyncio.run(read())
+    assert len(json.loads(body)["users"]) == 2